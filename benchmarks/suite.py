@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+suite.py
+
+Times the storage, serialization and rendering paths on synthetic stores
+of a given number of tasks, and reports the results as JSON so that runs
+on two commits can be compared.
+
+Each case runs in a fresh interpreter, so that its peak RSS is its own
+and nothing is cached from a previous case. The stores are generated from
+a fixed seed, so every run measures the same data. For each case and
+store size the report holds:
+
+    wall_seconds      the best wall time over --repeat runs
+    peak_rss_kb       the peak resident set size of the process during
+                      the best run, and baseline_rss_kb the peak before
+                      the measured code started
+    allocated_blocks  memory blocks still allocated when the code
+                      returned, minus those allocated before it started
+    traced_peak_bytes peak memory allocated by the code, measured with
+                      tracemalloc in a separate run (skipped with
+                      --no-trace, as tracing slows it down)
+
+The reload and save cases run on one core; reload_parallel and
+save_parallel let FileStorage use --workers processes (all the cores by
+default) once the store is over its size thresholds, so the ratio of the
+two shows the speedup of models.storage.parallel.
+
+Usage:
+    python -m benchmarks.suite [--sizes 1000 100000 1000000]
+        [--cases reload save ...] [--repeat N] [--no-trace]
+        [--workers N] [--output results.json]
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from models.storage.json_stream import iter_json_items, write_json_items
+
+SIZES = (1000, 100000, 1000000)
+SEED = 20240101
+START = datetime(2024, 1, 1, 9, 0)
+
+
+def make_records(count, seed=SEED):
+    """
+    Yields the records of a synthetic store: a third of the tasks are
+    completed, half have a due date, and they are spread over ten
+    projects.
+
+    Args:
+        count (int): Number of tasks.
+        seed (int): Seed of the random generator.
+
+    Yields:
+        tuple: The ('Task.<id>', dictionary) pair of each task.
+    """
+    rng = random.Random(seed)
+    words = ('wash', 'call', 'buy', 'fix', 'read', 'plan', 'email', 'clean')
+    for i in range(count):
+        task_id = str(UUID(int=rng.getrandbits(128), version=4))
+        created = START + timedelta(minutes=i)
+        completed = i % 3 == 0
+        due = None
+        if i % 2 == 0:
+            due = (created + timedelta(days=rng.randrange(-30, 60))).isoformat()
+        yield f"Task.{task_id}", {
+            'title': f"{rng.choice(words)} item {i}",
+            'status': 'completed' if completed else 'pending',
+            'project_name': f"project-{i % 10}",
+            'priority': 'urgent' if i % 5 == 0 else 'not urgent',
+            'duedatetime': due,
+            'id': task_id,
+            'created_at': created.isoformat(),
+            'updated_at': created.isoformat(),
+            'completed_at': created.isoformat() if completed else None,
+            '__class__': 'Task',
+        }
+
+
+def make_store(directory, count):
+    """
+    Writes a synthetic JSON store, unless it was already generated.
+
+    Args:
+        directory (str): Directory that holds the generated stores.
+        count (int): Number of tasks.
+
+    Returns:
+        str: The path of the store.
+    """
+    path = os.path.join(directory, f'tasks-{count}.json')
+    if not os.path.exists(path):
+        with open(path + '.tmp', 'w') as f:
+            write_json_items(f, make_records(count))
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def open_store(path, workers=1):
+    """
+    Points models.store at a copy of a generated store in the current
+    directory, lazily loaded as todo.py does, and returns it.
+
+    Args:
+        path (str): The generated store.
+        workers (int): Worker processes the store may use.
+    """
+    import models
+    from models.storage.file_storage import FileStorage
+
+    shutil.copyfile(path, 'file.json')
+    models.store = FileStorage(journal=True, file_path='file.json')
+    models.store.workers = workers
+    models.store.reload()
+    return models.store
+
+
+def middle_pending_id(path):
+    """
+    Returns the ID of the pending task in the middle of a generated store,
+    so that looking it up reads half of the file.
+    """
+    with open(path) as f:
+        ids = [data['id'] for _, data in iter_json_items(f)
+               if data['status'] == 'pending']
+    return ids[len(ids) // 2]
+
+
+def setup(case, path, workers=None):
+    """
+    Prepares a case and returns the function whose run is measured.
+
+    Args:
+        case (str): One of CASES.
+        path (str): The generated store.
+        workers (int): Worker processes of the parallel cases, all the
+            cores by default.
+
+    Returns:
+        function: Runs the measured code once.
+    """
+    from models.task import Task
+
+    if case.endswith('_parallel'):
+        workers = workers or os.cpu_count()
+        case = case[:-len('_parallel')]
+    else:
+        workers = 1
+    if case == 'reload':
+        store = open_store(path, workers)
+        return lambda: (store.reload(), store.all())
+    if case == 'save':
+        store = open_store(path, workers)
+        store.all()
+        store.journal = False  # Rewrite the whole snapshot.
+        store.update(next(iter(store.all().values())))
+        return store.save
+    if case == 'to_dict':
+        tasks = list(open_store(path).all().values())
+        return lambda: [task.to_dict() for task in tasks]
+    if case == 'from_dict':
+        with open(path) as f:
+            records = list(json.load(f).values())
+        return lambda: [Task.from_dict(data) for data in records]
+    if case == 'print_tasks':
+        open_store(path)
+        return Task.print_tasks
+    if case == 'print_completed_task':
+        open_store(path)
+        return Task.print_completed_task
+    if case == 'mark_complete':
+        open_store(path)
+        task_id = middle_pending_id(path)
+        return lambda: Task.mark_complete(task_id)
+    if case == 'remove_task':
+        open_store(path)
+        task_id = middle_pending_id(path)
+        return lambda: Task.remove_task(task_id)
+    raise ValueError(f"Unknown case '{case}'")
+
+
+CASES = (
+    'reload', 'save', 'reload_parallel', 'save_parallel', 'to_dict',
+    'from_dict', 'print_tasks', 'print_completed_task', 'mark_complete',
+    'remove_task'
+)
+
+
+def run_case(case, path, trace=False, workers=None):
+    """
+    Runs a case once in this process and measures it.
+
+    Args:
+        case (str): One of CASES.
+        path (str): The generated store.
+        trace (bool): Measure the peak allocated memory with tracemalloc
+            instead of the time.
+        workers (int): Worker processes of the parallel cases.
+
+    Returns:
+        dict: The measurements.
+    """
+    run = setup(case, path, workers)
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {'traced_peak_bytes': peak}
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    result = run()
+    wall = time.perf_counter() - start
+    allocated = sys.getallocatedblocks() - blocks
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    del result
+    if sys.platform == 'darwin':  # ru_maxrss is in bytes there.
+        baseline_rss //= 1024
+        peak_rss //= 1024
+    return {
+        'wall_seconds': round(wall, 6),
+        'peak_rss_kb': peak_rss,
+        'baseline_rss_kb': baseline_rss,
+        'allocated_blocks': allocated,
+    }
+
+
+def measure(case, path, trace=False, workers=None):
+    """
+    Runs a case in a fresh interpreter, in a scratch directory.
+
+    Returns:
+        dict: The measurements made by run_case().
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as scratch:
+        command = [
+            sys.executable, '-m', 'benchmarks.suite', '--run', case,
+            os.path.abspath(path)
+        ]
+        if trace:
+            command.append('--trace')
+        if workers:
+            command.extend(['--workers', str(workers)])
+        env = dict(os.environ, PYTHONPATH=root)
+        env.pop('TODO_STORAGE', None)
+        output = subprocess.run(
+            command, cwd=scratch, env=env, check=True,
+            stdout=subprocess.PIPE, text=True
+        ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run_suite(sizes, cases, repeat=1, trace=True, directory=None,
+              workers=None):
+    """
+    Runs every case on every store size.
+
+    Args:
+        sizes: Numbers of tasks of the stores.
+        cases: Names of the cases, see CASES.
+        repeat (int): Runs per case; the fastest one is reported.
+        trace (bool): Also measure allocations with tracemalloc.
+        directory (str): Where to keep the generated stores, a temporary
+            directory by default.
+        workers (int): Worker processes of the parallel cases, all the
+            cores by default.
+
+    Returns:
+        dict: The report.
+    """
+    owned = directory is None
+    if owned:
+        directory = tempfile.mkdtemp(prefix='todo-bench-')
+    results = []
+    try:
+        for size in sizes:
+            path = make_store(directory, size)
+            for case in cases:
+                runs = [
+                    measure(case, path, workers=workers)
+                    for _ in range(repeat)
+                ]
+                result = min(runs, key=lambda run: run['wall_seconds'])
+                if trace:
+                    result.update(
+                        measure(case, path, trace=True, workers=workers)
+                    )
+                result = dict(case=case, tasks=size, **result)
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+    finally:
+        if owned:
+            shutil.rmtree(directory)
+    return {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': SEED,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def _commit():
+    """
+    Returns the git commit of the working tree, or None.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before, after):
+    """
+    Prints the ratio of each measurement of two reports, after/before.
+    Ratios above 1 are regressions.
+
+    Args:
+        before (dict): The report of the baseline.
+        after (dict): The report to compare with it.
+    """
+    baseline = {(r['case'], r['tasks']): r for r in before['results']}
+    metrics = ('wall_seconds', 'peak_rss_kb', 'traced_peak_bytes')
+    print(f"{'case':<22}{'tasks':>9}" + ''.join(f"{m:>20}" for m in metrics))
+    for result in after['results']:
+        old = baseline.get((result['case'], result['tasks']))
+        if old is None:
+            continue
+        ratios = []
+        for metric in metrics:
+            if old.get(metric) and result.get(metric) is not None:
+                ratios.append(f"{result[metric] / old[metric]:>19.2f}x")
+            else:
+                ratios.append(f"{'-':>20}")
+        print(f"{result['case']:<22}{result['tasks']:>9}" + ''.join(ratios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark storage, serialization and rendering.'
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-trace', action='store_true',
+                        help='Do not measure allocations with tracemalloc')
+    parser.add_argument('--store-dir',
+                        help='Keep the generated stores in this directory')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes of the parallel cases'
+                             ' (default: all the cores)')
+    parser.add_argument('--output', help='Write the report to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='Compare two reports instead of running')
+    parser.add_argument('--run', nargs=2, metavar=('CASE', 'STORE'),
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--trace', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        print(json.dumps(
+            run_case(*args.run, trace=args.trace, workers=args.workers)
+        ))
+        return
+    if args.compare:
+        reports = []
+        for name in args.compare:
+            with open(name) as f:
+                reports.append(json.load(f))
+        compare(*reports)
+        return
+
+    report = run_suite(
+        args.sizes, args.cases, repeat=args.repeat,
+        trace=not args.no_trace, directory=args.store_dir,
+        workers=args.workers
+    )
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
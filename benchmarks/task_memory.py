@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+task_memory.py
+
+Measures the memory held per Task loaded from a JSON store, compared with
+the previous __dict__-based representation.
+
+Usage:
+    python -m benchmarks.task_memory [count]
+"""
+import gc
+import json
+import sys
+import tracemalloc
+from datetime import datetime
+from uuid import uuid4
+
+from models.task import Task
+
+
+class DictTask:
+    """
+    The previous Task representation: every attribute in a per-instance
+    __dict__, with the id as a string and timestamps as datetimes.
+    """
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls.__new__(cls)
+        for key, value in data.items():
+            if key in ['created_at', 'updated_at']:
+                setattr(obj, key, datetime.fromisoformat(value))
+            elif key != '__class__':
+                setattr(obj, key, value)
+        return obj
+
+
+def make_store(count):
+    """
+    Returns the JSON text of a store holding count synthetic tasks.
+    """
+    records = {}
+    for i in range(count):
+        task_id = str(uuid4())
+        records[f"Task.{task_id}"] = {
+            'title': f"Task number {i}",
+            'status': 'completed' if i % 3 == 0 else 'pending',
+            'project_name': f"project-{i % 10}",
+            'priority': 'urgent' if i % 5 == 0 else 'not urgent',
+            'duedatetime': None,
+            'id': task_id,
+            'created_at': datetime.now().isoformat(),
+            'updated_at': datetime.now().isoformat(),
+            '__class__': 'Task',
+        }
+    return json.dumps(records)
+
+
+def measure(cls, text, count):
+    """
+    Returns the bytes still allocated per object after loading the store
+    and dropping the parsed JSON.
+    """
+    gc.collect()
+    tracemalloc.start()
+    data = json.loads(text)
+    objects = [cls.from_dict(value) for value in data.values()]
+    del data
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current / count
+
+
+def main(count=100000):
+    text = make_store(count)
+    dict_bytes = measure(DictTask, text, count)
+    slots_bytes = measure(Task, text, count)
+    print(json.dumps({
+        'tasks': count,
+        'dict_bytes_per_task': round(dict_bytes, 1),
+        'slots_bytes_per_task': round(slots_bytes, 1),
+        'reduction': round(dict_bytes / slots_bytes, 2),
+    }, indent=4))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
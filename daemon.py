@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+daemon.py
+
+This module lets todo.py run as a long-lived daemon ('todo.py serve')
+that keeps the store loaded in memory and answers commands over a Unix
+domain socket, and lets todo.py forward its command line to that daemon
+instead of starting from scratch.
+
+Each connection carries one command: the client sends one JSON line with
+its arguments, working directory, TODO_* environment variables and, if
+needed, its standard input; the
+daemon runs the command and answers with one JSON line holding the exit
+code and the captured output, or an 'error' if the request could not be
+read. Commands are run one at a time. A client whose working directory or
+settings differ from the daemon's is told to run the command itself.
+
+Only the standard library is imported here, so that forwarding a command
+costs little more than starting Python.
+"""
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+SOCKET_PATH = os.environ.get('TODO_SOCKET', '.todo.sock')
+
+
+def settings(environ=os.environ):
+    """
+    Returns the environment variables that change what a command does:
+    the TODO_* ones, but for TODO_SOCKET, which the client already shares
+    with the daemon it reached.
+    """
+    return {
+        name: value for name, value in environ.items()
+        if name.startswith('TODO_') and name != 'TODO_SOCKET'
+    }
+
+
+def forward(argv, path=SOCKET_PATH):
+    """
+    Sends a command to the daemon and prints its output.
+
+    Args:
+        argv (list): The command line arguments, without the program name.
+        path (str): Path of the daemon's socket.
+
+    Returns:
+        int: The exit code of the command, or None if no daemon answered
+        for this directory and the command must be run directly.
+    """
+    if not os.path.exists(path):
+        return None
+    request = {'argv': argv, 'cwd': os.getcwd(), 'env': settings()}
+    if '-' in argv and not sys.stdin.isatty():
+        request['stdin'] = sys.stdin.read()
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with client.makefile('rb') as f:
+                line = f.readline()
+    except OSError:
+        # No daemon behind the socket, e.g. it was killed.
+        line = None
+    reply = json.loads(line) if line else {'fallback': True}
+    if reply.get('fallback') or 'error' in reply:
+        if 'stdin' in request:
+            # Give the input that was read back to the direct run.
+            sys.stdin = io.StringIO(request['stdin'])
+        return None
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    return reply['code']
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """
+    Runs the command received on a connection and writes back the reply.
+    """
+    def handle(self):
+        line = self.rfile.readline()
+        if not line.strip():
+            # Closed without a command, as by the probe in serve().
+            return
+        try:
+            request = json.loads(line)
+            argv = request['argv']
+        except (ValueError, TypeError, KeyError):
+            reply = {'error': 'invalid request'}
+        else:
+            reply = self.reply(request, argv)
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+    def reply(self, request, argv):
+        """
+        Runs a command, unless the client is in another directory or has
+        other settings.
+        Returns:
+            dict: The reply to send back.
+        """
+        if request.get('cwd') != self.server.cwd:
+            # Relative paths would point somewhere else for this client.
+            return {'fallback': True}
+        if request.get('env', {}) != self.server.env:
+            # The client wants another store, format or tracing.
+            return {'fallback': True}
+        code, stdout, stderr = self.server.run(
+            argv, request.get('stdin', '')
+        )
+        return {'code': code, 'stdout': stdout, 'stderr': stderr}
+
+
+class Server(socketserver.UnixStreamServer):
+    """
+    Unix socket server that handles one command at a time.
+
+    Attributes:
+        run: Called as run(argv, stdin) for each command; returns the
+            exit code, standard output and standard error.
+        cwd (str): The working directory of the daemon. Commands from
+            clients in other directories are sent back to be run directly.
+        env (dict): The settings() of the daemon. Commands from clients
+            with other settings are sent back as well.
+    """
+    def __init__(self, path, run):
+        self.run = run
+        self.cwd = os.getcwd()
+        self.env = settings()
+        super().__init__(path, Handler)
+
+
+def serve(run, path=SOCKET_PATH, ready=None):
+    """
+    Listens for commands on the socket until interrupted.
+
+    Args:
+        run: Called as run(argv, stdin) for each command; returns the
+            exit code, standard output and standard error.
+        path (str): Path of the socket to create.
+        ready: Called without arguments once the socket is listening.
+
+    Raises:
+        RuntimeError: If a daemon is already listening on the socket.
+    """
+    if os.path.exists(path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(path)
+        except OSError:
+            os.remove(path)  # Left behind by a daemon that was killed.
+        else:
+            raise RuntimeError(f"A daemon is already listening on {path}")
+
+    # Stop on SIGTERM as on Ctrl-C, removing the socket.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with Server(path, run) as server:
+        if ready is not None:
+            ready()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
@@ -2,13 +2,58 @@
 """
 This module initializes the storage system for the application.
 
-It imports the FileStorage class from the storage.file_storage module,
-creates a global instance of FileStorage, and reloads the storage to
-ensure data is loaded into memory at startup.
+The storage backend is chosen with the TODO_STORAGE environment variable:
+'sqlite' selects SQLiteStorage, anything else selects FileStorage in
+journal mode. With TODO_SNAPSHOT=binary, FileStorage keeps its snapshot in
+file.bin using the binary snapshot format instead of file.json. With
+TODO_SHARDS set to 'project', 'month' or 'project,month', FileStorage
+splits the snapshot into shards listed in the shards.json manifest, see
+models.storage.file_storage.
+
+The global instance, models.store, is only created and reloaded the first
+time it is used, so commands that never touch the tasks, such as --help,
+do not import the storage modules at all. Both backends then defer reading
+their data until it is first needed, so startup does not depend on how
+many tasks are stored.
 """
+import os
+
 
-from .storage.file_storage import FileStorage
+def create_store():
+    """
+    Creates and reloads the store selected by the environment.
+    Returns:
+        The FileStorage or SQLiteStorage instance.
+    """
+    if os.environ.get('TODO_STORAGE') == 'sqlite':
+        from .storage.sqlite_storage import SQLiteStorage
+        store = SQLiteStorage()
+    else:
+        from .storage.file_storage import FileStorage
+        binary = os.environ.get('TODO_SNAPSHOT') == 'binary'
+        shards = [
+            name for name in os.environ.get('TODO_SHARDS', '').split(',')
+            if name
+        ]
+        if shards:
+            store = FileStorage(journal=True, binary=binary,
+                                file_path='shards.json', shards=shards)
+        elif binary:
+            store = FileStorage(journal=True, binary=True,
+                                file_path='file.bin')
+        else:
+            store = FileStorage(journal=True)
+    store.reload()
+    return store
 
 
-store = FileStorage()
-store.reload()
+def __getattr__(name):
+    """
+    Creates models.store on first access. Assigning models.store, as the
+    tests do, replaces it without creating the default one.
+    """
+    global store
+    if name == 'store':
+        store = create_store()
+        return store
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
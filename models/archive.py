@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+archive.py
+
+This module moves completed tasks out of the store into a compressed cold
+store, so that loading, saving and listing the store only deal with the
+tasks still in use, and reads them back for 'todo.py list --archived'.
+
+The cold store is a gzip file of NDJSON records, one '{"key": ...,
+"data": ...}' object per line, in the layout of the journal. Each run of
+archive_tasks() appends one gzip member with a single write, so the tasks
+archived before are never rewritten; gzip reads the members back as one
+stream. Tasks are appended to the cold store before they are deleted from
+the store, so a run that is interrupted leaves them in both, and archiving
+them again is harmless: each task is read back once, from the last copy
+archived, so a task restored, changed and archived again reads back as it
+was last archived.
+
+The archive policy, apply_policy(), archives the tasks completed more than
+a given time ago at most once per POLICY_INTERVAL, using the modification
+time of the cold store to tell when it last ran.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from itertools import chain
+import models
+from models import trace
+from models.base_model import to_epoch
+from models.task import Task
+
+PATH = 'archive.ndjson.gz'
+
+# Tasks completed longer ago than this are archived by default.
+DEFAULT_AGE = timedelta(days=30)
+
+# Seconds between two automatic runs of the archive policy.
+POLICY_INTERVAL = 24 * 60 * 60
+
+
+def archive_tasks(older_than=DEFAULT_AGE, path=PATH):
+    """
+    Moves the tasks completed more than older_than ago to the cold store.
+    Tasks completed without a completion time are aged by their last
+    update.
+
+    Args:
+        older_than (timedelta): Minimum time since completion.
+        path (str): The cold store.
+
+    Returns:
+        int: The number of tasks archived.
+    """
+    cutoff = to_epoch(datetime.now() - older_than)
+    tasks = []
+    for task in models.store.query(status='completed').values():
+        completed_at = task._completed_at
+        if completed_at is None:
+            completed_at = task._updated_at
+        if completed_at is not None and completed_at < cutoff:
+            tasks.append(task)
+    if not tasks:
+        return 0
+
+    lines = ''.join(
+        json.dumps(
+            {'key': f"Task.{task.id}", 'data': task.to_dict()},
+            separators=(',', ':')
+        ) + '\n'
+        for task in tasks
+    )
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(lines.encode('utf-8')))
+        f.flush()
+        os.fsync(f.fileno())
+    with models.store.batch():
+        for task in tasks:
+            models.store.delete(task)
+    return len(tasks)
+
+
+def apply_policy(older_than, path=PATH):
+    """
+    Runs archive_tasks() if it has not run in the last POLICY_INTERVAL.
+
+    Args:
+        older_than (timedelta): Minimum time since completion.
+        path (str): The cold store.
+
+    Returns:
+        int: The number of tasks archived.
+    """
+    try:
+        last_run = os.path.getmtime(path)
+    except FileNotFoundError:
+        last_run = 0
+    if time.time() - last_run < POLICY_INTERVAL:
+        return 0
+    count = archive_tasks(older_than, path)
+    # Record the run even if nothing was archived.
+    with open(path, 'ab'):
+        os.utime(path)
+    return count
+
+
+def iter_archived(path=PATH):
+    """
+    Yields the tasks of the cold store in the order they were last
+    archived, from the last copy of each. The records are read first and
+    only deserialized as they are yielded. A member cut short by a crash
+    ends the readable part of the file.
+
+    Args:
+        path (str): The cold store.
+
+    Yields:
+        tuple: The ('<class name>.<id>', task) pair of each task.
+    """
+    records = {}
+    try:
+        f = gzip.open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                # Moved to the end, where it was archived again.
+                records.pop(record['key'], None)
+                records[record['key']] = record['data']
+        except (EOFError, gzip.BadGzipFile):
+            pass
+    for key, data in records.items():
+        if trace.enabled:
+            trace.count('objects.built')
+        yield key, Task.from_dict(data)
+
+
+def archived_items(path=PATH):
+    """
+    Yields every archived task: those the store keeps in archive shards,
+    then those of the cold store.
+
+    Args:
+        path (str): The cold store.
+
+    Yields:
+        tuple: The ('<class name>.<id>', task) pair of each task.
+    """
+    return chain(
+        models.store.query(archived=True).items(), iter_archived(path)
+    )
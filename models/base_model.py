@@ -6,11 +6,75 @@ This module defines the BaseModel class, which serves as a foundational
 class for other classes in a system. It includes basic attributes like id,
 creation time, and update time, and provides utility methods for
 serialization and deserialization of instances.
+
+Instances use __slots__ instead of a per-instance __dict__: the id is kept
+as the 16 raw bytes of the UUID and timestamps as integer microseconds
+since the epoch. The public attributes are properties that convert to and
+from the usual str and datetime values.
 """
-from uuid import uuid4
-from datetime import datetime
+from uuid import uuid4, UUID
+from datetime import datetime, timedelta
 import models
 
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch(value):
+    """
+    Converts a timestamp to microseconds since the epoch.
+
+    Args:
+        value: A naive datetime, an ISO format string, an int that is
+        already an epoch value, or None.
+
+    Returns:
+        int: Microseconds since 1970-01-01T00:00:00, or None.
+
+    Raises:
+        ValueError: If the timestamp has a UTC offset, which the epoch
+        value could not give back.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        raise ValueError(
+            f"Timestamps with a UTC offset are not supported: {value}"
+        )
+    return (value - EPOCH) // MICROSECOND
+
+
+def format_uuid(raw):
+    """
+    Formats the 16 bytes of a UUID in its canonical string form.
+    Faster than str(UUID(bytes=raw)).
+
+    Args:
+        raw (bytes): The UUID bytes.
+
+    Returns:
+        str: The UUID as 'xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx'.
+    """
+    h = raw.hex()
+    return f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}'
+
+
+def from_epoch(value):
+    """
+    Converts microseconds since the epoch back to a naive datetime.
+
+    Args:
+        value (int): Microseconds since 1970-01-01T00:00:00, or None.
+
+    Returns:
+        datetime: The timestamp, or None.
+    """
+    if value is None:
+        return None
+    return EPOCH + timedelta(microseconds=value)
+
 
 class BaseModel:
     """
@@ -22,16 +86,70 @@ class BaseModel:
         created_at (datetime): Timestamp of when the instance was created.
         updated_at (datetime): Timestamp of the last update to the instance.
     """
+    __slots__ = ('_uuid', '_created_at', '_updated_at', '_extra')
+
+    fields = ('id', 'created_at', 'updated_at')
+
     def __init__(self):
         """
         Initializes a new instance of BaseModel with a unique ID and
         timestamps for creation and last update.
         """
-        self.id = str(uuid4())
-        self.created_at = datetime.now()
-        self.updated_at = datetime.now()
+        self._uuid = uuid4().bytes
+        self._created_at = self._updated_at = to_epoch(datetime.now())
+        self._extra = None
         models.store.new(self)
 
+    def _reset(self):
+        """
+        Sets every attribute to its empty value. Used when an instance
+        is created without calling __init__.
+        """
+        self._uuid = None
+        self._created_at = None
+        self._updated_at = None
+        self._extra = None
+
+    @property
+    def id(self):
+        """str: Unique identifier for the instance."""
+        if isinstance(self._uuid, bytes):
+            return format_uuid(self._uuid)
+        return self._uuid
+
+    @id.setter
+    def id(self, value):
+        uuid = None
+        if isinstance(value, str):
+            try:
+                uuid = UUID(value)
+            except ValueError:
+                pass
+        # Ids that are not in canonical UUID form are kept as given so
+        # that they serialize back unchanged.
+        if uuid is not None and str(uuid) == value:
+            self._uuid = uuid.bytes
+        else:
+            self._uuid = value
+
+    @property
+    def created_at(self):
+        """datetime: Timestamp of when the instance was created."""
+        return from_epoch(self._created_at)
+
+    @created_at.setter
+    def created_at(self, value):
+        self._created_at = to_epoch(value)
+
+    @property
+    def updated_at(self):
+        """datetime: Timestamp of the last update to the instance."""
+        return from_epoch(self._updated_at)
+
+    @updated_at.setter
+    def updated_at(self, value):
+        self._updated_at = to_epoch(value)
+
     def __str__(self):
         """
         Returns a string representation of the BaseModel instance.
@@ -40,7 +158,8 @@ class BaseModel:
             str: A string in the format
             '[<class name>] (<id>) <attribute dictionary>'
         """
-        return f'[{self.__class__.__name__}] ({self.id}) {self.__dict__}'
+        attributes = {name: getattr(self, name) for name in self.fields}
+        return f'[{self.__class__.__name__}] ({self.id}) {attributes}'
 
     def to_dict(self):
         """
@@ -52,7 +171,9 @@ class BaseModel:
             datetime objects converted to ISO format strings, and an
             additional '__class__' key with the class name.
         """
-        dictionary = self.__dict__.copy()
+        dictionary = {name: getattr(self, name) for name in self.fields}
+        if self._extra:
+            dictionary.update(self._extra)
         dictionary['__class__'] = self.__class__.__name__
 
         for key, value in dictionary.items():
@@ -72,16 +193,21 @@ class BaseModel:
 
         Returns:
             BaseModel: A new instance populated with values from the
-            provided dictionary.
+            provided dictionary. Keys that are not attributes of the
+            class are kept and written back by to_dict().
         """
         obj = cls.__new__(cls)  # bypass init
+        obj._reset()
         for key, value in data.items():
-            if key in ['created_at', 'updated_at']:
-                setattr(obj, key, datetime.fromisoformat(value))
-            elif key != '__class__':
+            if key in cls.fields:
                 setattr(obj, key, value)
+            elif key != '__class__':
+                if obj._extra is None:
+                    obj._extra = {}
+                obj._extra[key] = value
         return obj
 
     def save(self):
         self.updated_at = datetime.now()
+        models.store.update(self)
         models.store.save()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+service.py
+
+This module defines TaskService, an asyncio interface to the tasks in
+models.store for programs that serve many clients at once.
+
+The storages are not thread-safe, so every access to the store runs in
+one dedicated thread, one at a time; this also keeps reading and writing
+files off the event loop. Writes only change the objects in memory; the
+store is saved shortly after the first write, so that the writes made in
+the meantime are saved together in one disk write. Writes and queries
+made while a save is in progress wait for it, but get() does not: the
+service keeps the loaded tasks by ID itself and answers from them on the
+event loop.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import models
+from models.task import Task
+
+
+class TaskService:
+    """
+    Asynchronous add/get/query/complete/delete of tasks, with
+    write-behind saving.
+
+    Use it as an async context manager, which loads the store on entry
+    and saves any pending changes and stops the store thread on exit:
+
+        async with TaskService() as service:
+            task = await service.add("Buy milk", priority='urgent')
+
+    Attributes:
+        flush_delay (float): Seconds between the first unsaved write and
+            the save that includes it.
+    """
+    def __init__(self, flush_delay=0.05):
+        """
+        Initializes the service.
+
+        Args:
+            flush_delay (float): Seconds to wait before saving, so that
+                the writes made meanwhile are saved together.
+        """
+        self.flush_delay = flush_delay
+        self.__executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='store'
+        )
+        self.__lock = asyncio.Lock()
+        self.__tasks = {}
+        self.__dirty = False
+        self.__flusher = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """
+        Loads the store in the store thread, so that reading the file does
+        not block the event loop, and keeps the tasks by ID for get().
+        """
+        objects = await self.__run(models.store.all)
+        self.__tasks = {
+            obj.id: obj for obj in objects.values() if isinstance(obj, Task)
+        }
+
+    async def close(self):
+        """
+        Saves any pending changes, stops the scheduled save and the store
+        thread.
+        """
+        await self.flush()
+        if self.__flusher is not None:
+            self.__flusher.cancel()
+            self.__flusher = None
+        self.__executor.shutdown()
+
+    async def get(self, id):
+        """
+        Retrieves a task by ID from the tasks loaded by open() and added
+        since, without waiting for a save in progress.
+
+        Args:
+            id (str): The ID of the task.
+
+        Returns:
+            Task: The task, or None if it does not exist.
+        """
+        return self.__tasks.get(id)
+
+    async def query(self, **filters):
+        """
+        Retrieves the tasks matching the given filters. The query runs in
+        the store thread, after a save in progress.
+
+        Args:
+            **filters: Passed to models.store.query(), e.g.
+                status='pending', order_by='due', limit=10.
+
+        Returns:
+            list: The matching tasks.
+        """
+        return await self.__run(
+            lambda: list(models.store.query(**filters).values())
+        )
+
+    async def add(self, title, **fields):
+        """
+        Creates a task.
+
+        Args:
+            title (str): The title of the task.
+            **fields: project_name, duedatetime or priority.
+
+        Returns:
+            Task: The new task. It is saved by the next flush.
+        """
+        async with self.__lock:
+            task = await self.__run(Task, title, **fields)
+            self.__tasks[task.id] = task
+            self.__changed()
+        return task
+
+    async def complete(self, id):
+        """
+        Marks a task as completed.
+
+        Args:
+            id (str): The ID of the task.
+
+        Returns:
+            Task: The task, or None if it does not exist.
+        """
+        def complete():
+            task = models.store.get(Task, id)
+            if task is None or task.status == 'completed':
+                return task, False
+            task.mark_completed()
+            models.store.update(task)
+            return task, True
+
+        async with self.__lock:
+            task, changed = await self.__run(complete)
+            if changed:
+                self.__changed()
+        return task
+
+    async def delete(self, id):
+        """
+        Deletes a task.
+
+        Args:
+            id (str): The ID of the task.
+
+        Returns:
+            bool: True if the task existed.
+        """
+        def delete():
+            task = models.store.get(Task, id)
+            if task is None:
+                return False
+            models.store.delete(task)
+            return True
+
+        async with self.__lock:
+            deleted = await self.__run(delete)
+            if deleted:
+                self.__tasks.pop(id, None)
+                self.__changed()
+        return deleted
+
+    async def flush(self):
+        """
+        Saves the changes made since the last save, if any. Writes and
+        queries wait until the save is done; get() does not.
+        """
+        async with self.__lock:
+            if not self.__dirty:
+                return
+            self.__dirty = False
+            try:
+                await self.__run(models.store.save)
+            except BaseException:
+                self.__dirty = True
+                raise
+
+    async def __run(self, function, *args, **kwargs):
+        """
+        Calls a function in the store thread and waits for its result.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__executor, partial(function, *args, **kwargs)
+        )
+
+    def __changed(self):
+        """
+        Records an unsaved write and schedules a save if none is pending.
+        """
+        self.__dirty = True
+        if self.__flusher is None or self.__flusher.done():
+            self.__flusher = asyncio.get_running_loop().create_task(
+                self.__flush_later()
+            )
+
+    async def __flush_later(self):
+        """
+        Saves after flush_delay seconds. If saving fails, the changes stay
+        pending for the next flush() or close().
+        """
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception:
+            pass
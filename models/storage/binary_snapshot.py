@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+binary_snapshot.py
+This module implements a compact binary snapshot format for FileStorage,
+and converters between it and the JSON file.
+
+A snapshot starts with the MAGIC bytes, followed by one length-prefixed
+record per object. A Task record holds its UUID bytes, epoch timestamps,
+due date included, and status/priority codes in a fixed-size header,
+followed by its strings as one UTF-8 block with their lengths in
+characters in the header, so reading it back needs neither UUID nor ISO
+timestamp parsing. A due date that is not a valid timestamp is kept with
+the strings. Anything the header cannot represent is kept in a JSON
+encoded extra field. Files are read through a memory map.
+
+Snapshots of the first format, MAGIC_V1, kept the due date as text; they
+are still read, and written in the current format at the next rewrite.
+
+Usage:
+    python -m models.storage.binary_snapshot to-binary file.json file.bin
+    python -m models.storage.binary_snapshot to-json file.bin file.json
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from models.base_model import format_uuid
+from models.task import Task
+from models.storage.json_stream import iter_json_items, write_json_items
+
+MAGIC = b'TODOBIN2'
+MAGIC_V1 = b'TODOBIN1'
+
+FRAME = struct.Struct('<I')
+HEADER = struct.Struct('<16sqqqqbb5i')
+HEADER_V1 = struct.Struct('<16sqqqbb5i')
+NONE = -2 ** 63
+# Due date of a task whose due date is not a valid timestamp; the text is
+# kept with the strings.
+DUE_TEXT = NONE + 1
+NO_CODE = -1
+
+
+def is_binary(f):
+    """
+    Checks whether a file holds a binary snapshot, leaving its position
+    unchanged.
+    Args:
+        f: A file open in binary mode.
+    Returns:
+        bool: True if the file starts with MAGIC or MAGIC_V1.
+    """
+    position = f.tell()
+    magic = f.read(len(MAGIC))
+    f.seek(position)
+    return magic in (MAGIC, MAGIC_V1)
+
+
+def encode(obj):
+    """
+    Encodes an object as the payload of a snapshot record.
+    Args:
+        obj: The object to encode.
+    Returns:
+        bytes: The encoded record, without its length prefix.
+    """
+    if not isinstance(obj, Task):
+        strings = [obj.__class__.__name__, None, None, None,
+                   json.dumps(obj.to_dict())]
+        header = (b'', NONE, NONE, NONE, NONE, NO_CODE, NO_CODE)
+    else:
+        # Task keeps these fields in compact form already; they are copied
+        # as they are instead of going through to_dict().
+        extra = dict(obj._extra) if obj._extra else {}
+        uuid = obj._uuid
+        if not isinstance(uuid, bytes):
+            extra['id'] = uuid
+            uuid = b''
+        status = obj._status
+        if not isinstance(status, int):
+            extra['status'] = status
+            status = NO_CODE
+        priority = obj._priority
+        if not isinstance(priority, int):
+            extra['priority'] = priority
+            priority = NO_CODE
+        due = obj._due
+        due_text = None
+        if due is None:
+            due = NONE
+        elif isinstance(due, str):
+            due, due_text = DUE_TEXT, due
+        elif not isinstance(due, int):
+            extra['duedatetime'] = due
+            due = NONE
+        strings = ['Task', obj.title, obj.project_name, due_text,
+                   json.dumps(extra) if extra else None]
+        header = (
+            uuid,
+            NONE if obj._created_at is None else obj._created_at,
+            NONE if obj._updated_at is None else obj._updated_at,
+            NONE if obj._completed_at is None else obj._completed_at,
+            due, status, priority
+        )
+
+    lengths = [-1 if string is None else len(string) for string in strings]
+    text = ''.join(string for string in strings if string is not None)
+    return HEADER.pack(*header, *lengths) + text.encode('utf-8')
+
+
+def decode(buffer, offset, size, models, header=HEADER):
+    """
+    Decodes one snapshot record.
+    Args:
+        buffer: The snapshot contents, e.g. a memory map.
+        offset (int): Position of the record payload in the buffer.
+        size (int): Length of the record payload.
+        models (dict): Classes by name, as in FileStorage.models.
+        header (Struct): HEADER, or HEADER_V1 for a snapshot of the
+        first format.
+    Returns:
+        tuple: The '<class name>.<id>' key and the decoded object.
+    """
+    if header is HEADER:
+        (uuid, created_at, updated_at, completed_at, due_at, status,
+         priority, *lengths) = header.unpack_from(buffer, offset)
+    else:
+        (uuid, created_at, updated_at, completed_at, status, priority,
+         *lengths) = header.unpack_from(buffer, offset)
+        due_at = None
+    text = str(buffer[offset + header.size:offset + size], 'utf-8')
+    strings = []
+    position = 0
+    for length in lengths:
+        if length < 0:
+            strings.append(None)
+        else:
+            strings.append(text[position:position + length])
+            position += length
+    class_name, title, project_name, due, extra = strings
+
+    cls = models[class_name]
+    if not issubclass(cls, Task):
+        obj = cls.from_dict(json.loads(extra))
+        return f"{class_name}.{obj.id}", obj
+
+    # Slots are filled directly; the values are already in the form the
+    # properties of Task would store.
+    obj = cls.__new__(cls)
+    obj._uuid = uuid
+    obj._created_at = None if created_at == NONE else created_at
+    obj._updated_at = None if updated_at == NONE else updated_at
+    obj._completed_at = None if completed_at == NONE else completed_at
+    obj._status = status
+    obj._priority = priority
+    obj._project_name = (
+        None if project_name is None else sys.intern(project_name)
+    )
+    obj._extra = None
+    obj.title = title
+    if due_at is None:
+        obj.duedatetime = due  # Kept as text by the first format.
+    elif due_at == DUE_TEXT:
+        obj._due = due
+    else:
+        obj._due = None if due_at == NONE else due_at
+    if extra is None:
+        return f"{class_name}.{format_uuid(uuid)}", obj
+
+    for key, value in json.loads(extra).items():
+        if key in cls.fields:
+            setattr(obj, key, value)
+        else:
+            if obj._extra is None:
+                obj._extra = {}
+            obj._extra[key] = value
+    return f"{class_name}.{obj.id}", obj
+
+
+def iter_records(f, models):
+    """
+    Yields the objects of a binary snapshot one at a time.
+    Args:
+        f: A binary snapshot file open in binary mode.
+        models (dict): Classes by name, as in FileStorage.models.
+    Yields:
+        tuple: The '<class name>.<id>' key and the object of each record.
+    """
+    if os.fstat(f.fileno()).st_size <= len(MAGIC):
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic = buffer[:len(MAGIC)]
+        if magic == MAGIC:
+            header = HEADER
+        elif magic == MAGIC_V1:
+            header = HEADER_V1
+        else:
+            raise ValueError("Not a binary snapshot")
+        offset = len(MAGIC)
+        end = len(buffer)
+        while offset < end:
+            (size,) = FRAME.unpack_from(buffer, offset)
+            offset += FRAME.size
+            yield decode(buffer, offset, size, models, header)
+            offset += size
+
+
+def write_records(f, items, models):
+    """
+    Writes objects to a binary snapshot.
+    Args:
+        f: A file open for writing in binary mode.
+        items: An iterable of (key, value) pairs, where each value is an
+        object or a dictionary produced by to_dict().
+        models (dict): Classes by name, as in FileStorage.models.
+    """
+    write_payloads(f, (
+        encode(models[key.split('.')[0]].from_dict(value)
+               if isinstance(value, dict) else value)
+        for key, value in items
+    ))
+
+
+def write_payloads(f, payloads):
+    """
+    Writes records already encoded by encode() to a binary snapshot.
+    Args:
+        f: A file open for writing in binary mode.
+        payloads: An iterable of encoded records.
+    """
+    f.write(MAGIC)
+    for payload in payloads:
+        f.write(FRAME.pack(len(payload)))
+        f.write(payload)
+
+
+def json_to_binary(source, destination, models):
+    """
+    Converts a JSON file written by FileStorage to a binary snapshot.
+    Args:
+        source (str): Path of the JSON file.
+        destination (str): Path of the binary snapshot to write.
+        models (dict): Classes by name, as in FileStorage.models.
+    """
+    with open(source, 'r') as src, open(destination, 'wb') as dst:
+        write_records(dst, iter_json_items(src), models)
+
+
+def binary_to_json(source, destination, models):
+    """
+    Converts a binary snapshot to a JSON file readable by FileStorage.
+    Args:
+        source (str): Path of the binary snapshot.
+        destination (str): Path of the JSON file to write.
+        models (dict): Classes by name, as in FileStorage.models.
+    """
+    with open(source, 'rb') as src, open(destination, 'w') as dst:
+        write_json_items(
+            dst,
+            ((key, obj.to_dict()) for key, obj in iter_records(src, models))
+        )
+
+
+if __name__ == '__main__':
+    from models.storage.file_storage import FileStorage
+
+    commands = {'to-binary': json_to_binary, 'to-json': binary_to_json}
+    if len(sys.argv) != 4 or sys.argv[1] not in commands:
+        print(__doc__.split('Usage:')[1].rstrip())
+        sys.exit(1)
+    commands[sys.argv[1]](sys.argv[2], sys.argv[3], FileStorage.models)
@@ -4,9 +4,99 @@ file_storage.py
 This module provides the FileStorage class for serializing and deserializing
 objects to and from a JSON file. It is designed to persist application data
 such as tasks in a file-based storage system.
+
+In journal mode, mutations are appended to a small newline-delimited
+journal next to the JSON file instead of rewriting the whole file. The
+journal is replayed on top of the JSON snapshot by reload() and folded
+back into the snapshot once it grows larger than the snapshot itself.
+
+Loading is lazy and streaming: reload() only marks the file as needing to
+be read, and the file is then parsed one record at a time, so the raw
+document is never held in memory as a whole. get() stops reading at the
+record it needs, and query() on a store that has not been fully loaded
+only builds objects for the records that match its filters.
+
+With binary=True the snapshot is written in the binary format of
+binary_snapshot instead of JSON, which is much faster to load. Either
+format is recognized when reading.
+
+Once the store is fully loaded, secondary indexes by status, priority and
+project_name, and a sorted index of due dates, are built on the first
+query() and kept up to date by new(), update() and delete(), so filtered
+lookups do not scan every object.
+
+Several processes may share the files. Writers hold an advisory fcntl lock
+on a '.lock' file next to the snapshot while they write; readers take no
+lock. The snapshot is replaced atomically by writing a temporary file and
+renaming it, and journal records are appended in a single write. Before
+writing, a store checks whether another process has changed the files
+since it read them; if so, it forgets what it read, keeping its own
+pending changes, so that they are merged with the other process's changes
+instead of overwriting them.
+
+Rewriting the snapshot only serializes the objects that changed since it
+was last written. The serialized form of each record written is kept in
+memory, and new(), update() and delete() mark an object as changed by
+dropping it from that cache, so the next rewrite reuses the text or bytes
+already produced for every other record. Objects must therefore be passed
+to update() (as BaseModel.save() does) after they are modified.
+
+search() answers full-text queries from a SearchIndex kept in a '.search'
+file next to the snapshot. The file records which snapshot and how much
+of the journal it covers; when it is read, only the journal records
+appended since are applied, and it is rebuilt from the files only after
+the snapshot was rewritten by a store that did not have the index loaded.
+new(), update() and delete() keep a loaded index up to date, and it is
+written back whenever the snapshot is rewritten.
+
+Above parallel_min_bytes of JSON snapshot, all() parses the records in
+worker processes, and above parallel_min_records objects to serialize,
+rewriting the snapshot serializes them in worker processes, see
+models.storage.parallel. Results are merged in storage order, so the
+outcome is the same as sequentially.
+
+find_ids() expands ID prefixes with a binary search in a sorted list of
+the keys, kept in a '.ids' file next to the snapshot and caught up with
+the journal like the search index, so it is only built from the records
+once, and kept up to date by new() and delete(). Until the objects are
+loaded, the search runs over the memory-mapped file, see
+models.storage.key_list, so a lookup does not read every key.
+
+With shards, the snapshot is split into several files listed in a JSON
+manifest, which is then what file_path names. Sharding by 'project' keeps
+the tasks of each project in their own file; sharding by 'month' moves
+tasks completed before the current month to one archive file per month of
+completion. Rewriting the snapshot only rewrites the shards that hold a
+changed object, and queries only read the shards that can hold a match:
+query(archived=False), as used by 'list', never reads the archives.
+Shard files are written under a new name at every rewrite, and the
+manifest is replaced last, so readers see either the old set of files or
+the new one; the files it replaced are removed by the next rewrite.
 """
 import json
-from models.task import Task
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from bisect import bisect_left, insort
+from datetime import datetime
+from heapq import nsmallest
+from itertools import chain
+from stat import S_IMODE
+from urllib.parse import quote, unquote
+from models import trace
+from models.base_model import to_epoch
+from models.task import Task, sort_key
+from models.storage import binary_snapshot, key_list, parallel
+from models.storage.search_index import SearchIndex
+from models.storage.json_stream import (
+    format_json_item, iter_json_items, write_json_text
+)
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; writes are not locked.
+    fcntl = None
 
 
 class FileStorage:
@@ -19,19 +109,264 @@ class FileStorage:
     """
     __file_path = 'file.json'
     __objects = {}
+    __compact_min_bytes = 64 * 1024
 
     models = {
         'Task': Task
     }
 
+    indexed = ('status', 'priority', 'project_name')
+
+    shardings = ('project', 'month')
+
+    manifest_version = 1
+
+    # Sizes above which loading and serializing use worker processes, and
+    # how many; see models.storage.parallel.
+    parallel_min_bytes = 32 * 1024 * 1024
+    parallel_min_records = 50000
+    workers = os.cpu_count()
+
+    def __init__(self, journal=False, binary=False, file_path=None,
+                 shards=None):
+        """
+        Initializes the storage.
+        Args:
+            journal (bool): When True, save() appends the pending changes
+            to the journal file instead of rewriting the JSON file.
+            binary (bool): When True, the snapshot is written as a binary
+            snapshot instead of JSON.
+            file_path (str): Path of the snapshot file, 'file.json' by
+            default, or of the manifest when shards are used.
+            shards: The ways the snapshot is split into files, any of
+            'project' and 'month'; see the module documentation.
+        """
+        if file_path is not None:
+            self.__file_path = file_path
+        self.shards = tuple(shards or ())
+        for sharding in self.shards:
+            if sharding not in FileStorage.shardings:
+                raise ValueError(f"Unknown sharding '{sharding}'")
+        self.journal = journal
+        self.binary = binary
+        self.__pending = {}
+        self.__loaded = True
+        self.__journal_records = None
+        self.__deleted = set()
+        self.__indexes = None
+        self.__due_index = []
+        self.__indexed = {}
+        self.__batches = 0
+        self.__seen = None
+        self.__serialized = {}
+        self.__search = None
+        self.__ids = None
+        self.__manifest = None
+        self.__manifest_signature = None
+        self.__origins = {}
+        self.__located = False
+
+    @trace.traced('storage.all')
     def all(self):
         """
         Returns a dictionary of all stored objects.
+        Any records on disk that have not been turned into objects yet are
+        read and deserialized first.
         Returns:
             dict: All objects currently stored in memory.
         """
+        if not self.__loaded:
+            remaining = dict(FileStorage.__objects)
+            merged = {}
+            for key, data in self.__iter_records(in_parallel=True):
+                obj = remaining.pop(key, None)
+                merged[key] = obj if obj is not None else self.__build(
+                    key, data
+                )
+            merged.update(remaining)
+            FileStorage.__objects = merged
+            self.__loaded = True
         return FileStorage.__objects
 
+    def get(self, cls, id):
+        """
+        Retrieves one object by class and ID.
+        Only the requested record is deserialized, and the file is only
+        read up to that record.
+        Args:
+            cls: The class of the object.
+            id (str): The ID of the object.
+        Returns:
+            The object, or None if it does not exist.
+        """
+        return self.get_many(cls, [id]).get(id)
+
+    @trace.traced('storage.get_many')
+    def get_many(self, cls, ids):
+        """
+        Retrieves several objects by class and ID.
+        Only the requested records are deserialized, in a single pass that
+        stops once all of them have been read.
+        Args:
+            cls: The class of the objects.
+            ids: The IDs of the objects.
+        Returns:
+            dict: The objects that exist, keyed by ID, in the order of ids.
+        """
+        wanted = {f"{cls.__name__}.{id}": id for id in ids}
+        found = {}
+        missing = set()
+        for key in wanted:
+            obj = FileStorage.__objects.get(key)
+            if obj is not None:
+                found[key] = obj
+            elif not self.__loaded and key not in self.__deleted:
+                missing.add(key)
+
+        if missing:
+            journal = self.__read_journal()
+            records = [(key, journal[key]) for key in missing
+                       if key in journal]
+            missing.difference_update(journal)
+            if missing:
+                snapshot = self.__iter_snapshot()
+                for key, data in snapshot:
+                    if key in missing:
+                        records.append((key, data))
+                        missing.discard(key)
+                        if not missing:
+                            snapshot.close()
+                            break
+            for key, data in records:
+                if data is not None:
+                    obj = self.__build(key, data)
+                    FileStorage.__objects[key] = obj
+                    found[key] = obj
+        return {id: found[key] for key, id in wanted.items() if key in found}
+
+    @trace.traced('storage.query')
+    def query(self, due_before=None, due_after=None, limit=None,
+              order_by=None, archived=None, **fields):
+        """
+        Retrieves the objects matching all the given filters.
+        If the store is fully loaded, filters on indexed attributes are
+        answered from the indexes. Otherwise the file is streamed and only
+        the matching records are deserialized.
+        Args:
+            due_before: Only match objects due before this datetime.
+            due_after: Only match objects due at or after this datetime.
+            limit (int): Stop after this many matches.
+            order_by (str): Sort the matches, see models.task.sort_key.
+            With a limit, only the first matches in that order are kept,
+            using a heap of that size instead of a full sort.
+            archived (bool): When False, leave out the objects kept in
+            archive shards, without reading them; when True, only match
+            those. Without 'month' sharding nothing is archived.
+            **fields: Attribute values to match, e.g. status='completed'.
+        Returns:
+            dict: The matching objects, keyed by '<class name>.<id>'. When
+            order_by is given they are in that order, when a due date
+            bound is given they are ordered by due date, otherwise in
+            storage order.
+        """
+        if 'month' not in self.shards:
+            if archived:
+                return {}
+            archived = None
+        if order_by is not None:
+            return self.__sorted(
+                order_by, limit, due_before, due_after, archived, fields
+            )
+        if self.__indexes is None and not self.__loaded:
+            return self.__scan(due_before, due_after, limit, archived, fields)
+        self.__build_indexes()
+
+        candidates = [
+            self.__indexes[name].get(value, {})
+            for name, value in fields.items() if name in self.__indexes
+        ]
+        candidates.sort(key=len)
+        if due_before is not None or due_after is not None:
+            low = 0
+            high = len(self.__due_index)
+            if due_after is not None:
+                low = bisect_left(self.__due_index, (to_epoch(due_after), ''))
+            if due_before is not None:
+                high = bisect_left(
+                    self.__due_index, (to_epoch(due_before), '')
+                )
+            keys = (key for _, key in self.__due_index[low:high])
+        elif candidates:
+            keys = candidates.pop(0)
+        else:
+            keys = list(FileStorage.__objects)
+
+        result = {}
+        for key in keys:
+            if not all(key in candidate for candidate in candidates):
+                continue
+            obj = FileStorage.__objects[key]
+            if archived is not None and self.__archived(key, obj) != archived:
+                continue
+            if obj.matches(
+                due_before=due_before, due_after=due_after, **fields
+            ):
+                result[key] = obj
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    @trace.traced('storage.find_ids')
+    def find_ids(self, cls, prefix, limit=None):
+        """
+        Finds the IDs of the objects of a class that start with a prefix,
+        with a binary search in the sorted keys of every object.
+        Args:
+            cls: The class of the objects.
+            prefix (str): The start of the IDs.
+            limit (int): Return at most this many IDs.
+        Returns:
+            list: The matching IDs, in sorted order.
+        """
+        start = f"{cls.__name__}.{prefix}"
+        if self.__ids is None and not self.__loaded:
+            ids = self.__find_saved_ids(start, limit)
+            if ids is not None:
+                return ids
+        keys = self.__id_list()
+        position = bisect_left(keys, start)
+        ids = []
+        while (position < len(keys) and len(ids) != limit
+               and keys[position].startswith(start)):
+            ids.append(keys[position].split('.', 1)[1])
+            position += 1
+        return ids
+
+    @trace.traced('storage.search')
+    def search(self, text, limit=None):
+        """
+        Finds the objects whose title or project name contain every word
+        of a query, or a word starting with it, best matches first.
+        Only the matching objects are deserialized.
+        Args:
+            text (str): The query.
+            limit (int): Return at most this many objects.
+        Returns:
+            dict: The matching objects in order of relevance, keyed by
+            '<class name>.<id>'.
+        """
+        keys = self.__search_index().search(text, limit)
+        ids = {}
+        for key in keys:
+            name, id = key.split('.', 1)
+            ids.setdefault(name, []).append(id)
+        found = {}
+        for name, class_ids in ids.items():
+            objects = self.get_many(FileStorage.models[name], class_ids)
+            for id, obj in objects.items():
+                found[f"{name}.{id}"] = obj
+        return {key: found[key] for key in keys if key in found}
+
     def new(self, obj):
         """
         Adds a new object to the storage dictionary.
@@ -43,40 +378,1276 @@ class FileStorage:
 
         if key in FileStorage.__objects:
             del FileStorage.__objects[key]
+        if self.__ids is not None:
+            position = bisect_left(self.__ids, key)
+            if self.__ids[position:position + 1] != [key]:
+                self.__ids.insert(position, key)
         FileStorage.__objects[key] = obj
+        self.__pending[key] = obj
+        self.__serialized.pop(key, None)
+        self.__deleted.discard(key)
+        self.__index(key)
+        if self.__search is not None:
+            self.__search_add(self.__search, key, obj)
+
+    def update(self, obj):
+        """
+        Records that a stored object has changed so that the next save()
+        persists it.
+        Args:
+            obj: The object that was modified.
+        """
+        key = f"{obj.__class__.__name__}.{obj.id}"
+        if key in FileStorage.__objects:
+            self.__pending[key] = obj
+            self.__serialized.pop(key, None)
+            self.__index(key)
+            if self.__search is not None:
+                self.__search_add(self.__search, key, obj)
 
+    @trace.traced('storage.save')
     def save(self):
         """
-        Serializes all objects to the JSON file.
-        Converts all objects to dictionaries and writes them to the file
-        specified by __file_path.
+        Persists the objects to disk.
+        In journal mode only the objects added, updated or deleted since the
+        last save are appended to the journal, and the journal is compacted
+        into the JSON file once it outgrows it. Otherwise all objects are
+        converted to dictionaries and written to the file specified by
+        __file_path.
+        Inside a batch() block nothing is written until the block exits.
+        """
+        if self.__batches:
+            return
+        with self.__locked():
+            if self.__stale():
+                self.__forget()
+            if not self.journal:
+                self.__compact()
+                return
+            self.__append_journal()
+
+            size = self.__journal_size()
+            if (size > max(self.__compact_min_bytes, self.__snapshot_size())
+                    or self.__month_ended()):
+                self.__compact()
+
+    @trace.traced('storage.refresh')
+    def refresh(self):
+        """
+        Checks whether another process has changed the files since they
+        were read. If so, the objects read from them are forgotten and
+        read again when next needed; pending changes are kept.
+        Returns:
+            bool: True if the files had changed.
+        """
+        if not self.__stale():
+            return False
+        self.__forget()
+        return True
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers save() until the end of a with block, so that all the
+        changes made in the block are written at once. Blocks may be
+        nested; the outermost one saves. If the block raises, nothing is
+        written and the changes stay pending.
+        """
+        self.__batches += 1
+        try:
+            yield self
+        finally:
+            self.__batches -= 1
+        if not self.__batches and self.__pending:
+            self.save()
+
+    @trace.traced('storage.compact')
+    def compact(self):
+        """
+        Writes every object to the JSON file and discards the journal.
+        The new file is written next to the old one, one record at a time,
+        and then moved over it. Records that were never turned into objects
+        are copied from the old file as they are read. Journal records hold
+        the full state of an object, so replaying a journal that survived a
+        crash after this rewrite is harmless.
+        """
+        with self.__locked():
+            if self.__stale():
+                self.__forget()
+            self.__compact()
+
+    def __compact(self):
+        """
+        Rewrites the snapshot; the caller holds the write lock.
+        """
+        if self.shards:
+            self.__compact_shards()
+        else:
+            if self.__loaded:
+                items = FileStorage.__objects.items()
+            else:
+                items = self.__iter_merged()
+            self.__write_snapshot(self.__file_path, items)
+
+        try:
+            os.remove(self.__journal_path())
+        except FileNotFoundError:
+            pass
+        self.__journal_records = {}
+        self.__pending.clear()
+        self.__seen = (self.__snapshot_signature(), 0)
+        if self.__search is not None:
+            self.__write_search_index(self.__search, self.__seen[0], 0)
+        if self.__ids is not None:
+            self.__write_id_list(self.__ids, self.__seen[0], 0)
+
+    def __write_snapshot(self, path, items):
+        """
+        Writes records to a snapshot file, atomically.
+        Args:
+            path (str): The path of the file.
+            items: An iterable of (key, record) pairs, see __serialize().
+        Returns:
+            int: The size of the file written.
+        """
+        fd, temp_path = self.__temp_file(path, self.__file_path)
+        try:
+            if self.binary:
+                with open(fd, 'wb') as f:
+                    binary_snapshot.write_payloads(f, self.__serialize(items))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+            else:
+                with open(fd, 'w') as f:
+                    write_json_text(f, self.__serialize(items))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return size
+
+    def __compact_shards(self):
+        """
+        Rewrites the shards that hold, or will hold, an object changed
+        since the last rewrite, then the manifest; the caller holds the
+        write lock. Once a month has ended, the active shards are
+        rewritten as well, moving the tasks completed during it to their
+        archive shard.
+        """
+        self.__manifest = None
+        manifest = self.__read_manifest()
+        shards = manifest['shards']
+        month_start = self.__month_start()
+        directory = os.path.dirname(os.path.abspath(self.__file_path))
+
+        changed = dict(self.__read_journal())
+        changed.update(self.__pending)
+        for key, record in changed.items():
+            if record is not None:
+                changed[key] = FileStorage.__objects.get(key, record)
+
+        # Find the shard each changed object was in, reading the keys of
+        # the shards that have not been read if some are not known yet.
+        unknown = {key for key in changed if key not in self.__origins}
+        if unknown and not self.__located:
+            for name, entry in shards.items():
+                path = os.path.join(directory, entry['file'])
+                for key, _ in self.__iter_file(path):
+                    if key in unknown:
+                        self.__origins[key] = name
+
+        dirty = {
+            self.__origins[key] for key in changed if key in self.__origins
+        }
+        dirty.update(
+            self.__placement(record, month_start)
+            for record in changed.values() if record is not None
+        )
+        if self.__month_ended():
+            dirty.update(
+                name for name, entry in shards.items() if 'month' not in entry
+            )
+
+        # Records that stay in a shard keep their place; the others are
+        # added at the end of the shard they move to.
+        kept = {}
+        moved = {}
+        placed = set()
+        queue = sorted(dirty)
+        while queue:
+            name = queue.pop()
+            if name in kept:
+                continue
+            kept[name] = []
+            entry = shards.get(name)
+            if entry is None:
+                continue
+            for key, record in self.__iter_file(
+                os.path.join(directory, entry['file'])
+            ):
+                placed.add(key)
+                if key in changed:
+                    record = changed[key]
+                    if record is None:
+                        continue
+                else:
+                    record = FileStorage.__objects.get(key, record)
+                target = self.__placement(record, month_start)
+                if target == name:
+                    kept[name].append((key, record))
+                else:
+                    moved.setdefault(target, []).append((key, record))
+                    queue.append(target)
+        for key, record in changed.items():
+            if record is not None and key not in placed:
+                target = self.__placement(record, month_start)
+                moved.setdefault(target, []).append((key, record))
+
+        generation = manifest['generation'] + 1
+        stem = os.path.splitext(os.path.basename(self.__file_path))[0]
+        extension = '.bin' if self.binary else '.json'
+        retired = []
+        for name, items in kept.items():
+            items.extend(moved.get(name, ()))
+            if name in shards:
+                retired.append(shards[name]['file'])
+            if not items:
+                shards.pop(name, None)
+                continue
+            file = f"{stem}.{name}.{generation}{extension}"
+            size = self.__write_snapshot(os.path.join(directory, file), items)
+            shards[name] = dict(
+                self.__shard_entry(name), file=file, count=len(items),
+                size=size
+            )
+            for key, _ in items:
+                self.__origins[key] = name
+        for key, record in changed.items():
+            if record is None:
+                self.__origins.pop(key, None)
+
+        # Nobody reads the files replaced by the previous rewrite anymore.
+        for file in manifest['retired']:
+            try:
+                os.remove(os.path.join(directory, file))
+            except FileNotFoundError:
+                pass
+        manifest = {
+            'version': FileStorage.manifest_version,
+            'generation': generation,
+            'month': month_start[:7],
+            'shards': shards,
+            'retired': retired,
+        }
+        fd, temp_path = self.__temp_file(self.__file_path)
+        try:
+            with open(fd, 'w') as f:
+                json.dump(manifest, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.__file_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.__manifest = manifest
+        self.__manifest_signature = self.__snapshot_signature()
+
+    def __read_manifest(self):
+        """
+        Reads the manifest of the shards, if this has not been done since
+        the last reload(). A missing or empty file means no shards have
+        been written yet.
+        Returns:
+            dict: The manifest.
+        """
+        if self.__manifest is not None:
+            return self.__manifest
+        manifest = None
+        signature = None
+        try:
+            with open(self.__file_path, 'r') as f:
+                stat = os.fstat(f.fileno())
+                signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                text = f.read()
+            if text.strip():
+                manifest = json.loads(text)
+        except FileNotFoundError:
+            pass
+        if manifest is None:
+            manifest = {
+                'version': FileStorage.manifest_version,
+                'generation': 0,
+                'month': None,
+                'shards': {},
+                'retired': [],
+            }
+        elif manifest.get('version') != FileStorage.manifest_version:
+            raise ValueError(
+                f"{self.__file_path} is not a shard manifest this version"
+                " can read"
+            )
+        self.__manifest = manifest
+        self.__manifest_signature = signature
+        return manifest
+
+    def __shard_names(self, fields=None, archived=None):
+        """
+        Returns the shards that can hold objects matching query filters,
+        the active shards first and then the archives by month.
+        Args:
+            fields (dict): Attribute values to match.
+            archived (bool): Whether to match archived objects only, see
+            query().
+        Returns:
+            list: The names of the shards.
+        """
+        fields = fields or {}
+        active = []
+        archives = []
+        for name, entry in self.__read_manifest()['shards'].items():
+            if 'month' in entry:
+                # Archive shards only hold completed tasks.
+                if archived is False or fields.get('status', 'completed') \
+                        != 'completed':
+                    continue
+                archives.append(name)
+            else:
+                if archived:
+                    continue
+                if 'project' in entry and entry['project'] != fields.get(
+                    'project_name', entry['project']
+                ):
+                    continue
+                active.append(name)
+        return active + sorted(archives)
+
+    def __placement(self, record, month_start):
+        """
+        Returns the shard a record belongs in.
+        Args:
+            record: An object or the dictionary read for it.
+            month_start (str): The start of the current month, in ISO
+            format; tasks completed before it are archived.
+        Returns:
+            str: The name of the shard.
+        """
+        if isinstance(record, dict):
+            status = record.get('status')
+            project_name = record.get('project_name')
+            completed_at = record.get('completed_at')
+        else:
+            status = getattr(record, 'status', None)
+            project_name = getattr(record, 'project_name', None)
+            completed_at = self.__isoformat(
+                getattr(record, 'completed_at', None)
+            )
+        if ('month' in self.shards and status == 'completed'
+                and completed_at and completed_at < month_start):
+            return 'archive-' + completed_at[:7]
+        if 'project' in self.shards and project_name is not None:
+            return 'project-' + quote(project_name, safe='')
+        return 'tasks'
+
+    def __shard_entry(self, name):
+        """
+        Returns what the manifest records about the contents of a shard,
+        from which queries decide whether to read it.
+        """
+        if name.startswith('archive-'):
+            return {'month': name[len('archive-'):]}
+        if name.startswith('project-'):
+            return {'project': unquote(name[len('project-'):])}
+        if 'project' in self.shards:
+            return {'project': None}
+        return {}
+
+    def __archived(self, key, record):
+        """
+        Tells whether an object is archived: kept in an archive shard, or
+        for a change not written to the shards yet, going to be.
+        """
+        if key in self.__pending or key in self.__read_journal():
+            return self.__placement(
+                record, self.__month_start()
+            ).startswith('archive-')
+        return self.__origins.get(key, '').startswith('archive-')
+
+    @staticmethod
+    def __temp_file(path, like=None):
+        """
+        Creates the temporary file that is written, then renamed over a
+        file to replace it atomically. It gets the permissions of the file
+        it replaces, or else of the file like, or else those of a new file,
+        instead of the 0600 of mkstemp().
+        Args:
+            path (str): The file to replace.
+            like (str): A file whose permissions to use if path is missing.
+        Returns:
+            tuple: The descriptor and the path of the temporary file.
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        mode = None
+        for source in (path, like):
+            if source is None:
+                continue
+            try:
+                mode = S_IMODE(os.stat(source).st_mode)
+                break
+            except FileNotFoundError:
+                pass
+        if mode is None:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        fd, temp_path = tempfile.mkstemp(
+            prefix=name + '.', suffix='.tmp', dir=directory
+        )
+        try:
+            os.fchmod(fd, mode)
+        except BaseException:
+            os.close(fd)
+            os.remove(temp_path)
+            raise
+        return fd, temp_path
+
+    @staticmethod
+    def __month_start():
+        """
+        Returns the start of the current month in ISO format.
+        """
+        return datetime.now().strftime('%Y-%m-01T00:00:00')
+
+    def __month_ended(self):
+        """
+        Tells whether a month ended since the shards were written, so that
+        the tasks completed during it are due to be archived.
+        """
+        if 'month' not in self.shards:
+            return False
+        manifest = self.__read_manifest()
+        return bool(manifest['shards']) and (
+            manifest['month'] != self.__month_start()[:7]
+        )
+
+    def __snapshot_size(self):
+        """
+        Returns the size of the snapshot, the total size of the shards
+        when there are shards, 0 if there is none.
+        """
+        if self.shards:
+            return sum(
+                entry['size']
+                for entry in self.__read_manifest()['shards'].values()
+            )
+        try:
+            return os.path.getsize(self.__file_path)
+        except FileNotFoundError:
+            return 0
+
+    def __serialize(self, items):
+        """
+        Yields the serialized form of each record for the snapshot format
+        in use: reused from the last rewrite for objects that have not
+        changed since, produced and cached for the others.
+        Args:
+            items: An iterable of (key, record) pairs, where a record is an
+            object or a dictionary read from disk.
+        Yields:
+            The text of a JSON item or the bytes of a binary record.
+        """
+        cache = self.__serialized
+        produced = None
+        if (hasattr(items, '__len__')
+                and len(items) >= self.parallel_min_records
+                and parallel.available(self.workers)):
+            items = list(items)
+            misses = []
+            for key, data in items:
+                cached = cache.get(key)
+                if cached is None or cached[0] is not data:
+                    misses.append((key, data))
+            if len(misses) >= self.parallel_min_records:
+                produced = iter(parallel.serialize(
+                    misses, self.binary, FileStorage.models, self.workers
+                ))
+        for key, data in items:
+            cached = cache.get(key)
+            if cached is not None and cached[0] is data:
+                yield cached[1]
+                continue
+            if trace.enabled:
+                trace.count('objects.serialized')
+            if produced is not None:
+                serialized = next(produced)
+            elif self.binary:
+                obj = data
+                if isinstance(data, dict):
+                    obj = FileStorage.models[key.split('.')[0]].from_dict(data)
+                serialized = binary_snapshot.encode(obj)
+            else:
+                serialized = format_json_item(
+                    key, data if isinstance(data, dict) else data.to_dict()
+                )
+            if not isinstance(data, dict):
+                cache[key] = (data, serialized)
+            yield serialized
+
+    def __append_journal(self):
+        """
+        Appends the pending changes to the journal in a single write; the
+        caller holds the write lock.
+        """
+        journal = self.__journal_records
+        lines = []
+        for key, obj in self.__pending.items():
+            if obj is None:
+                record = {'op': 'delete', 'key': key}
+                data = None
+            else:
+                data = obj.to_dict()
+                record = {'op': 'put', 'key': key, 'data': data}
+            lines.append(json.dumps(record, separators=(',', ':')) + '\n')
+            if trace.enabled:
+                trace.count('objects.serialized')
+            if journal is not None:
+                journal[key] = data
+        self.__pending.clear()
+        if not lines:
+            return
+
+        with open(self.__journal_path(), 'ab') as f:
+            # A save that was interrupted may have left half a line.
+            if f.tell() and not self.__ends_with_newline(f):
+                lines.insert(0, '\n')
+            f.write(''.join(lines).encode('utf-8'))
+            size = f.tell()
+        if self.__seen is not None:
+            self.__seen = (self.__seen[0], size)
+
+    @staticmethod
+    def __ends_with_newline(f):
+        """
+        Tells whether a file open for appending ends with a newline.
         """
-        new_dictionary = {
-            key: obj.to_dict() for key, obj in FileStorage.__objects.items()
+        with open(f.name, 'rb') as reader:
+            reader.seek(-1, os.SEEK_END)
+            return reader.read(1) == b'\n'
+
+    @contextmanager
+    def __locked(self):
+        """
+        Holds the exclusive write lock, an advisory lock on the '.lock'
+        file next to the snapshot.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(self.__file_path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def __stale(self):
+        """
+        Tells whether the snapshot or the journal changed on disk since
+        this store read them.
+        """
+        if self.__seen is None:
+            return False
+        snapshot, journal_size = self.__seen
+        return (snapshot != self.__snapshot_signature()
+                or journal_size != self.__journal_size())
+
+    def __forget(self):
+        """
+        Drops every object read from disk, keeping the pending changes,
+        so that the files are read again when needed.
+        """
+        FileStorage.__objects = {
+            key: obj for key, obj in self.__pending.items()
+            if obj is not None
         }
-        with open(FileStorage.__file_path, 'w') as f:
-            json.dump(new_dictionary, f, indent=4)
+        self.__deleted = {
+            key for key, obj in self.__pending.items() if obj is None
+        }
+        self.__loaded = False
+        self.__journal_records = None
+        self.__indexes = None
+        self.__seen = None
+        self.__serialized = {}
+        self.__search = None
+        self.__ids = None
+        self.__manifest = None
+        self.__manifest_signature = None
+        self.__origins = {}
+        self.__located = False
+
+    def __snapshot_signature(self):
+        """
+        Returns what identifies the current version of the snapshot file:
+        its inode, modification time and size, or None if it is missing.
+        """
+        try:
+            stat = os.stat(self.__file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def __journal_size(self):
+        """
+        Returns the size of the journal file, 0 if it is missing.
+        """
+        try:
+            return os.path.getsize(self.__journal_path())
+        except FileNotFoundError:
+            return 0
 
+    @trace.traced('storage.reload')
     def reload(self):
         """
-        Deserializes objects from the JSON file and loads them into memory.
-        If the file does not exist, a message is printed indicating that no
-        tasks have been created yet.
+        Marks the JSON file and its journal as needing to be read.
+        Nothing is parsed until objects are first asked for.
+        """
+        self.__loaded = False
+        self.__journal_records = None
+        self.__deleted = set()
+        self.__indexes = None
+        self.__seen = None
+        self.__serialized = {}
+        self.__search = None
+        self.__ids = None
+        self.__manifest = None
+        self.__manifest_signature = None
+        self.__origins = {}
+        self.__located = False
+
+    def __iter_snapshot(self, names=None, in_parallel=False):
+        """
+        Yields the records of the snapshot one at a time: dictionaries for
+        a JSON file, objects for a binary snapshot.
+        Args:
+            names (list): With shards, the shards to read, by default all
+            of them.
+            in_parallel (bool): Build the objects in worker processes if the
+            files are large enough; records are then objects.
+        Yields:
+            tuple: The (key, record) pair of each record.
+        """
+        if not self.shards:
+            paths = [self.__file_path]
+            located = None
+        else:
+            shards = self.__read_manifest()['shards']
+            directory = os.path.dirname(os.path.abspath(self.__file_path))
+            located = names is None
+            if names is None:
+                names = self.__shard_names()
+            paths = [
+                os.path.join(directory, shards[name]['file'])
+                for name in names
+            ]
+        if in_parallel and self.__parallel_load(paths):
+            records = parallel.load_json(
+                paths, FileStorage.models, self.workers
+            )
+            for index, key, data in records:
+                if self.shards:
+                    self.__origins[key] = names[index]
+                yield key, data
+        else:
+            for index, path in enumerate(paths):
+                for key, data in self.__iter_file(path):
+                    if self.shards:
+                        self.__origins[key] = names[index]
+                    yield key, data
+        if located:
+            self.__located = True
+
+    def __parallel_load(self, paths):
+        """
+        Tells whether snapshot files are worth reading in worker
+        processes: whether there are several workers, the files are JSON
+        snapshots and together hold at least parallel_min_bytes.
+        """
+        if not parallel.available(self.workers):
+            return False
+        size = 0
+        for path in paths:
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return (size >= self.parallel_min_bytes
+                and all(parallel.splittable(path) for path in paths))
+
+    @staticmethod
+    def __iter_file(path):
+        """
+        Yields the records of a snapshot file one at a time.
+        A missing or empty file means no tasks have been created yet.
+        Args:
+            path (str): The path of the file.
+        Yields:
+            tuple: The (key, record) pair of each record.
         """
         try:
-            with open(FileStorage.__file_path, 'r') as f:
-                data = json.load(f)
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            if binary_snapshot.is_binary(f):
+                yield from binary_snapshot.iter_records(f, FileStorage.models)
+                return
+        with open(path, 'r') as f:
+            yield from iter_json_items(f)
 
-                for key, value in data.items():
-                    class_name = key.split('.')[0]
-                    cls = FileStorage.models[class_name]
-                    obj = cls.from_dict(value)
-                    FileStorage.__objects[key] = obj
-                    # print({key: obj})
+    def __iter_records(self, names=None, in_parallel=False):
+        """
+        Yields the current records on disk: those of the JSON file with the
+        journal replayed on top, skipping objects deleted since reload().
+        Args:
+            names (list): With shards, the shards to read; every journal
+            record is yielded either way.
+            in_parallel (bool): See __iter_snapshot().
+        Yields:
+            tuple: The (key, dictionary) pair of each record.
+        """
+        remaining = dict(self.__read_journal())
+        for key, data in self.__iter_snapshot(names, in_parallel):
+            if key in remaining:
+                data = remaining.pop(key)
+            if data is not None and key not in self.__deleted:
+                yield key, data
+        for key, data in remaining.items():
+            if data is not None and key not in self.__deleted:
+                yield key, data
+
+    def __iter_merged(self):
+        """
+        Yields every stored object, in storage order, using the objects in
+        memory in place of their records on disk.
+        Yields:
+            tuple: The (key, record) pair of each object, where the record
+            is an object or a dictionary read from disk.
+        """
+        remaining = dict(FileStorage.__objects)
+        for key, data in self.__iter_records():
+            obj = remaining.pop(key, None)
+            yield key, obj if obj is not None else data
+        yield from remaining.items()
+
+    def __read_journal(self):
+        """
+        Reads the journal file, if this has not been done since the last
+        reload(). Incomplete lines, left by an interrupted save, are
+        skipped.
+        Returns:
+            dict: The latest dictionary of each object in the journal, or
+            None for deleted objects, keyed by '<class name>.<id>'.
+        """
+        if self.__journal_records is not None:
+            return self.__journal_records
+        if self.shards:
+            # Shards are read through the manifest read first; if it was
+            # replaced since, the store is stale.
+            self.__read_manifest()
+            snapshot = self.__manifest_signature
+        else:
+            snapshot = self.__snapshot_signature()
+        records = {}
+        size = 0
+        try:
+            with open(self.__journal_path(), 'rb') as f:
+                for line in f:
+                    size += len(line)
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    records[record['key']] = record.get('data')
         except FileNotFoundError:
-            # print("No task created yet")
             pass
-    
+        self.__journal_records = records
+        self.__seen = (snapshot, size)
+        return records
+
+    def __sorted(self, order_by, limit, due_before, due_after, archived,
+                 fields):
+        """
+        Answers a query sorted by order_by. Once the due date index has
+        been built, it is walked in order and the walk stops at the limit.
+        Otherwise the first matches are picked with a heap, in
+        O(n log limit).
+        Returns:
+            dict: The matching objects in order, keyed by
+            '<class name>.<id>'.
+        """
+        order = sort_key(order_by)
+        bounded = due_before is not None or due_after is not None
+        if order_by == 'due' and bounded:
+            # Queries with a due date bound are ordered by due date already.
+            return self.query(
+                due_before=due_before, due_after=due_after, limit=limit,
+                archived=archived, **fields
+            )
+        if order_by == 'due' and self.__indexes is not None:
+            # Objects without a due date are not in the index; they come
+            # after all the others.
+            keys = chain(
+                (key for _, key in self.__due_index),
+                (key for key, values in self.__indexed.items()
+                 if values[-1] is None)
+            )
+            result = {}
+            for key in keys:
+                obj = FileStorage.__objects[key]
+                if (archived is not None
+                        and self.__archived(key, obj) != archived):
+                    continue
+                if obj.matches(
+                    due_before=due_before, due_after=due_after, **fields
+                ):
+                    result[key] = obj
+                    if limit is not None and len(result) >= limit:
+                        break
+            return result
+
+        items = self.query(
+            due_before=due_before, due_after=due_after, archived=archived,
+            **fields
+        ).items()
+        if limit is None:
+            return dict(sorted(items, key=lambda item: order(item[1])))
+        return dict(
+            nsmallest(limit, items, key=lambda item: order(item[1]))
+        )
+
+    def __scan(self, due_before, due_after, limit, archived, fields):
+        """
+        Answers a query by streaming the records on disk, only building
+        objects for the records that match. With shards, only the shards
+        that can hold a match are read.
+        Returns:
+            dict: The matching objects, keyed by '<class name>.<id>'.
+        """
+        ordered = due_before is not None or due_after is not None
+        names = None
+        if self.shards:
+            names = self.__shard_names(fields, archived)
+        result = {}
+        for key, data in self.__iter_records(names):
+            if archived is not None and self.__archived(key, data) != archived:
+                continue
+            obj = FileStorage.__objects.get(key)
+            if obj is None:
+                if not self.__record_matches(
+                    data, due_before, due_after, fields
+                ):
+                    continue
+                obj = self.__build(key, data)
+                FileStorage.__objects[key] = obj
+            elif not obj.matches(
+                due_before=due_before, due_after=due_after, **fields
+            ):
+                continue
+            result[key] = obj
+            if not ordered and limit is not None and len(result) >= limit:
+                return result
+
+        for key, obj in self.__pending.items():
+            if obj is None or key in result:
+                continue
+            if archived is not None and self.__archived(key, obj) != archived:
+                continue
+            if obj.matches(
+                due_before=due_before, due_after=due_after, **fields
+            ):
+                result[key] = obj
+        if ordered:
+            order = sort_key('due')
+            result = dict(sorted(
+                result.items(), key=lambda item: order(item[1])
+            ))
+        if limit is not None:
+            result = dict(list(result.items())[:limit])
+        return result
+
+    @classmethod
+    def __record_matches(cls, data, due_before, due_after, fields):
+        """
+        Checks a record read from disk against query filters.
+        Returns:
+            bool: True if the record satisfies every filter.
+        """
+        if not isinstance(data, dict):
+            return data.matches(
+                due_before=due_before, due_after=due_after, **fields
+            )
+        for name, value in fields.items():
+            if data.get(name) != value:
+                return False
+        if due_before is None and due_after is None:
+            return True
+        due = data.get('duedatetime')
+        if not due:
+            return False
+        try:
+            due = to_epoch(due)
+        except (TypeError, ValueError, AttributeError):
+            return False  # Not a valid due date, as in Task.matches().
+        if due_before is not None and not due < to_epoch(due_before):
+            return False
+        if due_after is not None and not due >= to_epoch(due_after):
+            return False
+        return True
+
+    def __build_indexes(self):
+        """
+        Loads every object and builds the secondary indexes, if they have
+        not been built since the last reload().
+        """
+        if self.__indexes is not None:
+            return
+        self.__indexes = {name: {} for name in FileStorage.indexed}
+        self.__due_index = []
+        self.__indexed = {}
+        for key in self.all():
+            self.__index(key)
+
+    def __index(self, key):
+        """
+        Adds an object to the indexes, replacing the entries it had before.
+        Args:
+            key (str): The '<class name>.<id>' key of the object.
+        """
+        if self.__indexes is None:
+            return
+        obj = FileStorage.__objects[key]
+        values = [getattr(obj, name, None) for name in self.__indexes]
+        values.append(getattr(obj, 'due_epoch', None))
+        values = tuple(values)
+
+        if self.__indexed.get(key) == values:
+            return
+        self.__unindex(key)
+        for name, value in zip(self.__indexes, values):
+            self.__indexes[name].setdefault(value, {})[key] = None
+        if values[-1] is not None:
+            insort(self.__due_index, (values[-1], key))
+        self.__indexed[key] = values
+
+    def __unindex(self, key):
+        """
+        Removes an object from the indexes.
+        Args:
+            key (str): The '<class name>.<id>' key of the object.
+        """
+        values = self.__indexed.pop(key, None)
+        if values is None:
+            return
+        for name, value in zip(self.__indexes, values):
+            entries = self.__indexes[name][value]
+            del entries[key]
+            if not entries:
+                del self.__indexes[name][value]
+        if values[-1] is not None:
+            position = bisect_left(self.__due_index, (values[-1], key))
+            del self.__due_index[position]
+
+    @staticmethod
+    def __isoformat(value):
+        """
+        Returns a timestamp as an ISO string, the form records read from
+        disk keep it in.
+        """
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value or None
+
+    def __build(self, key, data):
+        """
+        Creates an object from its stored record.
+        Args:
+            key (str): The '<class name>.<id>' key of the record.
+            data: The dictionary produced by to_dict(), or the object
+            itself when it was read from a binary snapshot.
+        Returns:
+            The deserialized object.
+        """
+        if trace.enabled:
+            trace.count('objects.built')
+        if not isinstance(data, dict):
+            return data
+        cls = FileStorage.models[key.split('.')[0]]
+        return cls.from_dict(data)
+
+    def __search_index(self):
+        """
+        Returns the search index, reading it from its file and applying
+        the journal records appended since it was written, or building it
+        from the files if it does not match the snapshot. The pending
+        changes are then applied to it.
+        Returns:
+            SearchIndex: The index of every stored object.
+        """
+        if self.__search is not None:
+            return self.__search
+        index = snapshot = offset = None
+        try:
+            with open(self.__search_path(), 'r') as f:
+                data = json.load(f)
+            index = SearchIndex.from_dict(data)
+            snapshot = data['snapshot']
+            offset = data['journal']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        current = self.__snapshot_signature()
+        current = list(current) if current is not None else None
+        replayed = None
+        if index is not None and snapshot == current:
+            replayed = self.__replay_journal(
+                offset, lambda key, data: self.__search_add(index, key, data),
+                index.remove
+            )
+        if replayed is None:
+            index = SearchIndex()
+            for key, data in self.__iter_snapshot():
+                self.__search_add(index, key, data)
+            offset = None
+            replayed = self.__replay_journal(
+                0, lambda key, data: self.__search_add(index, key, data),
+                index.remove
+            )
+        if replayed != offset:
+            self.__write_search_index(index, current, replayed)
+
+        for key, obj in self.__pending.items():
+            if obj is None:
+                index.remove(key)
+            else:
+                self.__search_add(index, key, obj)
+        self.__search = index
+        return index
+
+    def __replay_journal(self, offset, add, remove):
+        """
+        Applies the complete journal records found after offset to an
+        index of the records.
+        Args:
+            offset (int): Position in the journal the index is up to date
+            with.
+            add: Called with the key and the data of each record written.
+            remove: Called with the key of each record deleted.
+        Returns:
+            int: The position up to which records were applied, or None if
+            the journal is shorter than offset.
+        """
+        try:
+            f = open(self.__journal_path(), 'rb')
+        except FileNotFoundError:
+            return 0 if offset == 0 else None
+        with f:
+            if os.fstat(f.fileno()).st_size < offset:
+                return None
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Still being written, or left by a crash.
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                data = record.get('data')
+                if data is None:
+                    remove(record['key'])
+                else:
+                    add(record['key'], data)
+        return offset
+
+    def __write_search_index(self, index, snapshot, offset):
+        """
+        Writes a search index to its file, atomically. The index is only
+        a cache of the other files, so failing to write it is ignored.
+        Args:
+            index (SearchIndex): The index.
+            snapshot: The signature of the snapshot the index matches.
+            offset (int): Position in the journal it is up to date with.
+        """
+        data = index.to_dict()
+        data['snapshot'] = list(snapshot) if snapshot is not None else None
+        data['journal'] = offset
+        path = self.__search_path()
+        try:
+            fd, temp_path = self.__temp_file(path, self.__file_path)
+        except OSError:
+            return
+        try:
+            with open(fd, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except OSError:
+            os.remove(temp_path)
+
+    @staticmethod
+    def __search_add(index, key, data):
+        """
+        Adds a record to a search index.
+        Args:
+            index (SearchIndex): The index.
+            key (str): The '<class name>.<id>' key of the record.
+            data: The dictionary produced by to_dict(), or the object.
+        """
+        if isinstance(data, dict):
+            index.add(key, data.get('title'), data.get('project_name'))
+        else:
+            index.add(
+                key, getattr(data, 'title', None),
+                getattr(data, 'project_name', None)
+            )
+
+    def __find_saved_ids(self, start, limit):
+        """
+        Finds the keys that start with a prefix in the '.ids' file, with a
+        binary search over the file, then applies the journal records
+        appended since it was written and the pending changes.
+        Args:
+            start (str): The start of the keys.
+            limit (int): Return at most this many IDs.
+        Returns:
+            list: The matching IDs, in sorted order, or None if the file is
+            missing or does not match the snapshot.
+        """
+        changes = {}
+
+        def add(key, data=None):
+            changes[key] = True
+
+        def remove(key):
+            changes[key] = False
+
+        current = self.__snapshot_signature()
+        current = list(current) if current is not None else None
+        try:
+            with open(self.__ids_path(), 'rb') as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buffer:
+                header, first = key_list.read_header(buffer)
+                if header.get('snapshot') != current:
+                    return None
+                if self.__replay_journal(
+                    header['journal'], add, remove
+                ) is None:
+                    return None
+                for key, obj in self.__pending.items():
+                    changes[key] = obj is not None
+                # Read enough keys to make up for the ones deleted since.
+                removed = sum(
+                    1 for key, present in changes.items()
+                    if not present and key.startswith(start)
+                )
+                keys = key_list.find(
+                    buffer, start, first,
+                    None if limit is None else limit + removed
+                )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        keys = {key for key in keys if changes.get(key, True)}
+        keys.update(
+            key for key, present in changes.items()
+            if present and key.startswith(start)
+        )
+        return [key.split('.', 1)[1] for key in sorted(keys)[:limit]]
+
+    def __id_list(self):
+        """
+        Returns the sorted keys of every stored object, read from the
+        records without building objects unless they are loaded, and
+        saves them to the '.ids' file for find_ids(). The pending changes
+        are then applied to them.
+        Returns:
+            list: The keys, in sorted order.
+        """
+        if self.__ids is not None:
+            return self.__ids
+        if self.__loaded:
+            self.__ids = sorted(FileStorage.__objects)
+            return self.__ids
+
+        def add(key, data=None):
+            position = bisect_left(ids, key)
+            if ids[position:position + 1] != [key]:
+                ids.insert(position, key)
+
+        def remove(key):
+            position = bisect_left(ids, key)
+            if ids[position:position + 1] == [key]:
+                del ids[position]
+
+        ids = sorted(key for key, _ in self.__iter_snapshot())
+        replayed = self.__replay_journal(0, add, remove)
+        self.__write_id_list(ids, self.__snapshot_signature(), replayed)
+
+        for key, obj in self.__pending.items():
+            if obj is None:
+                remove(key)
+            else:
+                add(key)
+        self.__ids = ids
+        return ids
+
+    def __write_id_list(self, ids, snapshot, offset):
+        """
+        Writes the sorted keys to the '.ids' file, atomically: a JSON
+        header line, then one key per line. The file is only a cache of
+        the other files, so failing to write it is ignored.
+        Args:
+            ids (list): The keys, in sorted order.
+            snapshot: The signature of the snapshot the keys match.
+            offset (int): Position in the journal they are up to date with.
+        """
+        header = {
+            'snapshot': list(snapshot) if snapshot is not None else None,
+            'journal': offset,
+        }
+        path = self.__ids_path()
+        try:
+            fd, temp_path = self.__temp_file(path, self.__file_path)
+        except OSError:
+            return
+        try:
+            with open(fd, 'w') as f:
+                key_list.write(f, header, ids)
+            os.replace(temp_path, path)
+        except OSError:
+            os.remove(temp_path)
+
+    def __ids_path(self):
+        """
+        Returns the path of the sorted keys kept next to the JSON file.
+        """
+        return self.__file_path + '.ids'
+
+    def __search_path(self):
+        """
+        Returns the path of the search index kept next to the JSON file.
+        """
+        return self.__file_path + '.search'
+
+    def __journal_path(self):
+        """
+        Returns the path of the journal file kept next to the JSON file.
+        """
+        return self.__file_path + '.journal'
+
     def delete(self, obj):
         """
         Removes the specified object from the storage.
@@ -85,6 +1656,17 @@ class FileStorage:
         Returns:
             None
         """
-        
+
         key = f"{obj.__class__.__name__}.{obj.id}"
         FileStorage.__objects.pop(key, None)
+        self.__deleted.add(key)
+        if self.__ids is not None:
+            position = bisect_left(self.__ids, key)
+            if self.__ids[position:position + 1] == [key]:
+                del self.__ids[position]
+        self.__pending[key] = None
+        self.__serialized.pop(key, None)
+        if self.__indexes is not None:
+            self.__unindex(key)
+        if self.__search is not None:
+            self.__search.remove(key)
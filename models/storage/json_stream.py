@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+json_stream.py
+This module reads and writes the JSON object stored by FileStorage one
+item at a time, so that large files never have to be held in memory as a
+whole. The layout written is the same as json.dump(..., indent=4).
+"""
+import json
+
+
+def iter_json_items(f, chunk_size=64 * 1024, array=False):
+    """
+    Yields the items of the JSON object stored in a file one at a time,
+    reading the file in chunks.
+    Args:
+        f: A text file positioned at the start of a JSON object.
+        chunk_size (int): Number of characters read at a time.
+        array (bool): Also accept a JSON array, whose values are then
+        yielded with their position, from 0, as key.
+    Yields:
+        tuple: The (key, value) pairs of the object, in file order.
+    Raises:
+        ValueError: If the file does not hold a JSON object, or an array
+        when array is True.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    expected = '{'
+    closing = '}'
+    key = None
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\n\r':
+            position += 1
+        if position == len(buffer):
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if expected == '{':
+                    return
+                raise ValueError("Unexpected end of JSON file")
+            buffer = chunk
+            position = 0
+            continue
+
+        char = buffer[position]
+        if expected == '{' and char == '[' and array:
+            position += 1
+            closing = ']'
+            key = 0
+            expected = 'first value'
+            continue
+        if expected in ('{', ':', ','):
+            if expected == ',' and char == closing:
+                return
+            if char != expected:
+                raise ValueError(f"Expected '{expected}' in JSON file")
+            position += 1
+            if char == '{':
+                expected = 'first key'
+            elif char == ':' or closing == ']':
+                expected = 'value'
+            else:
+                expected = 'key'
+            continue
+        if expected in ('first key', 'first value') and char == closing:
+            return
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = None
+            if end is not None and end < len(buffer):
+                break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if end is None:
+                    raise ValueError("Invalid JSON file")
+                break
+            buffer = buffer[position:] + chunk
+            position = 0
+        position = end
+        if expected in ('value', 'first value'):
+            yield key, value
+            if closing == ']':
+                key += 1
+            expected = ','
+        else:
+            key = value
+            expected = ':'
+
+
+def format_json_item(key, value):
+    """
+    Formats one item of a JSON object as write_json_items() lays it out.
+    Args:
+        key (str): The key of the item.
+        value: The value of the item.
+    Returns:
+        str: The text of the item, without the separators around it.
+    """
+    return json.dumps({key: value}, indent=4)[2:-2]
+
+
+def write_json_items(f, items):
+    """
+    Writes (key, value) pairs to a file as one JSON object, one item at a
+    time, using the same layout as json.dump(..., indent=4).
+    Args:
+        f: A text file open for writing.
+        items: An iterable of (key, value) pairs.
+    """
+    write_json_text(f, (format_json_item(key, value) for key, value in items))
+
+
+def write_json_text(f, texts):
+    """
+    Writes items already formatted by format_json_item() to a file as one
+    JSON object.
+    Args:
+        f: A text file open for writing.
+        texts: An iterable of formatted items.
+    """
+    separator = '{\n'
+    for text in texts:
+        f.write(separator + text)
+        separator = ',\n'
+    f.write('{}' if separator == '{\n' else '\n}')
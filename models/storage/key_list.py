@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+key_list.py
+This module keeps a sorted list of keys in a file and finds the keys that
+start with a prefix without reading the whole file.
+
+The file holds a JSON header line, then one key per line in sorted order.
+UTF-8 bytes sort in the same order as the strings they encode, so a
+lookup is a binary search over the byte offsets of the memory-mapped
+file: it reads O(log n) lines, then the matching ones.
+"""
+import json
+
+
+def write(f, header, keys):
+    """
+    Writes a key list.
+    Args:
+        f: A file open for writing in text mode.
+        header (dict): What the keys describe, e.g. the snapshot and the
+        journal offset they match.
+        keys (list): The keys, in sorted order; none may hold a newline.
+    """
+    f.write(json.dumps(header) + '\n')
+    f.writelines(key + '\n' for key in keys)
+
+
+def read_header(buffer):
+    """
+    Reads the header of a key list.
+    Args:
+        buffer: The file contents, e.g. a memory map.
+    Returns:
+        tuple: The header, and the offset of the first key.
+    Raises:
+        ValueError: If the file does not start with a JSON header line.
+    """
+    end = buffer.find(b'\n')
+    if end < 0:
+        raise ValueError("Not a key list")
+    header = json.loads(buffer[:end])
+    if not isinstance(header, dict):
+        raise ValueError("Not a key list")
+    return header, end + 1
+
+
+def find(buffer, prefix, first, limit=None):
+    """
+    Finds the keys that start with a prefix.
+    Args:
+        buffer: The file contents, e.g. a memory map.
+        prefix (str): The start of the keys.
+        first (int): The offset of the first key, see read_header().
+        limit (int): Return at most this many keys.
+    Returns:
+        list: The matching keys, in sorted order.
+    """
+    target = prefix.encode('utf-8')
+    low, high = first, len(buffer)
+    # low and high are line starts; the keys before low sort before the
+    # prefix, those from high on do not.
+    while low < high:
+        middle = (low + high) // 2
+        start = buffer.rfind(b'\n', low, middle) + 1
+        if start < low:
+            start = low
+        end = buffer.find(b'\n', start, high)
+        if end < 0:
+            end = high
+        if buffer[start:end] < target:
+            low = end + 1
+        else:
+            high = start
+
+    keys = []
+    while low < len(buffer) and len(keys) != limit:
+        end = buffer.find(b'\n', low)
+        if end < 0:
+            end = len(buffer)
+        key = buffer[low:end]
+        if not key.startswith(target):
+            break
+        keys.append(key.decode('utf-8'))
+        low = end + 1
+    return keys
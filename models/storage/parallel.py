@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+parallel.py
+This module deserializes and serializes the records of a snapshot in a
+pool of worker processes, for FileStorage stores too large to load or
+write quickly on one core.
+
+Loading splits each JSON snapshot file into byte ranges that start at a
+record, so that workers read and parse their range themselves and only
+the objects they built are sent back. The files are opened before the
+workers are forked and read through the inherited descriptors, so a
+snapshot replaced in the meantime is not mixed with the one being read.
+
+Serializing hands the workers ranges of a list of records; the workers are
+forked after the list is set, so they inherit it instead of receiving it
+through a pipe, and only send back the serialized text or bytes. Either
+way, results are merged in the order of the ranges, so the outcome does
+not depend on which worker finishes first.
+
+The workers are forked, so this is only available where the 'fork' start
+method is; elsewhere, and with fewer than two workers, FileStorage stays
+sequential.
+"""
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from models.storage import binary_snapshot
+from models.storage.json_stream import format_json_item
+
+# Ranges per worker, so that a slow range does not leave others idle.
+RANGES_PER_WORKER = 4
+
+# What separates two records in the layout of write_json_text().
+RECORD_SEPARATOR = b',\n    "'
+
+# Bytes read around a split point to find the next record.
+SEARCH_WINDOW = 1024 * 1024
+
+# The records being serialized, inherited by the forked workers.
+_records = None
+
+
+def available(workers):
+    """
+    Tells whether work can be spread over a number of worker processes.
+    """
+    return (workers is not None and workers > 1
+            and 'fork' in multiprocessing.get_all_start_methods())
+
+
+def _executor(workers):
+    """
+    Returns a pool of forked worker processes.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('fork')
+    )
+
+
+def splittable(path):
+    """
+    Tells whether a snapshot file can be split by split_json(): whether
+    it is missing, empty, or a JSON snapshot in the layout of
+    write_json_text().
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(7)
+    except FileNotFoundError:
+        return True
+    return head in (b'', b'{}') or head == b'{\n    "'
+
+
+def split_json(fd, size, parts):
+    """
+    Splits a JSON snapshot into byte ranges that each start at a record.
+    Args:
+        fd (int): The snapshot, open for reading, in the layout of
+        write_json_text().
+        size (int): The size of the snapshot.
+        parts (int): The number of ranges wanted; fewer are returned when
+        the records are too few or too large.
+    Returns:
+        list: (start, end) offsets covering the whole file, or None if the
+        file is not in that layout.
+    """
+    if os.pread(fd, 7, 0) != b'{\n    "':
+        return None
+    starts = [0]
+    for part in range(1, parts):
+        target = max(size * part // parts, starts[-1] + 1)
+        found = os.pread(fd, SEARCH_WINDOW, target).find(RECORD_SEPARATOR)
+        if found < 0:
+            continue
+        start = target + found + 2
+        if start > starts[-1]:
+            starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _load_range(fd, start, end, last, models):
+    """
+    Parses the records in a byte range of a JSON snapshot and builds
+    their objects; runs in a worker.
+    Args:
+        fd (int): The snapshot, inherited from the parent process.
+        last (bool): Whether the range ends the file.
+    Returns:
+        list: The (key, object) pair of each record.
+    """
+    text = os.pread(fd, end - start, start).decode('utf-8')
+    if start == 0:
+        text = text[text.index('{') + 1:]
+    if last:
+        text = text[:text.rindex('}')]
+    text = text.strip().rstrip(',')
+    records = json.loads('{' + text + '}')
+    return [
+        (key, models[key.split('.')[0]].from_dict(data))
+        for key, data in records.items()
+    ]
+
+
+def load_json(paths, models, workers):
+    """
+    Reads JSON snapshot files in worker processes.
+    Args:
+        paths (list): The files, in the layout of write_json_text().
+        models (dict): The class of each class name.
+        workers (int): The number of worker processes.
+    Yields:
+        tuple: The index in paths of the file, and the key and object of
+        each record, in the order of the files.
+    Raises:
+        ValueError: If a file is not in that layout.
+    """
+    with ExitStack() as files:
+        opened = []
+        for index, path in enumerate(paths):
+            try:
+                f = files.enter_context(open(path, 'rb'))
+            except FileNotFoundError:
+                continue
+            opened.append((index, f.fileno(), os.fstat(f.fileno())))
+        total = sum(stat.st_size for _, _, stat in opened)
+        range_size = max(1, total // (workers * RANGES_PER_WORKER))
+        jobs = []
+        for index, fd, stat in opened:
+            size = stat.st_size
+            if size <= 2:  # Empty, or '{}'.
+                continue
+            ranges = split_json(fd, size, max(1, size // range_size))
+            if ranges is None:
+                raise ValueError(
+                    f"{paths[index]} is not a snapshot that can be split"
+                )
+            jobs.extend(
+                (index, fd, start, end, end == size) for start, end in ranges
+            )
+
+        with _executor(workers) as executor:
+            futures = [
+                executor.submit(_load_range, fd, start, end, last, models)
+                for _, fd, start, end, last in jobs
+            ]
+            for (index, *_), future in zip(jobs, futures):
+                for key, obj in future.result():
+                    yield index, key, obj
+
+
+def _serialize_range(start, end, binary, models):
+    """
+    Serializes a range of the inherited records; runs in a worker.
+    Returns:
+        list: The text of each JSON item, or the bytes of each binary
+        record.
+    """
+    result = []
+    for key, data in _records[start:end]:
+        if binary:
+            obj = data
+            if isinstance(data, dict):
+                obj = models[key.split('.')[0]].from_dict(data)
+            result.append(binary_snapshot.encode(obj))
+        else:
+            result.append(format_json_item(
+                key, data if isinstance(data, dict) else data.to_dict()
+            ))
+    return result
+
+
+def serialize(records, binary, models, workers):
+    """
+    Serializes records in worker processes, as FileStorage does.
+    Args:
+        records (list): (key, record) pairs, where a record is an object
+        or a dictionary read from disk.
+        binary (bool): Produce binary records instead of JSON items.
+        models (dict): The class of each class name.
+        workers (int): The number of worker processes.
+    Returns:
+        list: The serialized form of each record, in order.
+    """
+    global _records
+
+    step = max(1, -(-len(records) // (workers * RANGES_PER_WORKER)))
+    _records = records
+    try:
+        with _executor(workers) as executor:
+            futures = [
+                executor.submit(
+                    _serialize_range, start, start + step, binary, models
+                )
+                for start in range(0, len(records), step)
+            ]
+            result = []
+            for future in futures:
+                result.extend(future.result())
+    finally:
+        _records = None
+    return result
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+search_index.py
+This module provides SearchIndex, an inverted index of the words in the
+title and project name of each task, used by the storages to answer
+'todo.py search' without reading every task.
+
+Words are lowercased runs of letters, digits and underscores. Each query
+word matches the indexed words it is a prefix of; the distinct indexed
+words are kept in a sorted list, so finding them is a binary search, and
+only the tasks listed under them are looked at. A task must match every
+query word. Tasks are ranked by the sum, over the query words, of the
+best weight of a word they match: words are worth more in the title than
+in the project name, rare words more than common ones, and whole words
+more than prefixes.
+"""
+import math
+import re
+from bisect import bisect_left, insort
+from heapq import nsmallest
+
+WORD = re.compile(r'\w+')
+
+# Weight of each occurrence of a word in the title and the project name.
+TITLE_WEIGHT = 2
+PROJECT_WEIGHT = 1
+
+# Factor applied to words that a query word is only a prefix of.
+PREFIX_FACTOR = 0.5
+
+VERSION = 1
+
+# Sorts after every word that starts with a given prefix.
+LAST_CHARACTER = chr(0x10FFFF)
+
+
+def tokenize(text):
+    """
+    Splits a text into lowercase words.
+    Args:
+        text (str): The text, or None.
+    Returns:
+        list: The words of the text, in order.
+    """
+    if not text:
+        return []
+    return WORD.findall(text.casefold())
+
+
+def weights(title, project_name):
+    """
+    Returns the weight of each word of a task.
+    Args:
+        title (str): The title of the task.
+        project_name (str): The project of the task, or None.
+    Returns:
+        dict: The weight of each distinct word.
+    """
+    result = {}
+    for word in tokenize(title):
+        result[word] = result.get(word, 0) + TITLE_WEIGHT
+    for word in tokenize(project_name):
+        result[word] = result.get(word, 0) + PROJECT_WEIGHT
+    return result
+
+
+def rank(matches, total, limit=None):
+    """
+    Ranks the tasks that match every query word.
+    Args:
+        matches (list): For each query word, a list of (word, postings)
+        pairs for the indexed words it matches, where postings maps the
+        key of each task containing the word to its weight.
+        total (int): The number of indexed tasks.
+        limit (int): Keep only this many of the best ranked tasks.
+    Returns:
+        list: The keys of the matching tasks, best first; ties are in
+        key order.
+    """
+    scores = None
+    for term, words in matches:
+        term_scores = {}
+        for word, postings in words:
+            factor = 1 if word == term else PREFIX_FACTOR
+            idf = math.log(1 + total / len(postings))
+            for key, weight in postings.items():
+                if scores is not None and key not in scores:
+                    continue
+                score = weight * idf * factor
+                if score > term_scores.get(key, 0):
+                    term_scores[key] = score
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {
+                key: scores[key] + score
+                for key, score in term_scores.items()
+            }
+        if not scores:
+            return []
+    if scores is None:
+        return []
+
+    def order(key):
+        return (-scores[key], key)
+
+    if limit is None:
+        return sorted(scores, key=order)
+    return nsmallest(limit, scores, key=order)
+
+
+class SearchIndex:
+    """
+    Inverted index from words to the tasks that contain them.
+
+    Attributes:
+        postings (dict): Maps each word to a dictionary of the keys of the
+        tasks containing it and their weights.
+        docs (dict): Maps the key of each indexed task to its words.
+        words (list): The distinct words, sorted, for prefix matching.
+    """
+    def __init__(self, postings=None, docs=None):
+        """
+        Initializes the index.
+        Args:
+            postings (dict): Postings read back by from_dict(), or None
+            for an empty index.
+            docs (dict): The words of each task, as in from_dict().
+        """
+        self.postings = postings if postings is not None else {}
+        self.docs = docs if docs is not None else {}
+        self.words = sorted(self.postings)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, key, title, project_name=None):
+        """
+        Indexes a task, replacing what was indexed for it before.
+        Args:
+            key (str): The '<class name>.<id>' key of the task.
+            title (str): The title of the task.
+            project_name (str): The project of the task, or None.
+        """
+        self.remove(key)
+        task_weights = weights(title, project_name)
+        for word, weight in task_weights.items():
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = {}
+                insort(self.words, word)
+            postings[key] = weight
+        self.docs[key] = list(task_weights)
+
+    def remove(self, key):
+        """
+        Removes a task from the index, if it is in it.
+        Args:
+            key (str): The '<class name>.<id>' key of the task.
+        """
+        for word in self.docs.pop(key, ()):
+            postings = self.postings[word]
+            del postings[key]
+            if not postings:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    def search(self, text, limit=None):
+        """
+        Finds the tasks matching every word of a query.
+        Args:
+            text (str): The query.
+            limit (int): Return at most this many keys.
+        Returns:
+            list: The keys of the matching tasks, best first.
+        """
+        matches = []
+        for term in dict.fromkeys(tokenize(text)):
+            start = bisect_left(self.words, term)
+            end = bisect_left(self.words, term + LAST_CHARACTER, start)
+            words = [
+                (word, self.postings[word]) for word in self.words[start:end]
+            ]
+            if not words:
+                return []
+            matches.append((term, words))
+        # Start with the rarest word, which leaves the fewest candidates.
+        matches.sort(key=lambda match: sum(len(p) for _, p in match[1]))
+        return rank(matches, len(self.docs), limit)
+
+    def to_dict(self):
+        """
+        Returns the index as a JSON serializable dictionary.
+        """
+        return {
+            'version': VERSION,
+            'postings': self.postings,
+            'docs': self.docs,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuilds an index from the dictionary returned by to_dict().
+        Args:
+            data (dict): The dictionary.
+        Returns:
+            SearchIndex: The index, or None if data was written by another
+            version of this module.
+        """
+        if data.get('version') != VERSION:
+            return None
+        return cls(data['postings'], data['docs'])
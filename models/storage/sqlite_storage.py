@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+sqlite_storage.py
+This module provides the SQLiteStorage class, an alternative to FileStorage
+that keeps objects in a local SQLite database. The columns used for
+filtering (status, priority, project_name and duedatetime) are indexed, so
+filtered listings and lookups by ID only read the rows they need. Due date
+bounds and ordering use the indexed 'due' column, which holds the due date
+in microseconds since the epoch, or NULL when it is missing or could not
+be parsed, so that they match the tasks FileStorage matches.
+
+The words of the title and project name of each object are kept in an
+indexed 'words' table, the inverted index that search() reads.
+"""
+import json
+import sqlite3
+from contextlib import contextmanager
+from heapq import nsmallest
+from models import trace
+from models.base_model import to_epoch
+from models.task import Task, sort_key
+from models.storage.search_index import (
+    LAST_CHARACTER, rank, tokenize, weights
+)
+
+
+class SQLiteStorage:
+    """
+    Handles storage and retrieval of objects using a SQLite database.
+    SQLiteStorage implements the same all/new/update/save/reload/delete
+    contract as FileStorage. Rows are only turned into objects when they
+    are asked for, and objects that were already built are reused.
+    """
+    __file_path = 'todo.db'
+
+    models = {
+        'Task': Task
+    }
+
+    columns = ('status', 'priority', 'project_name', 'duedatetime')
+
+    # Number of keys looked up per query by get_many(), below SQLite's
+    # limit on the number of parameters.
+    chunk_size = 500
+
+    def __init__(self):
+        """
+        Initializes the storage without opening the database.
+        """
+        self.__connection = None
+        self.__objects = {}
+        self.__pending = {}
+        self.__loaded = False
+        self.__batches = 0
+        self.__data_version = None
+
+    @trace.traced('storage.all')
+    def all(self):
+        """
+        Returns a dictionary of all stored objects.
+        The whole table is read the first time this is called.
+        Returns:
+            dict: All stored objects, keyed by '<class name>.<id>'.
+        """
+        if not self.__loaded:
+            rows = self.__connect().execute(
+                'SELECT key, data FROM objects ORDER BY rowid'
+            )
+            objects = {}
+            for key, data in rows:
+                if key in self.__pending:
+                    continue
+                objects[key] = self.__objects.get(key) or self.__build(
+                    key, data
+                )
+            for key, obj in self.__pending.items():
+                if obj is not None:
+                    objects[key] = obj
+            self.__objects = objects
+            self.__loaded = True
+        return self.__objects
+
+    def get(self, cls, id):
+        """
+        Retrieves one object by class and ID.
+        Args:
+            cls: The class of the object.
+            id (str): The ID of the object.
+        Returns:
+            The object, or None if it does not exist.
+        """
+        key = f"{cls.__name__}.{id}"
+        if key in self.__pending:
+            return self.__pending[key]
+        if key in self.__objects or self.__loaded:
+            return self.__objects.get(key)
+        row = self.__connect().execute(
+            'SELECT data FROM objects WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        obj = self.__build(key, row[0])
+        self.__objects[key] = obj
+        return obj
+
+    @trace.traced('storage.get_many')
+    def get_many(self, cls, ids):
+        """
+        Retrieves several objects by class and ID, reading the rows that
+        are not in memory with one query per chunk of IDs.
+        Args:
+            cls: The class of the objects.
+            ids: The IDs of the objects.
+        Returns:
+            dict: The objects that exist, keyed by ID, in the order of ids.
+        """
+        wanted = {f"{cls.__name__}.{id}": id for id in ids}
+        found = {}
+        missing = []
+        for key in wanted:
+            if key in self.__pending:
+                found[key] = self.__pending[key]
+            elif key in self.__objects or self.__loaded:
+                found[key] = self.__objects.get(key)
+            else:
+                missing.append(key)
+
+        for start in range(0, len(missing), SQLiteStorage.chunk_size):
+            chunk = missing[start:start + SQLiteStorage.chunk_size]
+            rows = self.__connect().execute(
+                'SELECT key, data FROM objects WHERE key IN'
+                f' ({", ".join("?" * len(chunk))})',
+                chunk
+            )
+            for key, data in rows:
+                obj = self.__build(key, data)
+                self.__objects[key] = obj
+                found[key] = obj
+        return {
+            id: found[key] for key, id in wanted.items()
+            if found.get(key) is not None
+        }
+
+    @trace.traced('storage.query')
+    def query(self, due_before=None, due_after=None, limit=None,
+              order_by=None, archived=None, **fields):
+        """
+        Retrieves the objects matching all the given filters.
+        Args:
+            due_before: Only match objects due before this datetime.
+            due_after: Only match objects due at or after this datetime.
+            limit (int): Stop after this many matches.
+            order_by (str): Sort the matches, see models.task.sort_key.
+            Ordering by due date uses the due index; other
+            orders keep the first matches with a heap.
+            archived (bool): Accepted for compatibility with FileStorage;
+            nothing is archived in the database, so True matches nothing.
+            **fields: Column values to match, e.g. status='completed'.
+        Returns:
+            dict: The matching objects, keyed by '<class name>.<id>'. When
+            order_by is given they are in that order, when a due date
+            bound is given they are ordered by due date, otherwise in
+            storage order.
+        """
+        if archived:
+            return {}
+        if order_by is not None:
+            order = sort_key(order_by)
+        clauses = []
+        params = []
+        for name, value in fields.items():
+            if name not in SQLiteStorage.columns:
+                raise ValueError(f"Cannot query on '{name}'")
+            if value is None:
+                clauses.append(f'{name} IS NULL')
+            else:
+                clauses.append(f'{name} = ?')
+                params.append(value)
+        if due_before is not None:
+            clauses.append('due < ?')
+            params.append(to_epoch(due_before))
+        if due_after is not None:
+            clauses.append('due >= ?')
+            params.append(to_epoch(due_after))
+
+        sql = 'SELECT key, data FROM objects'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        if order_by == 'due':
+            # As sort_key('due'): valid due dates, then invalid ones, then
+            # tasks without a due date.
+            sql += (' ORDER BY due IS NULL, due, duedatetime IS NULL,'
+                    ' rowid')
+        elif due_before is not None or due_after is not None:
+            sql += ' ORDER BY due, rowid'
+        else:
+            sql += ' ORDER BY rowid'
+        if (limit is not None and not self.__pending
+                and order_by in (None, 'due')):
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        result = {}
+        for key, data in self.__connect().execute(sql, params):
+            if key in self.__pending:
+                continue
+            obj = self.__objects.get(key)
+            if obj is None:
+                obj = self.__build(key, data)
+                self.__objects[key] = obj
+            result[key] = obj
+        for key, obj in self.__pending.items():
+            if obj is not None and obj.matches(
+                due_before=due_before, due_after=due_after, **fields
+            ):
+                result[key] = obj
+        if order_by is not None:
+            items = result.items()
+            if limit is None:
+                return dict(sorted(items, key=lambda item: order(item[1])))
+            return dict(
+                nsmallest(limit, items, key=lambda item: order(item[1]))
+            )
+        if limit is not None and len(result) > limit:
+            result = dict(list(result.items())[:limit])
+        return result
+
+    @trace.traced('storage.find_ids')
+    def find_ids(self, cls, prefix, limit=None):
+        """
+        Finds the IDs of the objects of a class that start with a prefix,
+        with a range scan of the primary key index.
+        Args:
+            cls: The class of the objects.
+            prefix (str): The start of the IDs.
+            limit (int): Return at most this many IDs.
+        Returns:
+            list: The matching IDs, in sorted order.
+        """
+        start = f"{cls.__name__}.{prefix}"
+        sql = 'SELECT key FROM objects WHERE key >= ? AND key < ? ORDER BY key'
+        params = [start, start + LAST_CHARACTER]
+        if limit is not None:
+            # Pending deletions may hide some of the rows.
+            sql += ' LIMIT ?'
+            params.append(limit + len(self.__pending))
+        keys = {key for (key,) in self.__connect().execute(sql, params)}
+        for key, obj in self.__pending.items():
+            if obj is None:
+                keys.discard(key)
+            elif key.startswith(start):
+                keys.add(key)
+        return [key.split('.', 1)[1] for key in sorted(keys)][:limit]
+
+    @trace.traced('storage.search')
+    def search(self, text, limit=None):
+        """
+        Finds the objects whose title or project name contain every word
+        of a query, or a word starting with it, best matches first.
+        Args:
+            text (str): The query.
+            limit (int): Return at most this many objects.
+        Returns:
+            dict: The matching objects in order of relevance, keyed by
+            '<class name>.<id>'.
+        """
+        connection = self.__connect()
+        (total,) = connection.execute(
+            'SELECT COUNT(*) FROM objects'
+        ).fetchone()
+        matches = []
+        for term in dict.fromkeys(tokenize(text)):
+            postings = {}
+            rows = connection.execute(
+                'SELECT word, key, weight FROM words'
+                ' WHERE word >= ? AND word < ?',
+                (term, term + LAST_CHARACTER)
+            )
+            for word, key, weight in rows:
+                if key not in self.__pending:
+                    postings.setdefault(word, {})[key] = weight
+            for key, obj in self.__pending.items():
+                if obj is None:
+                    continue
+                for word, weight in self.__weights(obj).items():
+                    if word.startswith(term):
+                        postings.setdefault(word, {})[key] = weight
+            if not postings:
+                return {}
+            matches.append((term, list(postings.items())))
+        matches.sort(key=lambda match: sum(len(p) for _, p in match[1]))
+        keys = rank(matches, total, limit)
+
+        ids = {}
+        for key in keys:
+            name, id = key.split('.', 1)
+            ids.setdefault(name, []).append(id)
+        found = {}
+        for name, class_ids in ids.items():
+            objects = self.get_many(SQLiteStorage.models[name], class_ids)
+            for id, obj in objects.items():
+                found[f"{name}.{id}"] = obj
+        return {key: found[key] for key in keys if key in found}
+
+    def new(self, obj):
+        """
+        Adds a new object to the storage.
+        If an object with the same key exists, it is replaced.
+        Args:
+            obj: The object to be added to storage.
+        """
+        key = f"{obj.__class__.__name__}.{obj.id}"
+        self.__objects[key] = obj
+        self.__pending[key] = obj
+
+    def update(self, obj):
+        """
+        Records that a stored object has changed so that the next save()
+        persists it.
+        Args:
+            obj: The object that was modified.
+        """
+        self.new(obj)
+
+    @trace.traced('storage.save')
+    def save(self):
+        """
+        Writes the objects added, updated or deleted since the last save
+        to the database in a single transaction.
+        Inside a batch() block nothing is written until the block exits.
+        """
+        if not self.__pending or self.__batches:
+            return
+        connection = self.__connect()
+        with connection:
+            for key, obj in self.__pending.items():
+                connection.execute('DELETE FROM words WHERE key = ?', (key,))
+                if obj is None:
+                    connection.execute(
+                        'DELETE FROM objects WHERE key = ?', (key,)
+                    )
+                    continue
+                connection.executemany(
+                    'INSERT INTO words (word, key, weight) VALUES (?, ?, ?)',
+                    (
+                        (word, key, weight)
+                        for word, weight in self.__weights(obj).items()
+                    )
+                )
+                data = obj.to_dict()
+                if trace.enabled:
+                    trace.count('objects.serialized')
+                connection.execute(
+                    'INSERT INTO objects'
+                    ' (key, status, priority, project_name, duedatetime, due,'
+                    ' data)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?)'
+                    ' ON CONFLICT(key) DO UPDATE SET'
+                    ' status = excluded.status,'
+                    ' priority = excluded.priority,'
+                    ' project_name = excluded.project_name,'
+                    ' duedatetime = excluded.duedatetime,'
+                    ' due = excluded.due,'
+                    ' data = excluded.data',
+                    (
+                        key, data.get('status'), data.get('priority'),
+                        data.get('project_name'), data.get('duedatetime'),
+                        self.__due_epoch(data.get('duedatetime')),
+                        json.dumps(data)
+                    )
+                )
+        self.__pending.clear()
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers save() until the end of a with block, so that all the
+        changes made in the block are written in one transaction. Blocks
+        may be nested; the outermost one saves. If the block raises,
+        nothing is written and the changes stay pending.
+        """
+        self.__batches += 1
+        try:
+            yield self
+        finally:
+            self.__batches -= 1
+        if not self.__batches:
+            self.save()
+
+    @trace.traced('storage.refresh')
+    def refresh(self):
+        """
+        Checks whether another connection has committed changes since
+        the last check. If so, the objects read from the database are
+        forgotten and read again when next needed; pending changes are
+        kept.
+        Returns:
+            bool: True if the database had changed.
+        """
+        if self.__connection is None:
+            return False
+        (version,) = self.__connection.execute(
+            'PRAGMA data_version'
+        ).fetchone()
+        if version == self.__data_version:
+            return False
+        self.__data_version = version
+        self.__objects = {
+            key: obj for key, obj in self.__pending.items()
+            if obj is not None
+        }
+        self.__loaded = False
+        return True
+
+    @trace.traced('storage.reload')
+    def reload(self):
+        """
+        Discards the objects held in memory. Rows are read back from the
+        database when they are next asked for.
+        """
+        self.__objects = {}
+        self.__pending = {}
+        self.__loaded = False
+
+    def delete(self, obj):
+        """
+        Removes the specified object from the storage.
+        Args:
+            obj: The object to be deleted. Must have 'id' attribute.
+        """
+        key = f"{obj.__class__.__name__}.{obj.id}"
+        self.__objects.pop(key, None)
+        self.__pending[key] = None
+
+    def close(self):
+        """
+        Closes the database connection, if it is open.
+        """
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+
+    def __connect(self):
+        """
+        Opens the database on first use and creates the table and its
+        indexes if they do not exist yet.
+        Returns:
+            sqlite3.Connection: The open connection.
+        """
+        if self.__connection is None:
+            # The connection may be used from a worker thread, as by
+            # TaskService, which makes every call from that one thread.
+            connection = sqlite3.connect(
+                self.__file_path, check_same_thread=False
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS objects ('
+                ' key TEXT PRIMARY KEY,'
+                ' status TEXT,'
+                ' priority TEXT,'
+                ' project_name TEXT,'
+                ' duedatetime TEXT,'
+                ' due INTEGER,'
+                ' data TEXT NOT NULL)'
+            )
+            self.__add_due(connection)
+            for column in SQLiteStorage.columns + ('due',):
+                connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS objects_{column}'
+                    f' ON objects ({column})'
+                )
+            self.__create_words(connection)
+            (self.__data_version,) = connection.execute(
+                'PRAGMA data_version'
+            ).fetchone()
+            self.__connection = connection
+        return self.__connection
+
+    def __add_due(self, connection):
+        """
+        Adds the 'due' column to a table created without it, and fills it
+        from the existing rows.
+        Args:
+            connection (sqlite3.Connection): The open connection.
+        """
+        columns = [
+            row[1] for row in connection.execute('PRAGMA table_info(objects)')
+        ]
+        if 'due' in columns:
+            return
+        with connection:
+            connection.execute('ALTER TABLE objects ADD COLUMN due INTEGER')
+            rows = connection.execute(
+                'SELECT key, duedatetime FROM objects'
+                ' WHERE duedatetime IS NOT NULL'
+            )
+            connection.executemany(
+                'UPDATE objects SET due = ? WHERE key = ?',
+                (
+                    (self.__due_epoch(duedatetime), key)
+                    for key, duedatetime in rows.fetchall()
+                )
+            )
+
+    def __create_words(self, connection):
+        """
+        Creates the table of the words of each object and its indexes, and
+        fills it from the existing rows if it did not exist yet.
+        Args:
+            connection (sqlite3.Connection): The open connection.
+        """
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table'"
+            " AND name = 'words'"
+        ).fetchone()
+        if exists:
+            return
+        with connection:
+            connection.execute(
+                'CREATE TABLE words ('
+                ' word TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' weight INTEGER NOT NULL)'
+            )
+            connection.execute('CREATE INDEX words_word ON words (word)')
+            connection.execute('CREATE INDEX words_key ON words (key)')
+            rows = connection.execute('SELECT key, data FROM objects')
+            connection.executemany(
+                'INSERT INTO words (word, key, weight) VALUES (?, ?, ?)',
+                (
+                    (word, key, weight)
+                    for key, data in rows.fetchall()
+                    for word, weight in self.__weights(
+                        json.loads(data)
+                    ).items()
+                )
+            )
+
+    @staticmethod
+    def __weights(data):
+        """
+        Returns the weight of each word of an object or of its dictionary.
+        """
+        if isinstance(data, dict):
+            return weights(data.get('title'), data.get('project_name'))
+        return weights(
+            getattr(data, 'title', None), getattr(data, 'project_name', None)
+        )
+
+    def __build(self, key, data):
+        """
+        Creates an object from a stored row.
+        Args:
+            key (str): The '<class name>.<id>' key of the row.
+            data (str): The JSON encoded dictionary of the object.
+        Returns:
+            The deserialized object.
+        """
+        if trace.enabled:
+            trace.count('objects.built')
+        cls = SQLiteStorage.models[key.split('.')[0]]
+        return cls.from_dict(json.loads(data))
+
+    @staticmethod
+    def __due_epoch(value):
+        """
+        Returns the due date stored in the 'due' column: microseconds
+        since the epoch, or None if the due date is missing or could not
+        be parsed, as Task.due_epoch.
+        """
+        try:
+            return to_epoch(value)
+        except (TypeError, ValueError, AttributeError):
+            return None
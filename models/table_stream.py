@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+table_stream.py
+
+This module renders tables in the same 'github' layout as tabulate, one
+line at a time. Column widths are either given up front or measured on a
+bounded sample of the first rows, so the first lines are printed before
+the remaining rows have been produced and memory use does not grow with
+the number of rows. Lines already printed cannot be widened, so a later
+cell wider than its measured column is wrapped onto extra lines of its
+row; with widths given up front, it is shortened with an ellipsis.
+
+As in tabulate, cell widths are measured with wcwidth when it is
+installed, so that emoji and other wide characters line up.
+"""
+import textwrap
+from itertools import chain, islice
+
+try:
+    from wcwidth import wcswidth
+except ImportError:  # wcwidth is optional
+    wcswidth = None
+
+SAMPLE_SIZE = 100
+
+
+def stream_table(rows, headers, widths=None, sample_size=SAMPLE_SIZE):
+    """
+    Yields the lines of a table in 'github' format.
+
+    Args:
+        rows: An iterable of rows, each a sequence with one value per
+        header. None values are shown as empty cells, as in tabulate.
+        headers (list): The column titles.
+        widths (list): The width of each column. Measured on the first
+        sample_size rows when not given.
+        sample_size (int): How many rows are read ahead to measure the
+        column widths.
+
+    Yields:
+        str: The header line, the separator line, then one line per row.
+    """
+    rows = iter(rows)
+    wrap = widths is None
+    if widths is None:
+        sample = [[cell_text(cell) for cell in row]
+                  for row in islice(rows, sample_size)]
+        # Like tabulate, headers get two extra spaces of padding.
+        widths = [width_of(header) + 2 for header in headers]
+        for row in sample:
+            widths = [max(width, width_of(cell))
+                      for width, cell in zip(widths, row)]
+        rows = chain(sample, rows)
+
+    yield format_row(headers, widths)
+    yield '|' + '|'.join('-' * (width + 2) for width in widths) + '|'
+    for row in rows:
+        if wrap:
+            yield from format_wrapped_row(row, widths)
+        else:
+            yield format_row(row, widths)
+
+
+def cell_text(cell):
+    """
+    Returns the text of a cell: '' for None, as tabulate shows it.
+    """
+    return '' if cell is None else str(cell)
+
+
+def format_wrapped_row(row, widths):
+    """
+    Formats one row of a table, wrapping the cells wider than their
+    column onto as many lines as needed.
+
+    Args:
+        row: The cell values.
+        widths (list): The width of each column.
+
+    Returns:
+        list: The lines of the row, as '| cell | cell |'.
+    """
+    cells = [cell_text(cell) for cell in row]
+    if all(width_of(cell) <= width for cell, width in zip(cells, widths)):
+        return [format_row(cells, widths)]
+    parts = [wrap_cell(cell, width) for cell, width in zip(cells, widths)]
+    height = max(len(lines) for lines in parts)
+    return [
+        format_row(
+            [lines[line] if line < len(lines) else '' for lines in parts],
+            widths
+        )
+        for line in range(height)
+    ]
+
+
+def wrap_cell(cell, width):
+    """
+    Splits a cell into lines no wider than its column, between words
+    where possible.
+
+    Returns:
+        list: The lines of the cell.
+    """
+    if width_of(cell) <= width:
+        return [cell]
+    if width_of(cell) == len(cell):  # No wide characters.
+        return textwrap.wrap(cell, width) or ['']
+    lines = ['']
+    for char in cell:
+        if lines[-1] and width_of(lines[-1] + char) > width:
+            lines.append('')
+        lines[-1] += char
+    return lines
+
+
+def format_row(row, widths):
+    """
+    Formats one row of a table, padding or shortening each cell to the
+    width of its column.
+
+    Args:
+        row: The cell values.
+        widths (list): The width of each column.
+
+    Returns:
+        str: The row as '| cell | cell |'.
+    """
+    cells = []
+    for cell, width in zip(row, widths):
+        cell = cell_text(cell)
+        size = width_of(cell)
+        if size > width:
+            cell = cell[:width - 1]
+            while width_of(cell) > width - 1 and cell:
+                cell = cell[:-1]
+            cell += '…'
+            size = width_of(cell)
+        cells.append(cell + ' ' * (width - size))
+    return '| ' + ' | '.join(cells) + ' |'
+
+
+def width_of(text):
+    """
+    Returns the number of terminal columns a string takes up.
+    """
+    if wcswidth is not None:
+        size = wcswidth(text)
+        if size >= 0:
+            return size
+    return len(text)
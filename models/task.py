@@ -1,17 +1,133 @@
 #!/usr/bin/env python3
 """
 task.py
+
+Status and priority are stored as small integer codes into STATUSES and
+PRIORITIES; values outside those tuples are kept as interned strings.
+
+The due date is parsed once, when it is set, and kept as microseconds
+since the epoch, like the other timestamps; a value that is not a valid
+ISO timestamp is kept as the string given. Listing compares and formats
+these integers and never parses a timestamp again.
 """
-from models.base_model import BaseModel
+import sys
+from models.base_model import BaseModel, from_epoch, to_epoch
 from datetime import datetime
+from functools import lru_cache
+from heapq import nsmallest
+from itertools import islice
 import models
-from tabulate import tabulate
+from models import trace
+from models.table_stream import stream_table
+
+STATUSES = ('pending', 'completed')
+PRIORITIES = (None, 'not urgent', 'urgent')
+
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+PRIORITY_CODES = {name: code for code, name in enumerate(PRIORITIES)}
+
+HEADERS = [
+    'ID', 'Title', 'Status', 'Due Date',
+    'Due Time', 'Time Left', 'Priority'
+]
+# Column widths used by 'list --fixed-width'.
+FIXED_WIDTHS = [36, 30, 11, 10, 15, 16, 10]
+
+SORT_ORDERS = ('due', 'priority', 'created')
+
+# Number of candidates listed when an ID prefix is ambiguous.
+AMBIGUOUS_SHOWN = 5
+
+# Length of a whole task ID, a UUID in canonical form.
+ID_LENGTH = 36
+
+# Shortest ID prefix expanded, as git requires for commit hashes.
+MIN_PREFIX = 4
+
+
+def encode(codes, value):
+    """
+    Returns the integer code of a status or priority value.
+
+    Args:
+        codes (dict): STATUS_CODES or PRIORITY_CODES.
+        value: The value to encode.
+
+    Returns:
+        The code of the value, or the value itself, interned if it is a
+        string, when it has no code.
+    """
+    code = codes.get(value)
+    if code is not None:
+        return code
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@lru_cache(maxsize=4096)
+def due_fields(epoch):
+    """
+    Returns the due date and due time columns of 'list'. Cached, as many
+    tasks share a due date.
+
+    Args:
+        epoch (int): The due date in microseconds since the epoch.
+
+    Returns:
+        tuple: The date and time parts of the ISO timestamp, e.g.
+        ('2030-01-01', '09:00:00').
+    """
+    date, _, time = from_epoch(epoch).isoformat().partition('T')
+    return date, time
+
+
+def sort_key(order):
+    """
+    Returns the key function that orders tasks for 'list --sort'.
+
+    Args:
+        order (str): One of SORT_ORDERS: 'due' (soonest first, tasks
+        without a due date last), 'priority' (most urgent first) or
+        'created' (oldest first).
+
+    Returns:
+        function: Maps a task to a value that sorts in that order.
+
+    Raises:
+        ValueError: If the order is not one of SORT_ORDERS.
+    """
+    if order == 'due':
+        def key(task):
+            due = task._due
+            if isinstance(due, int):
+                return (0, due)
+            # Invalid due dates come after the valid ones, then tasks
+            # without a due date.
+            return (1 if due else 2, 0)
+    elif order == 'priority':
+        def key(task):
+            code = task._priority
+            return -code if isinstance(code, int) else 1
+    elif order == 'created':
+        def key(task):
+            return task._created_at or 0
+    else:
+        raise ValueError(f"Cannot sort by '{order}'")
+    return key
 
 
 class Task(BaseModel):
     """
     Represents a task in the todo list.
     """
+    __slots__ = (
+        'title', '_due', '_project_name', '_status', '_priority',
+        '_completed_at'
+    )
+
+    fields = (
+        'title', 'status', 'project_name', 'priority', 'duedatetime'
+    ) + BaseModel.fields + ('completed_at',)
+
     def __init__(
         self, title, status='pending',
         project_name=None, duedatetime=None, priority=None
@@ -24,9 +140,87 @@ class Task(BaseModel):
         self.project_name = project_name
         self.priority = priority
         self.duedatetime = duedatetime
+        self._completed_at = None
         # self.completed = completed
         super().__init__()
 
+    def _reset(self):
+        """
+        Sets every attribute to its empty value. Used when an instance
+        is created without calling __init__.
+        """
+        super()._reset()
+        self.title = None
+        self._due = None
+        self._project_name = None
+        self._status = 0
+        self._priority = 0
+        self._completed_at = None
+
+    @property
+    def status(self):
+        """str: 'pending' or 'completed'."""
+        code = self._status
+        return STATUSES[code] if isinstance(code, int) else code
+
+    @status.setter
+    def status(self, value):
+        self._status = encode(STATUS_CODES, value)
+
+    @property
+    def priority(self):
+        """str: 'urgent', 'not urgent' or None."""
+        code = self._priority
+        return PRIORITIES[code] if isinstance(code, int) else code
+
+    @priority.setter
+    def priority(self, value):
+        self._priority = encode(PRIORITY_CODES, value)
+
+    @property
+    def project_name(self):
+        """str: Name of the project the task belongs to, or None."""
+        return self._project_name
+
+    @project_name.setter
+    def project_name(self, value):
+        self._project_name = (
+            sys.intern(value) if isinstance(value, str) else value
+        )
+
+    @property
+    def duedatetime(self):
+        """datetime: When the task is due, or None. A due date that could
+        not be parsed is returned as the string it was set to."""
+        due = self._due
+        return from_epoch(due) if isinstance(due, int) else due
+
+    @duedatetime.setter
+    def duedatetime(self, value):
+        if not value:
+            self._due = None
+            return
+        try:
+            self._due = to_epoch(value)
+        except (TypeError, ValueError, AttributeError):
+            self._due = value
+
+    @property
+    def due_epoch(self):
+        """int: The due date in microseconds since the epoch, or None if
+        it is not set or not valid."""
+        due = self._due
+        return due if isinstance(due, int) else None
+
+    @property
+    def completed_at(self):
+        """datetime: Timestamp of when the task was completed, or None."""
+        return from_epoch(self._completed_at)
+
+    @completed_at.setter
+    def completed_at(self, value):
+        self._completed_at = to_epoch(value)
+
     def __str__(self):
         """
         Returns a string representation of the Task instance.
@@ -35,7 +229,17 @@ class Task(BaseModel):
             str: A string in the format
             '[Task] (<id>) <attribute dictionary>'
         """
-        return f'[Task] ({self.id}) {self.__dict__}'
+        attributes = {name: getattr(self, name) for name in self.fields}
+        return f'[Task] ({self.id}) {attributes}'
+
+    def mark_completed(self):
+        """
+        Marks the task as completed by updating its status and
+        setting the completed_at timestamp.
+        """
+        self.status = "completed"
+        self.completed_at = datetime.now()
+        self.updated_at = datetime.now()
 
     def mark_pending(self):
         """
@@ -46,14 +250,51 @@ class Task(BaseModel):
         self.completed_at = None
         self.updated_at = datetime.now()
 
+    def matches(self, due_before=None, due_after=None, **fields):
+        """
+        Checks the task against query filters.
+        Args:
+            due_before: Only match tasks due before this datetime.
+            due_after: Only match tasks due at or after this datetime.
+            **fields: Attribute values the task must have,
+            e.g. status='pending'.
+        Returns:
+            bool: True if the task satisfies every filter.
+        """
+        for name, value in fields.items():
+            if getattr(self, name, None) != value:
+                return False
+        if due_before is None and due_after is None:
+            return True
+
+        due = self._due
+        if not isinstance(due, int):
+            return False
+        if due_before is not None and not due < to_epoch(due_before):
+            return False
+        if due_after is not None and not due >= to_epoch(due_after):
+            return False
+        return True
+
     @staticmethod
-    def format_time_left(duedatetime_str):
-        if not duedatetime_str:
+    def format_time_left(duedatetime, now=None):
+        """
+        Returns the time left until a due date, as shown by 'list'.
+        Args:
+            duedatetime: The due date, as a datetime or an ISO string.
+            now (datetime): The time to count from, datetime.now() by
+            default.
+        Returns:
+            str: e.g. '3 hr more' or '⏰ Overdue', or None if there is no
+            due date.
+        """
+        if not duedatetime:
             return None
 
         try:
-            due_dt = datetime.fromisoformat(duedatetime_str)
-            diff = due_dt - datetime.now()
+            if isinstance(duedatetime, str):
+                duedatetime = datetime.fromisoformat(duedatetime)
+            diff = duedatetime - (now or datetime.now())
             seconds = diff.total_seconds()
             if seconds < 0:
                 return "⏰ Overdue"
@@ -69,104 +310,245 @@ class Task(BaseModel):
             return "Invalid datetime"
 
     @staticmethod
-    def print_tasks():
+    def page(completed=False, offset=0, limit=None, order_by=None,
+             archived=False):
         """
-        Retrieves and formats all tasks (completed or not) from the data store
-        Iterates through all stored tasks, filters those with a status of
-        includes the task ID, title, status, due date, and priority.
-        If due date
-        or priority is not set, 'None' is displayed for those fields.
+        Retrieves the tasks shown on one page of 'list'.
+        Only as many tasks as the page needs are read from the store.
+        Args:
+            completed (bool): Only include completed tasks, including
+            those in the archive shards of the store but not those moved
+            to the cold store of models.archive, which only archived
+            lists. Otherwise every task that is not archived is included.
+            archived (bool): Only include archived tasks, from the archive
+            shards of the store and from the cold store of
+            models.archive.
+            offset (int): Number of tasks to skip.
+            limit (int): Maximum number of tasks, or None for all.
+            order_by (str): One of SORT_ORDERS, or None for storage order.
         Returns:
-            str: A formatted table of completed tasks using the 'github' style.
+            iterator: ('<class name>.<id>', task) pairs.
         """
-        items = models.store.all()
-        tasks = []
-        for key, value in items.items():
-            key = key.split('.')[1]
-            dictionary = value.to_dict()
-            dictionary['id'] = key
-            tasks.append(
-                dictionary
+        end = None if limit is None else offset + limit
+        if archived:
+            from models import archive
+
+            items = archive.archived_items(archive.PATH)
+            if order_by is not None:
+                order = sort_key(order_by)
+                if end is None:
+                    items = sorted(items, key=lambda item: order(item[1]))
+                else:
+                    items = nsmallest(
+                        end, items, key=lambda item: order(item[1])
+                    )
+            return islice(items, offset, end)
+        if completed:
+            items = models.store.query(
+                limit=end, order_by=order_by, status='completed'
             )
-        # print(tasks)
-        # Build rows
-        table = []
-
-        for task in tasks:
-            duedate = (
-                task['duedatetime'].split('T')[0]
-                if task['duedatetime'] else "None"
+        else:
+            # Archived tasks are only listed with the completed ones, so
+            # the archive shards are not read.
+            items = models.store.query(
+                limit=end, order_by=order_by, archived=False
             )
-            if task['status'] == 'completed':
-                time_left = '✅ Done'
-            else:
-                time_left = Task.format_time_left(task['duedatetime'])
-            table.append([
-                task['id'],
-                task['title'],
-                "✅ Completed"
-                if task["status"].lower() == 'completed' else '❌ Pending',
-                duedate,
-                task['duedatetime'].split('T')[1]
-                if task['duedatetime'] else "None",
-                time_left,
-                task['priority'] if task['priority'] else 'None'
-            ])
-        headers = [
-            'ID', 'Title', 'Status', 'Due Date',
-            'Due Time', 'Time Left', 'Priority'
-        ]
-        return (tabulate(table, headers=headers, tablefmt="github"))
+        return islice(items.items(), offset, end)
+
+    @staticmethod
+    def rows(items, status_labels=True, chunk_size=1000, now=None):
+        """
+        Yields the table rows shown by 'list' for the given tasks.
+        Time left is computed chunk_size tasks at a time, against the
+        same current time for every row.
+        Args:
+            items: An iterable of ('<class name>.<id>', task) pairs.
+            status_labels (bool): Show the status as '✅ Completed' or
+            '❌ Pending' instead of its stored value.
+            chunk_size (int): Number of tasks handled at once.
+            now (datetime): The current time of the whole listing,
+            datetime.now() when the first row is made by default.
+        Yields:
+            list: The ID, title, status, due date, due time, time left
+            and priority of each task. If due date or priority is not
+            set, 'None' is displayed for those fields.
+        """
+        from models.task_table import TaskTable
+
+        now = now or datetime.now()
+        items = iter(items)
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                return
+            time_lefts = TaskTable(
+                task for _, task in chunk
+            ).time_left(now=now)
+            for (key, task), time_left in zip(chunk, time_lefts):
+                due = task._due
+                if isinstance(due, int):
+                    duedate, duetime = due_fields(due)
+                elif due:
+                    duedate, _, duetime = due.partition('T')
+                else:
+                    duedate = duetime = "None"
+                status = task.status
+                if status_labels:
+                    status = (
+                        "✅ Completed"
+                        if str(status).lower() == 'completed'
+                        else '❌ Pending'
+                    )
+                yield [
+                    key.split('.')[1],
+                    task.title,
+                    status,
+                    duedate,
+                    duetime,
+                    time_left,
+                    task.priority if task.priority else 'None'
+                ]
+
+    @staticmethod
+    @trace.traced('render')
+    def print_tasks(offset=0, limit=None, order_by=None):
+        """
+        Retrieves and formats all tasks (completed or not) from the data
+        store.
+        Args:
+            offset (int): Number of tasks to skip.
+            limit (int): Maximum number of tasks, or None for all.
+            order_by (str): One of SORT_ORDERS, or None for storage order.
+        Returns:
+            str: A formatted table of tasks using the 'github' style.
+        """
+        from tabulate import tabulate
+
+        rows = Task.rows(
+            Task.page(offset=offset, limit=limit, order_by=order_by)
+        )
+        return tabulate(list(rows), headers=HEADERS, tablefmt="github")
 
     @staticmethod
-    def print_completed_task():
+    @trace.traced('render')
+    def print_completed_task(offset=0, limit=None, order_by=None):
         """
         Retrieves and formats all completed tasks from the data store.
-        Iterates through all stored tasks, filters those with a status of
-        includes the task ID, title, status, due date, and priority.
-        If due date
-        or priority is not set, 'None' is displayed for those fields.
+        Args:
+            offset (int): Number of tasks to skip.
+            limit (int): Maximum number of tasks, or None for all.
+            order_by (str): One of SORT_ORDERS, or None for storage order.
         Returns:
             str: A formatted table of completed tasks using the 'github' style.
         """
-        items = models.store.all()
-        tasks = []
-        for key, value in items.items():
-            key = key.split('.')[1]
-            if value.status == 'completed':
-                dictionary = value.to_dict()
-                dictionary['id'] = key
-                tasks.append(
-                    dictionary
-                )
-        # print(tasks)
-        # Build rows
-        table = []
-
-        for task in tasks:
-            duedate = (
-                task['duedatetime'].split('T')[0]
-                if task['duedatetime'] else "None"
+        from tabulate import tabulate
+
+        rows = Task.rows(
+            Task.page(
+                completed=True, offset=offset, limit=limit, order_by=order_by
+            ),
+            status_labels=False
+        )
+        return tabulate(list(rows), headers=HEADERS, tablefmt="github")
+
+    @staticmethod
+    def stream_tasks(
+        completed=False, offset=0, limit=None, order_by=None, widths=None,
+        archived=False
+    ):
+        """
+        Yields the lines of the 'list' table as the tasks are read, instead
+        of formatting the whole table first.
+        Args:
+            completed (bool): Only include completed tasks.
+            archived (bool): Only include archived tasks, see page().
+            offset (int): Number of tasks to skip.
+            limit (int): Maximum number of tasks, or None for all.
+            order_by (str): One of SORT_ORDERS, or None for storage order.
+            widths (list): Fixed column widths, e.g. FIXED_WIDTHS. By
+            default they are measured on the first rows.
+        Returns:
+            iterator: The lines of the table, in the same layout as
+            print_tasks.
+        """
+        rows = Task.rows(
+            Task.page(
+                completed=completed, offset=offset, limit=limit,
+                order_by=order_by, archived=archived
+            ),
+            status_labels=not completed
+        )
+        return trace.iterate(
+            'render', stream_table(rows, HEADERS, widths=widths)
+        )
+
+    @classmethod
+    def find(cls, ids=None, older_than=None, **fields):
+        """
+        Retrieves tasks by ID, by filter, or both.
+        Args:
+            ids (list): IDs of the tasks. When None, every task matching
+            the filters is returned.
+            older_than (timedelta): Only match tasks last updated more
+            than this long ago.
+            **fields: Attribute values to match, e.g. status='completed'.
+        Returns:
+            tuple: The list of matching tasks and the list of IDs that do
+            not exist.
+        """
+        if ids is None:
+            tasks = list(models.store.query(**fields).values())
+            missing = []
+        else:
+            found = models.store.get_many(cls, ids)
+            missing = [id for id in dict.fromkeys(ids) if id not in found]
+            tasks = [
+                task for task in found.values() if task.matches(**fields)
+            ]
+        if older_than is not None:
+            cutoff = to_epoch(datetime.now() - older_than)
+            tasks = [
+                task for task in tasks
+                if task._updated_at is not None and task._updated_at < cutoff
+            ]
+        return tasks, missing
+
+    @classmethod
+    def resolve(cls, prefix):
+        """
+        Expands a unique prefix of a task ID to the full ID, as git does
+        for commit hashes. A whole ID is looked up directly, and so is a
+        prefix shorter than MIN_PREFIX, which is only accepted as a whole
+        ID.
+        Args:
+            prefix (str): The start of the ID, or the whole ID.
+        Returns:
+            str: The ID of the only task whose ID starts with prefix, or
+            None if there is no such task.
+        Raises:
+            ValueError: If the IDs of several tasks start with prefix, or
+            if prefix is too short to expand.
+        """
+        if len(prefix) >= ID_LENGTH or len(prefix) < MIN_PREFIX:
+            found = models.store.get(cls, prefix) if prefix else None
+            if found is not None:
+                return prefix
+            if len(prefix) >= ID_LENGTH:
+                return None
+            raise ValueError(
+                f"Task ID prefix '{prefix}' is too short: "
+                f"give at least {MIN_PREFIX} characters"
             )
-            if task['status'] == 'completed':
-                time_left = '✅ Done'
-            else:
-                time_left = Task.format_time_left(task['duedatetime'])
-            table.append([
-                task['id'],
-                task['title'],
-                task["status"],
-                duedate,
-                task['duedatetime'].split('T')[1]
-                if task['duedatetime'] else "None",
-                time_left,
-                task['priority'] if task['priority'] else 'None'
-            ])
-        headers = [
-            'ID', 'Title', 'Status', 'Due Date',
-            'Due Time', 'Time Left', 'Priority'
-        ]
-        return (tabulate(table, headers=headers, tablefmt="github"))
+        ids = models.store.find_ids(cls, prefix, limit=AMBIGUOUS_SHOWN + 1)
+        if len(ids) <= 1:
+            return ids[0] if ids else None
+        if prefix in ids:
+            return prefix
+        shown = ', '.join(ids[:AMBIGUOUS_SHOWN])
+        more = ', ...' if len(ids) > AMBIGUOUS_SHOWN else ''
+        raise ValueError(
+            f"Task ID prefix '{prefix}' is ambiguous: {shown}{more}"
+        )
 
     @classmethod
     def mark_complete(cls, id):
@@ -174,14 +556,12 @@ class Task(BaseModel):
         Marks the task as completed by updating its status and
         setting the completed_at timestamp.
         """
-        dictionary = models.store.all()
-        key_id = f"{cls.__name__}.{id}"
-        if key_id in dictionary:
-            task = dictionary.get(key_id)
+        task = models.store.get(cls, id)
+        if task is not None:
             if task.status == 'completed':
                 return "✅ Task already completed"
             else:
-                task.status = 'completed'
+                task.mark_completed()
                 task.save()
                 return "🎉 Task marked as completed!"
         else:
@@ -189,10 +569,8 @@ class Task(BaseModel):
 
     @classmethod
     def remove_task(cls, id):
-        dictionary = models.store.all()
-        key_id = f"{cls.__name__}.{id}"
-        if key_id in dictionary:
-            obj = dictionary[key_id]
+        obj = models.store.get(cls, id)
+        if obj is not None:
             models.store.delete(obj)
             models.store.save()
             return "deleted successfully"
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+task_table.py
+
+This module defines TaskTable, a column-oriented view of a set of tasks.
+Status codes and due dates are copied into arrays once, so that the
+time-left buckets of a whole listing are computed in batches with integer
+arithmetic instead of one datetime calculation per task. Filtering and
+sorting are left to the storage and models.task.sort_key.
+
+NumPy is used when it is installed; otherwise the same operations run on
+the standard library array module.
+"""
+from array import array
+from datetime import datetime
+from models.base_model import to_epoch
+from models.task import STATUS_CODES
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional
+    numpy = None
+
+NO_DUE = 2 ** 63 - 1
+INVALID_DUE = -2 ** 63
+OTHER = -1
+SECOND = 1000000
+
+# Time-left buckets, in the order they are tested.
+NONE, DONE, INVALID, OVERDUE, SECONDS, MINUTES, HOURS, DAYS = range(8)
+LABELS = {
+    NONE: None,
+    DONE: '✅ Done',
+    INVALID: 'Invalid datetime',
+    OVERDUE: '⏰ Overdue',
+    SECONDS: '{} sec more',
+    MINUTES: '{} min more',
+    HOURS: '{} hr more',
+    DAYS: '{} days more',
+}
+UNITS = {SECONDS: SECOND, MINUTES: 60 * SECOND, HOURS: 3600 * SECOND,
+         DAYS: 86400 * SECOND}
+
+
+class TaskTable:
+    """
+    Column-oriented view of a set of tasks.
+
+    Attributes:
+        tasks (list): The tasks, in row order.
+        status (array): Status code of each row, OTHER if the status is
+            not one of STATUSES.
+        due (array): Due date of each row in microseconds since the epoch,
+            NO_DUE if it has none and INVALID_DUE if it cannot be parsed.
+    """
+    def __init__(self, tasks):
+        """
+        Builds the columns from the given tasks.
+
+        Args:
+            tasks: An iterable of Task instances.
+        """
+        self.tasks = list(tasks)
+        status = []
+        due = []
+        for task in self.tasks:
+            code = task._status
+            status.append(code if isinstance(code, int) else OTHER)
+            due.append(self.__epoch(task._due))
+
+        if numpy is not None:
+            self.status = numpy.array(status, dtype=numpy.int8)
+            self.due = numpy.array(due, dtype=numpy.int64)
+        else:
+            self.status = array('b', status)
+            self.due = array('q', due)
+
+    def __len__(self):
+        """
+        Returns the number of rows.
+        """
+        return len(self.tasks)
+
+    def time_left(self, rows=None, now=None):
+        """
+        Returns the time left until each row is due, as shown by 'list'.
+
+        Args:
+            rows (list): The rows to compute, all rows by default.
+            now (datetime): The time to count from, datetime.now() by
+                default. The same value is used for every row.
+
+        Returns:
+            list: One label per row, e.g. '3 hr more', '⏰ Overdue',
+            '✅ Done', or None for tasks without a due date.
+        """
+        if rows is None:
+            rows = list(range(len(self)))
+        now = to_epoch(now or datetime.now())
+        done = STATUS_CODES['completed']
+
+        if numpy is not None:
+            rows = numpy.asarray(rows, dtype=numpy.int64)
+            due = self.due[rows]
+            missing = (due == NO_DUE) | (due == INVALID_DUE)
+            left = numpy.where(missing, now, due) - now
+            buckets = numpy.select(
+                [
+                    self.status[rows] == done,
+                    due == NO_DUE,
+                    due == INVALID_DUE,
+                    left < 0,
+                    left < UNITS[MINUTES],
+                    left < UNITS[HOURS],
+                    left < UNITS[DAYS],
+                ],
+                [DONE, NONE, INVALID, OVERDUE, SECONDS, MINUTES, HOURS],
+                DAYS
+            )
+            units = numpy.array(
+                [UNITS.get(bucket, 1) for bucket in range(len(LABELS))],
+                dtype=numpy.int64
+            )
+            amounts = numpy.where(left > 0, left, 0) // units[buckets]
+            pairs = zip(buckets.tolist(), amounts.tolist())
+        else:
+            pairs = (
+                self.__bucket(self.status[row], self.due[row], now, done)
+                for row in rows
+            )
+
+        labels = []
+        for bucket, amount in pairs:
+            label = LABELS[bucket]
+            labels.append(label.format(amount) if bucket >= SECONDS else label)
+        return labels
+
+    @staticmethod
+    def __bucket(status, due, now, done):
+        """
+        Returns the time-left bucket and amount of a single row.
+        """
+        if status == done:
+            return DONE, 0
+        if due == NO_DUE:
+            return NONE, 0
+        if due == INVALID_DUE:
+            return INVALID, 0
+        left = due - now
+        if left < 0:
+            return OVERDUE, 0
+        for bucket in (SECONDS, MINUTES, HOURS):
+            if left < UNITS[bucket + 1]:
+                return bucket, left // UNITS[bucket]
+        return DAYS, left // UNITS[DAYS]
+
+    @staticmethod
+    def __epoch(value):
+        """
+        Returns the due date column value of a task, from the due date it
+        keeps in microseconds since the epoch or as an invalid string.
+        """
+        if isinstance(value, int):
+            return value
+        return INVALID_DUE if value else NO_DUE
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+trace.py
+
+This module records how long the phases of a todo.py command take and
+how many objects they handle, for 'todo.py --profile' and the TODO_TRACE
+environment variable.
+
+Tracing is off unless enable() is called. The storage and Task methods
+are wrapped with traced(), which only checks one module attribute when
+tracing is off; counters are only updated by callers that check enabled
+first. Phases may be nested: each phase records its total time and its
+self time, which leaves out the phases run inside it.
+"""
+import json
+import os
+import sys
+from functools import wraps
+from time import perf_counter
+
+enabled = False
+
+# name -> [calls, total seconds, self seconds], in the order first seen.
+phases = {}
+counts = {}
+_stack = []
+
+
+def enable():
+    """
+    Turns tracing on and forgets what was recorded before.
+    """
+    global enabled
+    enabled = True
+    reset()
+
+
+def disable():
+    """
+    Turns tracing off.
+    """
+    global enabled
+    enabled = False
+
+
+def reset():
+    """
+    Forgets the recorded phases and counters.
+    """
+    phases.clear()
+    counts.clear()
+    del _stack[:]
+
+
+def record(name, seconds):
+    """
+    Records a phase that was timed by the caller, such as the imports
+    done before tracing could be enabled.
+    """
+    entry = phases.setdefault(name, [0, 0.0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+    entry[2] += seconds
+    if _stack:
+        _stack[-1][1] += seconds
+
+
+def count(name, n=1):
+    """
+    Adds n to a counter. Callers check enabled first.
+    """
+    counts[name] = counts.get(name, 0) + n
+
+
+def phase(name):
+    """
+    Returns a context manager that times a phase when tracing is on:
+
+        with trace.phase('render'):
+            ...
+
+    Args:
+        name (str): The name of the phase.
+    """
+    return Phase(name)
+
+
+class Phase:
+    """
+    Context manager returned by phase().
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if enabled:
+            self.start = perf_counter()
+            _stack.append([self.name, 0.0])
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is None:
+            return
+        seconds = perf_counter() - self.start
+        name, nested = _stack.pop()
+        entry = phases.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += seconds - nested
+        if _stack:
+            _stack[-1][1] += seconds
+
+
+def traced(name):
+    """
+    Decorator that times every call of a function as a phase.
+
+    Args:
+        name (str): The name of the phase.
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def iterate(name, iterable):
+    """
+    Times the iteration of an iterable as a phase, for results that are
+    produced lazily, such as the lines of a streamed table.
+
+    Returns:
+        The iterable itself when tracing is off.
+    """
+    if not enabled:
+        return iterable
+
+    def timed():
+        iterator = iter(iterable)
+        while True:
+            with phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    return timed()
+
+
+def summary():
+    """
+    Returns the recorded phases and counters as a table.
+
+    Returns:
+        str: One line per phase with its calls, total and self time in
+        milliseconds, followed by the counters.
+    """
+    lines = [f"{'phase':<28}{'calls':>7}{'total ms':>12}{'self ms':>12}"]
+    for name, (calls, total, own) in phases.items():
+        lines.append(
+            f"{name:<28}{calls:>7}{total * 1000:>12.1f}{own * 1000:>12.1f}"
+        )
+    for name, value in counts.items():
+        lines.append(f"{name:<28}{value:>7}")
+    return '\n'.join(lines)
+
+
+def to_dict():
+    """
+    Returns the recorded phases and counters as a JSON serializable
+    dictionary, with times in seconds.
+    """
+    return {
+        'phases': {
+            name: {'calls': calls, 'total': total, 'self': own}
+            for name, (calls, total, own) in phases.items()
+        },
+        'counts': dict(counts),
+    }
+
+
+def report(destination=None):
+    """
+    Prints the summary to standard error, or writes the phases and
+    counters as JSON to a file.
+
+    Args:
+        destination (str): Path of the JSON file, or None for the summary.
+    """
+    if destination is None:
+        print(summary(), file=sys.stderr)
+        return
+    with open(destination, 'w') as f:
+        json.dump(to_dict(), f, indent=4)
+
+
+def from_environment():
+    """
+    Reads TODO_TRACE: '1' asks for the summary on standard error, any
+    other value except '0' names a file to write the JSON trace to.
+
+    Returns:
+        tuple: Whether to trace, and the destination for report().
+    """
+    value = os.environ.get('TODO_TRACE', '')
+    if value in ('', '0'):
+        return False, None
+    return True, None if value == '1' else value
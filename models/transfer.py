@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+transfer.py
+
+This module imports and exports tasks in bulk as CSV, NDJSON (one JSON
+object per line) or JSON (the layout of FileStorage's file.json; an array
+of task objects is also accepted on import).
+
+Files are read and written one record at a time. Imported records are
+validated first; if any record is invalid nothing is imported, otherwise
+all the tasks are added in one store.batch() block, so the store is
+written once however many tasks there are.
+"""
+import csv
+import json
+from datetime import datetime
+from uuid import uuid4
+import models
+from models.base_model import to_epoch
+from models.task import Task, STATUSES, PRIORITIES
+from models.storage.json_stream import iter_json_items, write_json_items
+
+FORMATS = ('csv', 'ndjson', 'json')
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson',
+              '.json': 'json'}
+
+# Number of invalid records listed in the error message of import_tasks.
+MAX_ERRORS = 10
+
+
+def detect_format(path):
+    """
+    Guesses the format of a file from its extension.
+
+    Args:
+        path (str): The file path, or '-' for standard input/output.
+
+    Returns:
+        str: One of FORMATS. Standard input/output defaults to 'ndjson'.
+
+    Raises:
+        ValueError: If the extension is not known.
+    """
+    if path == '-':
+        return 'ndjson'
+    for extension, fmt in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return fmt
+    raise ValueError(
+        f"Cannot tell the format of '{path}', use --format"
+    )
+
+
+def read_records(f, fmt):
+    """
+    Yields the records of a file one at a time.
+
+    Args:
+        f: A text file open for reading.
+        fmt (str): One of FORMATS.
+
+    Yields:
+        tuple: Where the record was found (e.g. 'line 3') and the record.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for record in reader:
+            # Empty cells stand for missing values.
+            yield f"line {reader.line_num}", {
+                key: value for key, value in record.items()
+                if key is not None and value != ''
+            }
+    elif fmt == 'ndjson':
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as error:
+                    record = error
+                yield f"line {number}", record
+    elif fmt == 'json':
+        for key, record in iter_json_items(f, array=True):
+            if isinstance(key, int):
+                yield f"item {key + 1}", record
+            else:
+                yield f"'{key}'", record
+    else:
+        raise ValueError(f"Unknown format '{fmt}'")
+
+
+def build_task(record):
+    """
+    Validates an imported record and creates the task it describes,
+    without adding it to the store.
+
+    Args:
+        record (dict): The task attributes, as produced by to_dict().
+        Only 'title' is required. Records without an id get a new one.
+
+    Returns:
+        Task: The new task.
+
+    Raises:
+        ValueError: If the record is not a valid task.
+    """
+    if isinstance(record, Exception):
+        raise ValueError(f"invalid JSON ({record})")
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    if record.get('__class__', 'Task') != 'Task':
+        raise ValueError(f"not a Task but a {record['__class__']}")
+    title = record.get('title')
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("missing title")
+    if record.get('status', 'pending') not in STATUSES:
+        raise ValueError(f"unknown status '{record['status']}'")
+    if record.get('priority') not in PRIORITIES:
+        raise ValueError(f"unknown priority '{record['priority']}'")
+
+    record = dict(record)
+    for name in ('duedatetime', 'created_at', 'updated_at', 'completed_at'):
+        value = record.get(name)
+        if value is None:
+            continue
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {name} '{value}'") from None
+        if value.tzinfo is not None:
+            raise ValueError(
+                f"invalid {name} '{record[name]}': UTC offsets are not"
+                " supported"
+            )
+        record[name] = value
+
+    task = Task.from_dict(record)
+    if task.id is None:
+        task._uuid = uuid4().bytes
+    now = to_epoch(datetime.now())
+    if task._created_at is None:
+        task._created_at = now
+    if task._updated_at is None:
+        task._updated_at = now
+    return task
+
+
+def import_tasks(f, fmt):
+    """
+    Imports the tasks of a file into models.store. Tasks whose id is
+    already stored replace the stored task.
+
+    Args:
+        f: A text file open for reading.
+        fmt (str): One of FORMATS.
+
+    Returns:
+        int: The number of tasks imported.
+
+    Raises:
+        ValueError: If any record is invalid. Nothing is imported then.
+    """
+    tasks = []
+    errors = []
+    for where, record in read_records(f, fmt):
+        try:
+            tasks.append(build_task(record))
+        except ValueError as error:
+            errors.append(f"{where}: {error}")
+    if errors:
+        shown = errors[:MAX_ERRORS]
+        if len(errors) > MAX_ERRORS:
+            shown.append(f"... and {len(errors) - MAX_ERRORS} more")
+        raise ValueError(
+            f"{len(errors)} invalid record(s), nothing imported:\n"
+            + '\n'.join(shown)
+        )
+
+    with models.store.batch():
+        for task in tasks:
+            models.store.new(task)
+    return len(tasks)
+
+
+def export_tasks(f, fmt):
+    """
+    Writes every stored task to a file, one record at a time.
+
+    Args:
+        f: A text file open for writing.
+        fmt (str): One of FORMATS.
+
+    Returns:
+        int: The number of tasks exported.
+    """
+    items = (
+        (key, obj.to_dict()) for key, obj in models.store.all().items()
+    )
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, fieldnames=Task.fields,
+                                extrasaction='ignore')
+        writer.writeheader()
+        for _, data in items:
+            writer.writerow(data)
+            count += 1
+    elif fmt == 'ndjson':
+        for _, data in items:
+            f.write(json.dumps(data) + '\n')
+            count += 1
+    elif fmt == 'json':
+        def counted():
+            nonlocal count
+            for item in items:
+                count += 1
+                yield item
+        write_json_items(f, counted())
+        f.write('\n')
+    else:
+        raise ValueError(f"Unknown format '{fmt}'")
+    return count
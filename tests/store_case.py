@@ -0,0 +1,40 @@
+"""
+This module contains the models.store fixture shared by the unit tests
+"""
+import os
+import tempfile
+import models
+from models.storage.file_storage import FileStorage
+
+
+class TemporaryStore:
+    """
+    Mixin for test cases that need models.store: each test gets an empty
+    journal store in a temporary directory.
+
+    Attributes:
+        directory (TemporaryDirectory): Holds the files of the store.
+        store_path (str): The JSON file of the store.
+        journal (str): The journal of the store.
+    """
+    def setUp(self):
+        """
+        Points models.store at an empty journal store in a temporary
+        directory.
+        """
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.directory.name, 'file.json')
+        self.journal = self.store_path + '.journal'
+        self.__store = models.store
+        FileStorage._FileStorage__objects = {}
+        models.store = FileStorage(journal=True, file_path=self.store_path)
+
+    def tearDown(self):
+        """
+        Restores models.store and removes the temporary files.
+        """
+        models.store = self.__store
+        FileStorage._FileStorage__objects = {}
+        self.directory.cleanup()
+        super().tearDown()
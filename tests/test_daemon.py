@@ -0,0 +1,111 @@
+"""
+This module contains unit tests for the daemon socket protocol
+"""
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+
+import daemon
+
+
+class TestDaemon(unittest.TestCase):
+    """
+    Test forward() against a Server running in a thread.
+    """
+    def setUp(self):
+        """
+        Starts a server whose commands echo their arguments and input.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'todo.sock')
+        self.calls = []
+
+        def run(argv, stdin):
+            self.calls.append((argv, stdin))
+            return 3, ' '.join(argv) + '\n', ''
+
+        self.server = daemon.Server(self.path, run)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,)
+        )
+        self.thread.start()
+
+    def tearDown(self):
+        """
+        Stops the server.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.directory.cleanup()
+
+    def test_forward(self):
+        """
+        Test that the command runs in the daemon and its output and exit
+        code come back.
+        """
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = daemon.forward(['list', '--top', '3'], self.path)
+        self.assertEqual(code, 3)
+        self.assertEqual(out.getvalue(), 'list --top 3\n')
+        self.assertEqual(self.calls, [(['list', '--top', '3'], '')])
+
+    def test_other_directory_falls_back(self):
+        """
+        Test that clients in another directory run commands themselves.
+        """
+        self.server.cwd = self.directory.name
+        self.assertIsNone(daemon.forward(['list'], self.path))
+        self.assertEqual(self.calls, [])
+
+    def test_other_settings_fall_back(self):
+        """
+        Test that clients with other TODO_* variables, e.g. another
+        storage, run commands themselves.
+        """
+        self.server.env = dict(self.server.env, TODO_STORAGE='sqlite')
+        self.assertIsNone(daemon.forward(['list'], self.path))
+        self.assertEqual(self.calls, [])
+
+    def test_empty_and_invalid_requests(self):
+        """
+        Test that a connection closed without a command gets no reply and
+        an invalid request gets an error, without running anything.
+        """
+        errors = []
+        self.server.handle_error = lambda *args: errors.append(args)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(self.path)
+            client.shutdown(socket.SHUT_WR)
+            self.assertEqual(client.makefile('rb').read(), b'')
+        for request in (b'not json\n', b'["list"]\n', b'{}\n'):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(self.path)
+                client.sendall(request)
+                with client.makefile('rb') as f:
+                    self.assertEqual(
+                        json.loads(f.readline()), {'error': 'invalid request'}
+                    )
+        self.assertEqual(self.calls, [])
+        self.assertEqual(errors, [])
+
+    def test_no_daemon(self):
+        """
+        Test that forward() gives up when there is no socket or nobody
+        listens on it.
+        """
+        missing = os.path.join(self.directory.name, 'missing.sock')
+        self.assertIsNone(daemon.forward(['list'], missing))
+        stale = os.path.join(self.directory.name, 'stale.sock')
+        open(stale, 'w').close()
+        self.assertIsNone(daemon.forward(['list'], stale))
+
+
+if __name__ == '__main__':
+    unittest.main()
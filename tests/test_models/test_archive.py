@@ -0,0 +1,107 @@
+"""
+This module contains unit tests for archiving completed tasks
+"""
+import gzip
+import os
+import unittest
+from datetime import datetime, timedelta
+import models
+from models import archive
+from models.task import Task
+from tests.store_case import TemporaryStore
+
+
+class TestArchive(TemporaryStore, unittest.TestCase):
+    """
+    Test archive_tasks, apply_policy and reading the cold store back.
+    """
+    def setUp(self):
+        """
+        Places the cold store next to the temporary store.
+        """
+        super().setUp()
+        self.path = os.path.join(self.directory.name, 'archive.ndjson.gz')
+
+    def add(self, title, completed_days_ago=None):
+        task = Task(title)
+        if completed_days_ago is not None:
+            task.mark_completed()
+            task.completed_at = datetime.now() - timedelta(
+                days=completed_days_ago
+            )
+        task.save()
+        return task
+
+    def test_archive_moves_old_completed_tasks(self):
+        """
+        Test that only tasks completed long enough ago leave the store.
+        """
+        self.add("Wash plates")
+        self.add("Call the dentist", completed_days_ago=1)
+        old = self.add("File taxes", completed_days_ago=40)
+
+        self.assertEqual(archive.archive_tasks(path=self.path), 1)
+        self.assertEqual(
+            sorted(task.title for task in models.store.all().values()),
+            ["Call the dentist", "Wash plates"]
+        )
+        archived = list(archive.iter_archived(self.path))
+        self.assertEqual([key for key, _ in archived], [f"Task.{old.id}"])
+        self.assertEqual(archived[0][1].title, "File taxes")
+        self.assertEqual(archive.archive_tasks(path=self.path), 0)
+
+    def test_runs_append_gzip_members(self):
+        """
+        Test that each run appends to the cold store, and that a task
+        archived twice is read back once, as it was archived last.
+        """
+        first = self.add("File taxes", completed_days_ago=40)
+        archive.archive_tasks(path=self.path)
+        with open(self.path, 'rb') as f:
+            size = len(f.read())
+        first.title = "File taxes for 2025"
+        models.store.new(first)
+        self.add("Renew passport", completed_days_ago=60)
+        self.assertEqual(archive.archive_tasks(path=self.path), 2)
+
+        with open(self.path, 'rb') as f:
+            self.assertGreater(len(f.read()), size)
+        with gzip.open(self.path, 'rt') as f:
+            self.assertEqual(len(f.readlines()), 3)
+        self.assertEqual(
+            sorted(task.title for _, task in archive.iter_archived(self.path)),
+            ["File taxes for 2025", "Renew passport"]
+        )
+
+    def test_policy_runs_once_per_interval(self):
+        """
+        Test that the policy does not run again until the interval passed.
+        """
+        self.add("File taxes", completed_days_ago=40)
+        self.assertEqual(archive.apply_policy(timedelta(days=30), self.path), 1)
+        self.add("Renew passport", completed_days_ago=60)
+        self.assertEqual(archive.apply_policy(timedelta(days=30), self.path), 0)
+
+        last_run = os.path.getmtime(self.path) - archive.POLICY_INTERVAL
+        os.utime(self.path, (last_run, last_run))
+        self.assertEqual(archive.apply_policy(timedelta(days=30), self.path), 1)
+
+    def test_list_archived(self):
+        """
+        Test that archived tasks are listed by Task.page(archived=True).
+        """
+        self.add("Wash plates")
+        self.add("File taxes", completed_days_ago=40)
+        archive.archive_tasks(path=self.path)
+
+        default = archive.PATH
+        archive.PATH = self.path
+        try:
+            pages = list(Task.page(archived=True))
+        finally:
+            archive.PATH = default
+        self.assertEqual([task.title for _, task in pages], ["File taxes"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@
 This module contains unit tests for the BaseModel class.
 """
 import unittest
-from models.base_model import BaseModel
+from models.base_model import BaseModel, to_epoch
 from datetime import datetime
 
 
@@ -53,3 +53,22 @@ class TestBaseModel(unittest.TestCase):
         self.assertIn('updated_at', model_dict)
         self.assertIsInstance(model_dict['created_at'], str)
         self.assertIsInstance(model_dict['updated_at'], str)
+
+    def test_timestamps_with_offset_are_rejected(self):
+        """
+        Tests that a timestamp with a UTC offset is refused rather than
+        silently converted to local time.
+        """
+        self.assertEqual(to_epoch("1970-01-01T00:00:01"), 1000000)
+        with self.assertRaises(ValueError):
+            to_epoch("2030-01-01T09:00:00+05:00")
+        with self.assertRaises(ValueError):
+            self.myModel.created_at = "2030-01-01T09:00:00+05:00"
+
+    def test_ids_that_are_not_strings(self):
+        """
+        Tests that ids that are not UUID strings are kept as given.
+        """
+        self.myModel.id = 42
+        self.assertEqual(self.myModel.id, 42)
+        self.assertEqual(self.myModel.to_dict()['id'], 42)
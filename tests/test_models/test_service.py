@@ -0,0 +1,131 @@
+"""
+This module contains unit tests for the TaskService Class
+"""
+import asyncio
+import os
+import threading
+import unittest
+import models
+from models.service import TaskService
+from models.storage.file_storage import FileStorage
+from tests.store_case import TemporaryStore
+
+
+class TestTaskService(TemporaryStore, unittest.IsolatedAsyncioTestCase):
+    """
+    Test the TaskService Class.
+    """
+    def journal_lines(self):
+        """
+        Returns the number of records in the journal.
+        """
+        if not os.path.exists(self.journal):
+            return 0
+        with open(self.journal) as f:
+            return len(f.readlines())
+
+    async def test_add_get_query(self):
+        """
+        Test that added tasks can be read back at once.
+        """
+        async with TaskService() as service:
+            task = await service.add("Wash plates", priority='urgent')
+            self.assertIs(await service.get(task.id), task)
+            self.assertIsNone(await service.get("missing"))
+            self.assertEqual(await service.query(priority='urgent'), [task])
+
+    async def test_writes_are_coalesced(self):
+        """
+        Test that concurrent writes are saved together in one flush.
+        """
+        async with TaskService(flush_delay=0.2) as service:
+            tasks = await asyncio.gather(
+                *(service.add(f"Chore {i}") for i in range(20))
+            )
+            self.assertEqual(self.journal_lines(), 0)
+            await asyncio.sleep(0.4)
+            self.assertEqual(self.journal_lines(), 20)
+
+            await asyncio.gather(
+                service.complete(tasks[0].id),
+                service.delete(tasks[1].id),
+                service.complete("missing"),
+            )
+            await service.flush()
+            self.assertEqual(self.journal_lines(), 22)
+
+        FileStorage._FileStorage__objects = {}
+        models.store.reload()
+        self.assertEqual(len(models.store.all()), 19)
+        self.assertEqual(
+            models.store.get(type(tasks[0]), tasks[0].id).status,
+            'completed'
+        )
+
+    async def test_store_is_used_from_one_thread(self):
+        """
+        Test that the store is only used from one thread, not from the
+        event loop, so that a save never runs alongside another call.
+        """
+        threads = set()
+        store = models.store
+        get = store.get
+
+        def recording_get(*args):
+            threads.add(threading.get_ident())
+            return get(*args)
+
+        store.get = recording_get
+        try:
+            async with TaskService(flush_delay=0) as service:
+                task = await service.add("Wash plates")
+                await asyncio.gather(
+                    service.get(task.id), service.flush(),
+                    service.complete(task.id), service.get(task.id)
+                )
+        finally:
+            del store.get
+        self.assertEqual(len(threads), 1)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    async def test_get_does_not_wait_for_save(self):
+        """
+        Test that a task is read by ID while a save is still running.
+        """
+        store = models.store
+        saving = threading.Event()
+        release = threading.Event()
+        save = store.save
+
+        def slow_save():
+            saving.set()
+            release.wait(5)
+            save()
+
+        store.save = slow_save
+        try:
+            async with TaskService(flush_delay=60) as service:
+                task = await service.add("Wash plates")
+                flush = asyncio.ensure_future(service.flush())
+                await asyncio.to_thread(saving.wait, 5)
+                found = await asyncio.wait_for(service.get(task.id), 1)
+                self.assertIs(found, task)
+                self.assertFalse(flush.done())
+                release.set()
+                await flush
+        finally:
+            release.set()
+            del store.save
+        self.assertEqual(self.journal_lines(), 1)
+
+    async def test_close_saves_pending_changes(self):
+        """
+        Test that leaving the context saves what was not flushed yet.
+        """
+        async with TaskService(flush_delay=60) as service:
+            await service.add("Call the dentist")
+        self.assertEqual(self.journal_lines(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import tempfile  # For creating temporary files
+import os
+import json
+from datetime import datetime
+from unittest import mock
+
+from models.task import Task
+from models.storage import binary_snapshot
+from models.storage.file_storage import FileStorage
+
+
+class TestBinarySnapshot(unittest.TestCase):
+    def setUp(self):
+        # Create Task objects
+        self.task = Task("Wash Plates", project_name="Home",
+                         duedatetime=datetime(2030, 1, 1, 9, 0),
+                         priority="urgent")
+        self.task.mark_completed()
+        self.other = Task("Sweep Floor")
+        self.other.status = "blocked"
+        # create temporary files for testing
+        self.test_file = tempfile.NamedTemporaryFile(delete=False)
+        self.test_file.close()
+        self.json_file = self.test_file.name + '.json'
+
+        self.storage = FileStorage(binary=True, file_path=self.test_file.name)
+        FileStorage._FileStorage__objects = {}
+
+    def tearDown(self):
+        del self.task
+        del self.other
+        for path in (self.test_file.name, self.json_file,
+                     self.test_file.name + '.lock'):
+            if os.path.exists(path):
+                os.remove(path)
+        FileStorage._FileStorage__objects = {}
+
+    def test_save_writes_binary_snapshot(self):
+        self.storage.new(self.task)
+        self.storage.save()
+
+        with open(self.test_file.name, 'rb') as f:
+            self.assertTrue(binary_snapshot.is_binary(f))
+
+    def test_reload_restores_objects(self):
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.save()
+
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+        all_objects = self.storage.all()
+        self.assertEqual(list(all_objects),
+                         [f"Task.{self.task.id}", f"Task.{self.other.id}"])
+        for original in (self.task, self.other):
+            loaded = all_objects[f"Task.{original.id}"]
+            self.assertEqual(loaded.to_dict(), original.to_dict())
+
+    def test_due_dates_are_read_without_parsing(self):
+        self.other.duedatetime = "tomorrow"
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.save()
+
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        with mock.patch('models.task.to_epoch', side_effect=AssertionError):
+            all_objects = self.storage.all()
+        loaded = all_objects[f"Task.{self.task.id}"]
+        self.assertEqual(loaded._due, self.task._due)
+        self.assertEqual(loaded.duedatetime, datetime(2030, 1, 1, 9, 0))
+        self.assertEqual(
+            all_objects[f"Task.{self.other.id}"].duedatetime, "tomorrow"
+        )
+
+    def test_reads_first_format(self):
+        strings = ['Task', 'Wash Plates', None, '2030-01-01T09:00:00', None]
+        header = binary_snapshot.HEADER_V1.pack(
+            self.task._uuid, self.task._created_at, self.task._updated_at,
+            binary_snapshot.NONE, 0, 0,
+            *(-1 if string is None else len(string) for string in strings)
+        )
+        payload = header + ''.join(filter(None, strings)).encode('utf-8')
+        with open(self.test_file.name, 'wb') as f:
+            f.write(binary_snapshot.MAGIC_V1)
+            f.write(binary_snapshot.FRAME.pack(len(payload)))
+            f.write(payload)
+
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        loaded = self.storage.get(Task, self.task.id)
+        self.assertEqual(loaded.title, "Wash Plates")
+        self.assertEqual(loaded.duedatetime, datetime(2030, 1, 1, 9, 0))
+
+    def test_convert_to_and_from_json(self):
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.binary = False
+        self.storage.save()
+        with open(self.test_file.name, 'r') as f:
+            original = json.load(f)
+
+        binary_snapshot.json_to_binary(
+            self.test_file.name, self.json_file, FileStorage.models
+        )
+        binary_snapshot.binary_to_json(
+            self.json_file, self.test_file.name, FileStorage.models
+        )
+
+        with open(self.test_file.name, 'r') as f:
+            self.assertEqual(json.load(f), original)
@@ -2,9 +2,12 @@ import unittest
 import tempfile  # For creating temporary files
 import os
 import json
+import subprocess
+import sys
+from datetime import datetime
 
 from models.task import Task
-from models.storage.file_storage import FileStorage
+from models.storage.file_storage import FileStorage, iter_json_items
 
 
 class TestFileStorage(unittest.TestCase):
@@ -22,6 +25,9 @@ class TestFileStorage(unittest.TestCase):
     def tearDown(self):
         del self.task
         os.remove(self.test_file.name)
+        for suffix in ('.journal', '.lock', '.search', '.ids'):
+            if os.path.exists(self.test_file.name + suffix):
+                os.remove(self.test_file.name + suffix)
         FileStorage._FileStorage__objects = {}
     
     def test_new_and_all(self):
@@ -58,9 +64,567 @@ class TestFileStorage(unittest.TestCase):
         self.assertIsInstance(all_objects[key], Task)
         self.assertEqual(all_objects[key].title, "Wash Plates")
     
+    def test_reload_is_lazy(self):
+        other = Task("Sweep Floor")
+        self.storage.new(self.task)
+        self.storage.new(other)
+        self.storage.save()
+
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(FileStorage._FileStorage__objects, {})
+
+        task = self.storage.get(Task, self.task.id)
+        self.assertEqual(task.title, "Wash Plates")
+        self.assertEqual(list(FileStorage._FileStorage__objects),
+                         [f"Task.{self.task.id}"])
+
+        keys = list(self.storage.all())
+        self.assertEqual(keys, [f"Task.{self.task.id}", f"Task.{other.id}"])
+
+    def test_query_uses_indexes(self):
+        later = Task("Mop Floor", duedatetime=datetime(2030, 6, 1, 9, 0))
+        sooner = Task("Dust Shelves", duedatetime=datetime(2030, 1, 1, 9, 0))
+        self.storage.new(self.task)
+        self.storage.new(later)
+        self.storage.new(sooner)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+        due = self.storage.query(status='pending', due_after=datetime(2029, 1, 1))
+        self.assertEqual(list(due), [f"Task.{sooner.id}", f"Task.{later.id}"])
+        self.assertEqual(len(FileStorage._FileStorage__objects), 2)
+
+        task = self.storage.get(Task, later.id)
+        task.status = 'completed'
+        self.storage.update(task)
+        self.assertEqual(list(self.storage.query(status='completed')),
+                         [f"Task.{later.id}"])
+        nxt = self.storage.query(status='pending', due_after=datetime(2029, 1, 1),
+                                 limit=1)
+        self.assertEqual(list(nxt), [f"Task.{sooner.id}"])
+
+        self.storage.delete(task)
+        self.assertEqual(self.storage.query(status='completed'), {})
+
+        self.storage.all()
+        due = self.storage.query(due_before=datetime(2030, 3, 1))
+        self.assertEqual(list(due), [f"Task.{sooner.id}"])
+        self.storage.new(task)
+        self.assertEqual(list(self.storage.query(status='completed')),
+                         [f"Task.{later.id}"])
+
+    def test_query_order_by(self):
+        later = Task("Mop Floor", duedatetime=datetime(2030, 6, 1, 9, 0),
+                     priority='urgent')
+        sooner = Task("Dust Shelves", duedatetime=datetime(2030, 1, 1, 9, 0))
+        for task in (self.task, later, sooner):
+            self.storage.new(task)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+        # Streamed through a heap
+        top = self.storage.query(order_by='due', limit=2)
+        self.assertEqual(list(top), [f"Task.{sooner.id}", f"Task.{later.id}"])
+        top = self.storage.query(order_by='priority', limit=1)
+        self.assertEqual(list(top), [f"Task.{later.id}"])
+
+        # Walked from the due date index
+        self.storage.all()
+        self.storage.query(status='pending')
+        ordered = self.storage.query(order_by='due')
+        self.assertEqual(list(ordered), [
+            f"Task.{sooner.id}", f"Task.{later.id}", f"Task.{self.task.id}"
+        ])
+        top = self.storage.query(order_by='due', limit=1, priority='urgent')
+        self.assertEqual(list(top), [f"Task.{later.id}"])
+        with self.assertRaises(ValueError):
+            self.storage.query(order_by='title')
+
+    def test_due_queries_skip_invalid_due_dates(self):
+        later = Task("Mop Floor", duedatetime=datetime(2030, 6, 1, 9, 0))
+        sooner = Task("Dust Shelves", duedatetime="2030-01-01T09:00:00")
+        someday = Task("Tidy Attic", duedatetime="tomorrow")
+        for task in (later, someday, sooner):
+            self.storage.new(task)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+        # Streamed from the records on disk
+        found = self.storage.query(
+            due_after="2029-01-01T00:00:00", order_by='due'
+        )
+        self.assertEqual(list(found), [f"Task.{sooner.id}", f"Task.{later.id}"])
+        found = self.storage.query(due_before=datetime(2030, 3, 1))
+        self.assertEqual(list(found), [f"Task.{sooner.id}"])
+
+    def test_iter_json_items_streams_records(self):
+        data = {f"Task.{i}": {"title": f"Task {i}", "n": i} for i in range(50)}
+        with open(self.test_file.name, 'w') as f:
+            json.dump(data, f, indent=4)
+
+        with open(self.test_file.name, 'r') as f:
+            items = list(iter_json_items(f, chunk_size=7))
+        self.assertEqual(items, list(data.items()))
+
+    def test_compact_writes_json_layout(self):
+        other = Task("Sweep Floor")
+        self.storage.new(self.task)
+        self.storage.new(other)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.storage.get(Task, other.id).title = "Mop Floor"
+        self.storage.save()
+
+        with open(self.test_file.name, 'r') as f:
+            text = f.read()
+        data = json.loads(text)
+        self.assertEqual(text, json.dumps(data, indent=4))
+        self.assertEqual(data[f"Task.{self.task.id}"]['title'], "Wash Plates")
+        self.assertEqual(data[f"Task.{other.id}"]['title'], "Mop Floor")
+
+    def test_rewrite_keeps_file_permissions(self):
+        os.chmod(self.test_file.name, 0o640)
+        self.storage.new(self.task)
+        self.storage.save()
+        self.assertEqual(os.stat(self.test_file.name).st_mode & 0o777, 0o640)
+
+        os.remove(self.test_file.name)
+        umask = os.umask(0o022)
+        try:
+            self.storage.save()
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(self.test_file.name).st_mode & 0o777, 0o644)
+
+    def test_save_reserializes_only_changed_objects(self):
+        tasks = [self.task, Task("Sweep Floor"), Task("Mop Floor")]
+        for task in tasks:
+            self.storage.new(task)
+        self.storage.save()
+
+        calls = []
+        to_dict = Task.to_dict
+
+        def counting_to_dict(task):
+            calls.append(task.id)
+            return to_dict(task)
+
+        Task.to_dict = counting_to_dict
+        try:
+            tasks[1].title = "Sweep Porch"
+            self.storage.update(tasks[1])
+            self.storage.delete(tasks[2])
+            self.storage.save()
+        finally:
+            Task.to_dict = to_dict
+        self.assertEqual(calls, [tasks[1].id])
+
+        with open(self.test_file.name, 'r') as f:
+            text = f.read()
+        data = json.loads(text)
+        self.assertEqual(text, json.dumps(data, indent=4))
+        self.assertEqual(
+            {value['title'] for value in data.values()},
+            {"Wash Plates", "Sweep Porch"}
+        )
+
+    def test_parallel_save_and_reload_match_sequential(self):
+        tasks = [self.task] + [
+            Task(f"Chore {i}", project_name=f"p{i % 3}") for i in range(40)
+        ]
+        for task in tasks:
+            self.storage.new(task)
+        self.storage.save()
+        with open(self.test_file.name, 'r') as f:
+            sequential = f.read()
+
+        self.storage.workers = 2
+        self.storage.parallel_min_bytes = 0
+        self.storage.parallel_min_records = 0
+        self.storage.reload()
+        FileStorage._FileStorage__objects = {}
+        loaded = self.storage.all()
+        self.assertEqual(list(loaded), [f"Task.{task.id}" for task in tasks])
+        self.assertEqual(loaded[f"Task.{tasks[7].id}"].title, "Chore 6")
+
+        # Nothing is cached after a reload, so every object is serialized
+        # by the workers.
+        self.storage.update(tasks[0])
+        self.storage.save()
+        with open(self.test_file.name, 'r') as f:
+            self.assertEqual(f.read(), sequential)
+
     def test_delete_removes_object(self):
         self.storage.new(self.task)
         self.storage.delete(self.task)
 
         key = f"Task.{self.task.id}"
         self.assertNotIn(key, self.storage.all())
+
+    def test_get_and_query(self):
+        other = Task("Sweep Floor")
+        other.status = 'completed'
+        self.storage.new(self.task)
+        self.storage.new(other)
+
+        self.assertIs(self.storage.get(Task, self.task.id), self.task)
+        self.assertIsNone(self.storage.get(Task, "missing"))
+        completed = self.storage.query(status='completed')
+        self.assertEqual(list(completed), [f"Task.{other.id}"])
+
+    def test_get_many_reads_requested_records(self):
+        others = [Task(f"Chore {i}") for i in range(3)]
+        for task in [self.task] + others:
+            self.storage.new(task)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+        found = self.storage.get_many(
+            Task, [others[1].id, "missing", self.task.id]
+        )
+        self.assertEqual(list(found), [others[1].id, self.task.id])
+        self.assertEqual(found[self.task.id].title, "Wash Plates")
+        self.assertEqual(len(FileStorage._FileStorage__objects), 2)
+
+    def test_find_ids(self):
+        others = [Task(f"Chore {i}") for i in range(3)]
+        for task in [self.task] + others:
+            self.storage.new(task)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+        ids = sorted(task.id for task in [self.task] + others)
+        self.assertEqual(self.storage.find_ids(Task, ""), ids)
+        self.assertEqual(self.storage.find_ids(Task, "", limit=2), ids[:2])
+        self.assertEqual(self.storage.find_ids(Task, ids[1][:30]), [ids[1]])
+        self.assertEqual(self.storage.find_ids(Task, "x"), [])
+        # Keys were read without building objects.
+        self.assertEqual(FileStorage._FileStorage__objects, {})
+
+        task = Task("Mop Floor")
+        self.storage.new(task)
+        self.storage.delete(self.storage.get(Task, ids[0]))
+        self.assertEqual(self.storage.find_ids(Task, ""),
+                         sorted(ids[1:] + [task.id]))
+
+    def test_id_list_is_persisted_and_caught_up(self):
+        self.storage.journal = True
+        self.storage.new(self.task)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.storage.find_ids(Task, ""), [self.task.id])
+        self.assertTrue(os.path.exists(self.test_file.name + '.ids'))
+
+        # Another process adds a task to the journal; the next process
+        # applies it to the saved keys instead of reading the snapshot.
+        writer = FileStorage(journal=True, file_path=self.test_file.name)
+        other = Task("Wash Car")
+        writer.new(other)
+        writer.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        # A key only the saved list has shows that it was used.
+        with open(self.test_file.name + '.ids', 'a') as f:
+            f.write('Task.kept\n')
+        self.assertEqual(
+            self.storage.find_ids(Task, ""),
+            sorted([self.task.id, other.id, 'kept'])
+        )
+
+    def test_search(self):
+        other = Task("Sweep Floor", project_name="Home")
+        self.storage.journal = True
+        self.storage.new(self.task)
+        self.storage.new(other)
+        self.storage.save()
+
+        self.assertEqual(list(self.storage.search("plates")),
+                         [f"Task.{self.task.id}"])
+        self.assertEqual(list(self.storage.search("ho")),
+                         [f"Task.{other.id}"])
+        # The loaded index follows new(), update() and delete().
+        self.task.title = "Dry Plates"
+        self.storage.update(self.task)
+        self.storage.delete(other)
+        self.assertEqual(list(self.storage.search("dry")),
+                         [f"Task.{self.task.id}"])
+        self.assertEqual(self.storage.search("sweep"), {})
+        self.storage.save()
+
+    def test_search_index_is_persisted_and_caught_up(self):
+        self.storage.journal = True
+        self.storage.new(self.task)
+        self.storage.save()
+        self.storage.search("wash")
+        self.assertTrue(os.path.exists(self.test_file.name + '.search'))
+
+        # Another process adds a task to the journal.
+        writer = FileStorage(journal=True, file_path=self.test_file.name)
+        other = Task("Wash Car")
+        writer.new(other)
+        writer.save()
+
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        with open(self.test_file.name + '.search') as f:
+            before = json.load(f)['journal']
+        found = self.storage.search("wash")
+        self.assertEqual(set(found),
+                         {f"Task.{self.task.id}", f"Task.{other.id}"})
+        with open(self.test_file.name + '.search') as f:
+            self.assertGreater(json.load(f)['journal'], before)
+        # Only the matching records were read.
+        self.assertEqual(len(FileStorage._FileStorage__objects), 2)
+
+        # An index that does not match the snapshot is rebuilt.
+        self.storage.compact()
+        with open(self.test_file.name + '.search', 'w') as f:
+            f.write('{}')
+        self.storage.reload()
+        self.assertEqual(list(self.storage.search("car")),
+                         [f"Task.{other.id}"])
+
+    def test_journal_save_appends_record(self):
+        self.storage.journal = True
+        self.storage.new(self.task)
+        self.storage.save()
+        self.task.title = "Dry Plates"
+        self.storage.update(self.task)
+        self.storage.save()
+
+        with open(self.test_file.name + '.journal', 'r') as f:
+            records = [json.loads(line) for line in f]
+
+        key = f"Task.{self.task.id}"
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]['op'], 'put')
+        self.assertEqual(records[1]['key'], key)
+        self.assertEqual(records[1]['data']['title'], "Dry Plates")
+
+    def test_journal_reload_replays_records(self):
+        other = Task("Sweep Floor")
+        self.storage.journal = True
+        self.storage.new(self.task)
+        self.storage.new(other)
+        self.storage.save()
+        self.storage.delete(other)
+        self.storage.save()
+
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+        all_objects = self.storage.all()
+        self.assertIn(f"Task.{self.task.id}", all_objects)
+        self.assertNotIn(f"Task.{other.id}", all_objects)
+
+    def test_journal_compaction(self):
+        self.storage.journal = True
+        self.storage._FileStorage__compact_min_bytes = 0
+        self.storage.new(self.task)
+        self.storage.save()
+
+        self.assertFalse(os.path.exists(self.test_file.name + '.journal'))
+        with open(self.test_file.name, 'r') as f:
+            data = json.load(f)
+        self.assertIn(f"Task.{self.task.id}", data)
+
+    def add_from_other_process(self, title, journal):
+        # Another process adds a task to the same file.
+        script = (
+            "import sys\n"
+            "from models.task import Task\n"
+            "from models.storage.file_storage import FileStorage\n"
+            "store = FileStorage(journal=sys.argv[3] == 'journal',"
+            " file_path=sys.argv[1])\n"
+            "store.reload()\n"
+            "store.new(Task(sys.argv[2]))\n"
+            "store.save()\n"
+        )
+        subprocess.run(
+            [sys.executable, '-c', script, self.test_file.name, title,
+             'journal' if journal else 'snapshot'],
+            check=True, cwd=os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            ))
+        )
+
+    def titles_on_disk(self):
+        FileStorage._FileStorage__objects = {}
+        storage = FileStorage(file_path=self.test_file.name)
+        storage.reload()
+        return sorted(obj.title for obj in storage.all().values())
+
+    def test_concurrent_snapshot_writers_merge(self):
+        self.storage.new(self.task)
+        self.storage.save()
+        self.storage.reload()
+        self.storage.all()
+
+        self.add_from_other_process("Sweep Floor", journal=False)
+        other = Task("Dust Shelves")
+        self.storage.new(other)
+        self.storage.delete(self.task)
+        self.storage.save()
+
+        self.assertEqual(self.titles_on_disk(), ["Dust Shelves", "Sweep Floor"])
+
+    def test_concurrent_journal_writers_merge(self):
+        self.storage.journal = True
+        self.storage.new(self.task)
+        self.storage.save()
+        self.storage.reload()
+        self.storage.all()
+
+        self.add_from_other_process("Sweep Floor", journal=True)
+        self.assertTrue(self.storage.refresh())
+        self.assertFalse(self.storage.refresh())
+        self.assertEqual(len(self.storage.all()), 2)
+
+        self.add_from_other_process("Dust Shelves", journal=True)
+        self.storage._FileStorage__compact_min_bytes = 0
+        self.storage.new(Task("Mop Floor"))
+        self.storage.save()
+
+        self.assertFalse(os.path.exists(self.test_file.name + '.journal'))
+        self.assertEqual(self.titles_on_disk(), [
+            "Dust Shelves", "Mop Floor", "Sweep Floor", "Wash Plates"
+        ])
+
+
+class TestShardedFileStorage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.directory.name, 'shards.json')
+        FileStorage._FileStorage__objects = {}
+        self.storage = self.open()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        FileStorage._FileStorage__objects = {}
+
+    def open(self, journal=False):
+        FileStorage._FileStorage__objects = {}
+        storage = FileStorage(
+            journal=journal, file_path=self.manifest,
+            shards=('project', 'month')
+        )
+        storage.reload()
+        return storage
+
+    def read_manifest(self):
+        with open(self.manifest, 'r') as f:
+            return json.load(f)
+
+    def add(self, title, project_name=None, completed_at=None, storage=None):
+        task = Task(title, project_name=project_name)
+        if completed_at is not None:
+            task.mark_completed()
+            task.completed_at = completed_at
+        (storage or self.storage).new(task)
+        return task
+
+    def test_shards_by_project_and_month(self):
+        self.add("Wash Plates")
+        self.add("Paint Fence", project_name="home/garden")
+        self.add("File Taxes", completed_at=datetime(2020, 3, 5))
+        self.storage.save()
+
+        shards = self.read_manifest()['shards']
+        self.assertEqual(sorted(shards), [
+            'archive-2020-03', 'project-home%2Fgarden', 'tasks'
+        ])
+        self.assertEqual(shards['archive-2020-03']['month'], '2020-03')
+        self.assertEqual(shards['project-home%2Fgarden']['project'],
+                         'home/garden')
+        self.assertEqual(shards['tasks']['count'], 1)
+        for entry in shards.values():
+            self.assertTrue(os.path.exists(
+                os.path.join(self.directory.name, entry['file'])
+            ))
+
+        storage = self.open()
+        self.assertEqual(
+            sorted(task.title for task in storage.all().values()),
+            ["File Taxes", "Paint Fence", "Wash Plates"]
+        )
+
+    def test_save_writes_only_changed_shards(self):
+        task = self.add("Wash Plates")
+        self.add("Paint Fence", project_name="home")
+        self.storage.save()
+        before = self.read_manifest()['shards']
+
+        task.title = "Wash Cups"
+        self.storage.update(task)
+        self.storage.save()
+        after = self.read_manifest()['shards']
+        self.assertNotEqual(after['tasks']['file'], before['tasks']['file'])
+        self.assertEqual(after['project-home'], before['project-home'])
+
+        # The files replaced by a rewrite are removed by the next one.
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory.name, before['tasks']['file'])
+        ))
+        self.storage.save()
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory.name, before['tasks']['file'])
+        ))
+
+    def test_active_queries_skip_archive_shards(self):
+        self.add("Wash Plates")
+        self.add("Paint Fence", project_name="home")
+        self.add("File Taxes", completed_at=datetime(2020, 3, 5))
+        self.storage.save()
+        archive = self.read_manifest()['shards']['archive-2020-03']
+        with open(os.path.join(self.directory.name, archive['file']), 'w') as f:
+            f.write("not json")
+
+        storage = self.open()
+        active = storage.query(archived=False)
+        self.assertEqual(
+            sorted(task.title for task in active.values()),
+            ["Paint Fence", "Wash Plates"]
+        )
+        home = storage.query(project_name="home", status='pending')
+        self.assertEqual([task.title for task in home.values()],
+                         ["Paint Fence"])
+        with self.assertRaises(ValueError):
+            storage.query(status='completed')
+
+    def test_changed_objects_move_between_shards(self):
+        task = self.add("Paint Fence", project_name="home")
+        self.add("Wash Plates")
+        self.storage.save()
+
+        # A store that has not read the shards compacts a journal that
+        # moves one task and archives another.
+        storage = self.open(journal=True)
+        moved = storage.get(Task, task.id)
+        moved.project_name = "work"
+        storage.update(moved)
+        self.add("File Taxes", completed_at=datetime(2020, 3, 5),
+                 storage=storage)
+        storage.save()
+        storage = self.open(journal=True)
+        storage.compact()
+
+        shards = self.read_manifest()['shards']
+        self.assertNotIn('project-home', shards)
+        self.assertEqual(shards['project-work']['count'], 1)
+        self.assertEqual(shards['archive-2020-03']['count'], 1)
+        storage = self.open()
+        self.assertEqual(
+            sorted(task.title for task in storage.all().values()),
+            ["File Taxes", "Paint Fence", "Wash Plates"]
+        )
+        archived = storage.query(archived=True)
+        self.assertEqual([task.title for task in archived.values()],
+                         ["File Taxes"])
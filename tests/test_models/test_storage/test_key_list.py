@@ -0,0 +1,45 @@
+import io
+import unittest
+
+from models.storage import key_list
+
+
+class TestKeyList(unittest.TestCase):
+    def setUp(self):
+        self.keys = sorted(
+            ['Task.0a', 'Task.3fa8', 'Task.3fa85', 'Task.3fb', 'Task.é',
+             'Task.ff', 'Project.x']
+        )
+        f = io.StringIO()
+        key_list.write(f, {'journal': 12}, self.keys)
+        self.buffer = f.getvalue().encode('utf-8')
+
+    def test_read_header(self):
+        header, first = key_list.read_header(self.buffer)
+        self.assertEqual(header, {'journal': 12})
+        self.assertEqual(self.buffer[first:first + 10], b'Project.x\n')
+        with self.assertRaises(ValueError):
+            key_list.read_header(b'')
+        with self.assertRaises(ValueError):
+            key_list.read_header(b'[]\n')
+
+    def test_find(self):
+        _, first = key_list.read_header(self.buffer)
+        for prefix in ['', 'Task.', 'Task.3fa', 'Task.3fa85', 'Task.é',
+                       'Task.ff', 'Task.fz', 'Task.g', 'A', 'Z']:
+            self.assertEqual(
+                key_list.find(self.buffer, prefix, first),
+                [key for key in self.keys if key.startswith(prefix)],
+                prefix
+            )
+        self.assertEqual(key_list.find(self.buffer, 'Task.', first, 2),
+                         ['Task.0a', 'Task.3fa8'])
+
+    def test_find_without_keys(self):
+        buffer = b'{}\n'
+        _, first = key_list.read_header(buffer)
+        self.assertEqual(key_list.find(buffer, 'Task.', first), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
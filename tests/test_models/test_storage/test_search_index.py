@@ -0,0 +1,53 @@
+import unittest
+
+from models.storage.search_index import SearchIndex, tokenize
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add("Task.1", "Wash plates", "Home")
+        self.index.add("Task.2", "Call the dentist")
+        self.index.add("Task.3", "Wash the car", "Car wash")
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Call the Dentist, 5pm!"),
+                         ["call", "the", "dentist", "5pm"])
+        self.assertEqual(tokenize(None), [])
+
+    def test_search_matches_every_word(self):
+        self.assertEqual(self.index.search("wash plates"), ["Task.1"])
+        self.assertEqual(self.index.search("the"), ["Task.2", "Task.3"])
+        self.assertEqual(self.index.search("wash dentist"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_search_matches_prefixes(self):
+        self.assertEqual(self.index.search("dent"), ["Task.2"])
+        self.assertEqual(self.index.search("HOM"), ["Task.1"])
+
+    def test_ranking(self):
+        # A word in the title and the project ranks above a word in the
+        # title only, and whole words rank above prefixes.
+        self.assertEqual(self.index.search("wash"), ["Task.3", "Task.1"])
+        self.index.add("Task.4", "Washing machine")
+        self.assertEqual(self.index.search("wash", limit=3),
+                         ["Task.3", "Task.1", "Task.4"])
+        self.assertEqual(self.index.search("wash", limit=1), ["Task.3"])
+
+    def test_add_replaces_and_remove(self):
+        self.index.add("Task.1", "Dry plates")
+        self.assertEqual(self.index.search("wash"), ["Task.3"])
+        self.index.remove("Task.3")
+        self.index.remove("missing")
+        self.assertEqual(self.index.search("wash"), [])
+        self.assertNotIn("car", self.index.words)
+        self.assertEqual(len(self.index), 2)
+
+    def test_round_trip(self):
+        index = SearchIndex.from_dict(self.index.to_dict())
+        self.assertEqual(index.search("wash"), self.index.search("wash"))
+        self.assertIsNone(SearchIndex.from_dict({'version': 0}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+import tempfile  # For creating temporary files
+import os
+from datetime import datetime
+
+from models.task import Task
+from models.storage.sqlite_storage import SQLiteStorage
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        # Create Task objects
+        self.task = Task("Wash Plates", duedatetime=datetime(2030, 1, 1, 9, 0))
+        self.other = Task("Sweep Floor", duedatetime=datetime(2030, 6, 1, 9, 0))
+        # create a temporary database file for testing
+        self.test_file = tempfile.NamedTemporaryFile(delete=False)
+        self.test_file.close()
+
+        self.storage = SQLiteStorage()
+        self.storage._SQLiteStorage__file_path = self.test_file.name
+
+    def tearDown(self):
+        del self.task
+        del self.other
+        self.storage.close()
+        os.remove(self.test_file.name)
+
+    def test_new_and_all(self):
+        self.storage.new(self.task)
+        all_objects = self.storage.all()
+        key = f"Task.{self.task.id}"
+        self.assertIn(key, all_objects)
+        self.assertIsInstance(all_objects[key], Task)
+
+    def test_reload_restores_objects(self):
+        self.storage.new(self.task)
+        self.storage.save()
+
+        # Simulate restart
+        self.storage.reload()
+
+        key = f"Task.{self.task.id}"
+        all_objects = self.storage.all()
+        self.assertIn(key, all_objects)
+        self.assertIsNot(all_objects[key], self.task)
+        self.assertEqual(all_objects[key].title, "Wash Plates")
+
+    def test_get_reads_single_row(self):
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.save()
+        self.storage.reload()
+
+        task = self.storage.get(Task, self.task.id)
+        self.assertEqual(task.title, "Wash Plates")
+        self.assertIsNone(self.storage.get(Task, "missing"))
+        self.assertEqual(len(self.storage._SQLiteStorage__objects), 1)
+
+    def test_get_many(self):
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.save()
+        self.storage.reload()
+
+        found = self.storage.get_many(
+            Task, [self.other.id, "missing", self.task.id]
+        )
+        self.assertEqual(list(found), [self.other.id, self.task.id])
+        self.storage.delete(found[self.other.id])
+        self.assertEqual(
+            list(self.storage.get_many(Task, [self.other.id, self.task.id])),
+            [self.task.id]
+        )
+
+    def test_update_and_query(self):
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.save()
+
+        self.task.status = 'completed'
+        self.storage.update(self.task)
+        self.storage.save()
+        self.storage.reload()
+
+        completed = self.storage.query(status='completed')
+        self.assertEqual(list(completed), [f"Task.{self.task.id}"])
+        due = self.storage.query(due_after=datetime(2030, 3, 1))
+        self.assertEqual(list(due), [f"Task.{self.other.id}"])
+
+    def test_query_order_by(self):
+        undated = Task("Fold Clothes", priority='urgent')
+        for task in (undated, self.other, self.task):
+            self.storage.new(task)
+        self.storage.save()
+        self.storage.reload()
+
+        ordered = self.storage.query(order_by='due')
+        self.assertEqual(list(ordered), [
+            f"Task.{self.task.id}", f"Task.{self.other.id}",
+            f"Task.{undated.id}"
+        ])
+        top = self.storage.query(order_by='priority', limit=1)
+        self.assertEqual(list(top), [f"Task.{undated.id}"])
+
+        self.other.duedatetime = datetime(2029, 1, 1, 9, 0)
+        self.storage.update(self.other)
+        top = self.storage.query(order_by='due', limit=1)
+        self.assertEqual(list(top), [f"Task.{self.other.id}"])
+
+    def test_invalid_due_dates(self):
+        invalid = Task("Call Bank", duedatetime="tomorrow")
+        undated = Task("Fold Clothes")
+        for task in (undated, invalid, self.other, self.task):
+            self.storage.new(task)
+        self.storage.save()
+        self.storage.reload()
+
+        due = self.storage.query(due_after=datetime(2030, 3, 1))
+        self.assertEqual(list(due), [f"Task.{self.other.id}"])
+        due = self.storage.query(due_before=datetime(2031, 1, 1))
+        self.assertEqual(list(due), [
+            f"Task.{self.task.id}", f"Task.{self.other.id}"
+        ])
+        ordered = self.storage.query(order_by='due', limit=3)
+        self.assertEqual(list(ordered), [
+            f"Task.{self.task.id}", f"Task.{self.other.id}",
+            f"Task.{invalid.id}"
+        ])
+
+    def test_find_ids(self):
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.save()
+        self.storage.reload()
+
+        ids = sorted([self.task.id, self.other.id])
+        self.assertEqual(self.storage.find_ids(Task, ""), ids)
+        self.assertEqual(self.storage.find_ids(Task, ids[1][:8]), [ids[1]])
+        self.assertEqual(self.storage.find_ids(Task, "x"), [])
+
+        task = Task("Mop Floor")
+        self.storage.new(task)
+        self.storage.delete(self.task)
+        self.assertEqual(self.storage.find_ids(Task, "", limit=5),
+                         sorted([self.other.id, task.id]))
+
+    def test_search(self):
+        self.storage.new(self.task)
+        self.storage.new(self.other)
+        self.storage.save()
+        self.storage.reload()
+
+        self.assertEqual(list(self.storage.search("plat")),
+                         [f"Task.{self.task.id}"])
+        self.assertEqual(self.storage.search("plates floor"), {})
+        # Pending changes are searched before they are saved.
+        self.task.title = "Dry Plates"
+        self.storage.update(self.task)
+        self.storage.delete(self.other)
+        self.assertEqual(list(self.storage.search("dry")),
+                         [f"Task.{self.task.id}"])
+        self.assertEqual(self.storage.search("floor"), {})
+        self.storage.save()
+        self.assertEqual(self.storage.search("wash"), {})
+        self.assertEqual(list(self.storage.search("plates")),
+                         [f"Task.{self.task.id}"])
+
+    def test_delete_removes_object(self):
+        self.storage.new(self.task)
+        self.storage.save()
+        self.storage.delete(self.task)
+        self.storage.save()
+        self.storage.reload()
+
+        self.assertIsNone(self.storage.get(Task, self.task.id))
+        self.assertNotIn(f"Task.{self.task.id}", self.storage.all())
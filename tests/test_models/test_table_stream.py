@@ -0,0 +1,84 @@
+"""
+This module contains unit tests for the streaming table renderer
+"""
+import unittest
+from tabulate import tabulate
+from models.task import Task, HEADERS
+from models.table_stream import stream_table
+
+
+class TestStreamTable(unittest.TestCase):
+    """
+    Test stream_table.
+    """
+    def setUp(self):
+        """
+        Sets up rows of different widths.
+        """
+        self.headers = ['ID', 'Title', 'Priority']
+        self.rows = [
+            ['a1', 'Wash plates', 'urgent'],
+            ['b2', 'Call the dentist', 'None'],
+            ['c3', 'Finish the project report', 'not urgent'],
+        ]
+
+    def test_matches_tabulate(self):
+        """
+        Test that measured widths give the same layout as tabulate.
+        """
+        lines = stream_table(self.rows, self.headers)
+        self.assertEqual(
+            '\n'.join(lines),
+            tabulate(self.rows, headers=self.headers, tablefmt="github")
+        )
+
+    def test_sample_size(self):
+        """
+        Test that only the sampled rows are measured and longer cells
+        are wrapped onto extra lines.
+        """
+        lines = list(stream_table(self.rows, self.headers, sample_size=2))
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[4], '| c3   | Finish the       | not urgent |')
+        self.assertEqual(lines[5], '|      | project report   |            |')
+        self.assertEqual(len({len(line) for line in lines}), 1)
+
+    def test_none_is_empty(self):
+        """
+        Test that None cells are left empty, as tabulate does.
+        """
+        rows = [['a1', None, 'urgent']]
+        self.assertEqual(
+            '\n'.join(stream_table(rows, self.headers)),
+            tabulate(rows, headers=self.headers, tablefmt="github")
+        )
+
+    def test_fixed_widths(self):
+        """
+        Test that fixed widths are used as given and rows are read lazily.
+        """
+        def rows():
+            yield ['1', 'Wash plates', 'urgent']
+            raise AssertionError("read too far")
+
+        lines = stream_table(rows(), self.headers, widths=[2, 5, 8])
+        self.assertEqual(next(lines), '| ID | Title | Priority |')
+        self.assertEqual(next(lines), '|----|-------|----------|')
+        self.assertEqual(next(lines), '| 1  | Wash… | urgent   |')
+
+    def test_task_rows(self):
+        """
+        Test the rows built for tasks by Task.rows.
+        """
+        task = Task(title="Read", duedatetime="2020-01-01T10:00:00",
+                    priority="urgent")
+        rows = list(Task.rows([(f"Task.{task.id}", task)]))
+        self.assertEqual(rows, [[
+            task.id, 'Read', '❌ Pending', '2020-01-01', '10:00:00',
+            '⏰ Overdue', 'urgent'
+        ]])
+        self.assertEqual(len(rows[0]), len(HEADERS))
+
+
+if __name__ == '__main__':
+    unittest.main()
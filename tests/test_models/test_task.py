@@ -1,8 +1,12 @@
 """
 This module contains unit tests for the Task Class
 """
+import os
+import tempfile
 import unittest
+import models
 from models.task import Task
+from models.storage.file_storage import FileStorage
 from datetime import datetime, timedelta
 
 
@@ -61,7 +65,8 @@ class TestTask(unittest.TestCase):
         Tests the __str__ method of Task to ensure it returns
         the correct string representation.
         """
-        expected_str = f"[Task] ({self.task.id}) {self.task.__dict__}"
+        attributes = {name: getattr(self.task, name) for name in Task.fields}
+        expected_str = f"[Task] ({self.task.id}) {attributes}"
         self.assertEqual(str(self.task), expected_str)
 
     def test_mark_completed(self):
@@ -115,3 +120,137 @@ class TestTask(unittest.TestCase):
     def test_from_dict(self):
         obj = self.task.from_dict(self.task.to_dict())
         self.assertIsInstance(obj, Task)
+
+    def test_round_trip(self):
+        """
+        Tests that to_dict/from_dict round trips every attribute,
+        including keys unknown to the model.
+        """
+        self.task.mark_completed()
+        data = self.task.to_dict()
+        data['notes'] = "kept as is"
+        obj = Task.from_dict(data)
+        self.assertEqual(obj.to_dict(), data)
+        self.assertEqual(obj.id, self.task.id)
+        self.assertEqual(obj.created_at, self.task.created_at)
+        self.assertEqual(obj.completed_at, self.task.completed_at)
+
+    def test_compact_storage(self):
+        """
+        Tests that Task has no per-instance __dict__ and keeps its
+        status, priority, id and timestamps in compact form.
+        """
+        self.assertFalse(hasattr(self.task, '__dict__'))
+        self.task.priority = "urgent"
+        self.assertIsInstance(self.task._status, int)
+        self.assertIsInstance(self.task._priority, int)
+        self.assertIsInstance(self.task._uuid, bytes)
+        self.assertIsInstance(self.task._created_at, int)
+        self.task.status = "blocked"
+        self.assertEqual(self.task.status, "blocked")
+
+    def test_due_date_is_parsed_once(self):
+        """
+        Tests that due dates set as ISO strings are kept as epoch
+        microseconds, that invalid ones are kept as given, and that
+        listing formats them without parsing them again.
+        """
+        task = Task.from_dict(
+            dict(self.task.to_dict(), duedatetime='2030-01-01T09:00:00')
+        )
+        self.assertIsInstance(task._due, int)
+        self.assertEqual(task.duedatetime, datetime(2030, 1, 1, 9, 0))
+        self.assertEqual(task.due_epoch, task._due)
+        self.assertEqual(task.to_dict()['duedatetime'], '2030-01-01T09:00:00')
+        self.assertTrue(task.matches(due_before='2030-01-02T00:00:00'))
+        self.assertFalse(task.matches(due_after=datetime(2030, 1, 2)))
+
+        invalid = Task(title="Someday", duedatetime="tomorrow")
+        self.assertEqual(invalid.duedatetime, "tomorrow")
+        self.assertIsNone(invalid.due_epoch)
+        self.assertFalse(invalid.matches(due_before='2030-01-02T00:00:00'))
+
+        now = datetime(2029, 12, 31, 9, 0)
+        rows = list(Task.rows(
+            [("Task.a", task), ("Task.b", invalid)], now=now
+        ))
+        self.assertEqual(
+            rows[0][3:6], ['2030-01-01', '09:00:00', '1 days more']
+        )
+        self.assertEqual(rows[1][3:6], ['tomorrow', '', 'Invalid datetime'])
+        self.assertEqual(
+            Task.format_time_left(task.duedatetime, now=now), '1 days more'
+        )
+
+    def test_find(self):
+        """
+        Tests that find selects tasks by ID and by filter.
+        """
+        test_file = tempfile.NamedTemporaryFile(delete=False)
+        test_file.close()
+        store = models.store
+        models.store = FileStorage(file_path=test_file.name)
+        try:
+            old = Task("Old")
+            old.status = 'completed'
+            old.updated_at = datetime.now() - timedelta(days=40)
+            new = Task("New")
+            new.status = 'completed'
+            pending = Task("Pending")
+            for task in (old, new, pending):
+                models.store.new(task)
+
+            tasks, missing = Task.find([pending.id, old.id, "missing"])
+            self.assertEqual(tasks, [pending, old])
+            self.assertEqual(missing, ["missing"])
+            tasks, _ = Task.find([pending.id, old.id], status='completed')
+            self.assertEqual(tasks, [old])
+            tasks, _ = Task.find(status='completed',
+                                 older_than=timedelta(days=30))
+            self.assertEqual(tasks, [old])
+        finally:
+            models.store = store
+            os.remove(test_file.name)
+
+    def test_resolve(self):
+        """
+        Tests that unique ID prefixes are expanded and ambiguous ones
+        are reported.
+        """
+        test_file = tempfile.NamedTemporaryFile(delete=False)
+        test_file.close()
+        store = models.store
+        objects = FileStorage._FileStorage__objects
+        FileStorage._FileStorage__objects = {}
+        models.store = FileStorage(file_path=test_file.name)
+        try:
+            ids = [
+                "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                "3fa8e000-0000-4000-8000-000000000000",
+                "9b2c0000-0000-4000-8000-000000000000",
+                "42",
+            ]
+            for id in ids:
+                task = Task("Chore")
+                models.store.delete(task)
+                task.id = id
+                models.store.new(task)
+
+            self.assertEqual(Task.resolve("9b2c"), ids[2])
+            self.assertEqual(Task.resolve("3fa85"), ids[0])
+            self.assertEqual(Task.resolve(ids[1]), ids[1])
+            self.assertEqual(Task.resolve("42"), ids[3])
+            self.assertIsNone(Task.resolve("abcd"))
+            for prefix in ("", "9", "4"):
+                with self.assertRaisesRegex(ValueError, "too short"):
+                    Task.resolve(prefix)
+            self.assertIsNone(
+                Task.resolve("3fa85f64-5717-4562-b3fc-000000000000")
+            )
+            with self.assertRaisesRegex(ValueError, "'3fa8' is ambiguous"):
+                Task.resolve("3fa8")
+        finally:
+            models.store = store
+            FileStorage._FileStorage__objects = objects
+            os.remove(test_file.name)
+
@@ -0,0 +1,48 @@
+"""
+This module contains unit tests for the TaskTable Class
+"""
+import unittest
+from datetime import datetime, timedelta
+from models.task import Task
+from models.task_table import TaskTable
+
+
+class TestTaskTable(unittest.TestCase):
+    """
+    Test the TaskTable Class.
+    """
+    def setUp(self):
+        """
+        Sets up a table of tasks with different statuses and due dates.
+        """
+        self.now = datetime(2024, 1, 1, 12, 0)
+        self.late = Task(title="Late", duedatetime="2023-12-31T12:00:00")
+        self.soon = Task(title="Soon", priority="urgent",
+                         duedatetime=self.now + timedelta(minutes=5))
+        self.later = Task(title="Later", duedatetime="2024-01-04T13:00:00")
+        self.undated = Task(title="Undated")
+        self.done = Task(title="Done", duedatetime="2023-12-31T12:00:00")
+        self.done.mark_completed()
+        self.table = TaskTable([
+            self.late, self.soon, self.later, self.undated, self.done
+        ])
+
+    def test_time_left(self):
+        """
+        Test that time_left matches the labels shown by 'list'.
+        """
+        self.assertEqual(
+            self.table.time_left(now=self.now),
+            ['⏰ Overdue', '5 min more', '3 days more', None, '✅ Done']
+        )
+
+    def test_invalid_due_date(self):
+        """
+        Test that a due date that cannot be parsed is reported.
+        """
+        task = Task(title="Broken", duedatetime="tomorrow")
+        self.assertEqual(TaskTable([task]).time_left(), ['Invalid datetime'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+This module contains unit tests for the trace module
+"""
+import os
+import unittest
+from unittest import mock
+from models import trace
+
+
+class TestTrace(unittest.TestCase):
+    """
+    Test phase timing and counters.
+    """
+    def tearDown(self):
+        """
+        Turns tracing off again.
+        """
+        trace.disable()
+        trace.reset()
+
+    def test_disabled_records_nothing(self):
+        """
+        Test that traced functions and phases record nothing by default.
+        """
+        double = trace.traced('double')(lambda x: 2 * x)
+        items = [1, 2]
+        self.assertEqual(double(4), 8)
+        self.assertIs(trace.iterate('loop', items), items)
+        with trace.phase('outer'):
+            pass
+        self.assertEqual(trace.phases, {})
+
+    def test_nested_phases(self):
+        """
+        Test that the self time of a phase leaves out nested phases.
+        """
+        trace.enable()
+        double = trace.traced('double')(lambda x: 2 * x)
+        with trace.phase('outer'):
+            self.assertEqual(double(4), 8)
+            self.assertEqual(list(trace.iterate('loop', [1, 2])), [1, 2])
+            trace.count('objects', 2)
+        calls, total, own = trace.phases['outer']
+        self.assertEqual(calls, 1)
+        self.assertEqual(trace.phases['double'][0], 1)
+        self.assertEqual(trace.phases['loop'][0], 3)
+        nested = trace.phases['double'][1] + trace.phases['loop'][1]
+        self.assertAlmostEqual(own, total - nested)
+        self.assertEqual(trace.counts, {'objects': 2})
+        self.assertIn('outer', trace.summary())
+        self.assertEqual(trace.to_dict()['phases']['double']['calls'], 1)
+
+    def test_from_environment(self):
+        """
+        Test how TODO_TRACE is read.
+        """
+        for value, expected in (('', (False, None)), ('0', (False, None)),
+                                ('1', (True, None)),
+                                ('trace.json', (True, 'trace.json'))):
+            with mock.patch.dict(os.environ, {'TODO_TRACE': value}):
+                self.assertEqual(trace.from_environment(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+This module contains unit tests for bulk import and export
+"""
+import io
+import os
+import unittest
+from datetime import datetime
+import models
+from models import transfer
+from models.storage.file_storage import FileStorage
+from tests.store_case import TemporaryStore
+
+
+class TestTransfer(TemporaryStore, unittest.TestCase):
+    """
+    Test import_tasks and export_tasks.
+    """
+    def test_import_csv(self):
+        """
+        Test that a CSV file is imported with a single journal write.
+        """
+        f = io.StringIO(
+            "title,priority,duedatetime\n"
+            "Wash plates,urgent,2030-01-01 09:00\n"
+            "Call the dentist,,\n"
+        )
+        self.assertEqual(transfer.import_tasks(f, 'csv'), 2)
+        with open(self.journal) as journal:
+            self.assertEqual(len(journal.readlines()), 2)
+
+        tasks = sorted(models.store.all().values(), key=lambda t: t.title)
+        self.assertEqual(tasks[0].title, "Call the dentist")
+        self.assertIsNone(tasks[0].priority)
+        self.assertEqual(tasks[1].priority, 'urgent')
+        self.assertEqual(tasks[1].duedatetime, datetime(2030, 1, 1, 9, 0))
+
+    def test_import_json_array(self):
+        """
+        Test that a JSON file holding an array of tasks is imported, and
+        that invalid items are reported by position.
+        """
+        f = io.StringIO(
+            ' [{"title": "Wash plates", "priority": "urgent"},\n'
+            '  {"title": "Call the dentist"}]'
+        )
+        self.assertEqual(transfer.import_tasks(f, 'json'), 2)
+        titles = sorted(task.title for task in models.store.all().values())
+        self.assertEqual(titles, ["Call the dentist", "Wash plates"])
+
+        f = io.StringIO('[{"title": "Ok"}, {"status": "pending"}]')
+        with self.assertRaisesRegex(ValueError, "item 2: missing title"):
+            transfer.import_tasks(f, 'json')
+        self.assertEqual(transfer.import_tasks(io.StringIO('[]'), 'json'), 0)
+
+    def test_invalid_records_import_nothing(self):
+        """
+        Test that one invalid record stops the whole import.
+        """
+        f = io.StringIO('{"title": "Ok"}\n{"title": "Bad", "status": "x"}\n')
+        with self.assertRaisesRegex(ValueError, "line 2: unknown status"):
+            transfer.import_tasks(f, 'ndjson')
+        self.assertEqual(models.store.all(), {})
+        self.assertFalse(os.path.exists(self.journal))
+
+        f = io.StringIO(
+            '{"title": "Bad", "duedatetime": "2030-01-01T09:00:00+05:00"}\n'
+        )
+        with self.assertRaisesRegex(ValueError, "UTC offsets"):
+            transfer.import_tasks(f, 'ndjson')
+
+    def test_export_import_round_trip(self):
+        """
+        Test that exported tasks are imported back unchanged.
+        """
+        transfer.import_tasks(io.StringIO(
+            '{"title": "Wash plates", "project_name": "Home"}\n'
+            '{"title": "Call the dentist", "status": "completed"}\n'
+        ), 'ndjson')
+        before = {key: obj.to_dict()
+                  for key, obj in models.store.all().items()}
+
+        for fmt in transfer.FORMATS:
+            f = io.StringIO()
+            self.assertEqual(transfer.export_tasks(f, fmt), 2)
+            FileStorage._FileStorage__objects = {}
+            models.store = FileStorage(file_path=self.store_path)
+            f.seek(0)
+            transfer.import_tasks(f, fmt)
+            after = {key: obj.to_dict()
+                     for key, obj in models.store.all().items()}
+            self.assertEqual(after, before)
+
+    def test_batch_defers_save(self):
+        """
+        Test that save() inside store.batch() writes once, at the end.
+        """
+        path = self.journal
+        with models.store.batch():
+            for record in ({'title': 'One'}, {'title': 'Two'}):
+                task = transfer.build_task(record)
+                models.store.new(task)
+                models.store.save()
+                self.assertFalse(os.path.exists(path))
+        with open(path) as journal:
+            self.assertEqual(len(journal.readlines()), 2)
+
+    def test_detect_format(self):
+        """
+        Test that the format is taken from the file extension.
+        """
+        self.assertEqual(transfer.detect_format('tasks.CSV'), 'csv')
+        self.assertEqual(transfer.detect_format('tasks.jsonl'), 'ndjson')
+        self.assertEqual(transfer.detect_format('-'), 'ndjson')
+        with self.assertRaises(ValueError):
+            transfer.detect_format('tasks.txt')
+
+
+if __name__ == '__main__':
+    unittest.main()
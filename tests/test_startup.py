@@ -0,0 +1,91 @@
+"""
+This module contains regression tests for the startup time of todo.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous bounds on the cumulative import time, in microseconds, so that
+# a slow machine does not fail them but an eager import of the storage or
+# of tabulate does.
+MODELS_BOUND = 150000
+COMMAND_BOUND = 400000
+
+
+def import_times(arguments, cwd=ROOT):
+    """
+    Runs Python with -X importtime.
+    Args:
+        arguments (list): The arguments after -X importtime.
+        cwd (str): The directory to run in.
+    Returns:
+        tuple: The cumulative import time of each module, in microseconds,
+        and the total of the modules imported after the interpreter
+        started, not counting site.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('TODO_STORAGE', None)
+    env.pop('TODO_TRACE', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + arguments,
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True
+    )
+    times = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative)
+        # Modules imported directly, rather than by another module, are
+        # not indented.
+        if not name[1:].startswith(' ') and name.strip() != 'site':
+            total += int(cumulative)
+    return times, total
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test that startup only imports what the command needs.
+    """
+    def test_models_import_is_lazy(self):
+        """
+        Test that importing Task loads neither the store nor tabulate.
+        """
+        times, total = import_times(
+            ['-c', 'import models; from models.task import Task']
+        )
+        self.assertIn('models.task', times)
+        self.assertNotIn('tabulate', times)
+        self.assertNotIn('models.storage.file_storage', times)
+        self.assertNotIn('models.storage.sqlite_storage', times)
+        self.assertLess(total, MODELS_BOUND)
+
+    @unittest.skipIf(sys.version_info < (3, 12),
+                     "todo.py needs Python 3.12 or later")
+    def test_command_without_table_skips_tabulate(self):
+        """
+        Test that a command that prints no table does not import tabulate
+        nor the import/export formats, within a bound on the import time.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            times, total = import_times(
+                [os.path.join(ROOT, 'todo.py'), 'complete', 'missing'],
+                cwd=directory
+            )
+        self.assertIn('models.storage.file_storage', times)
+        self.assertNotIn('tabulate', times)
+        self.assertNotIn('models.transfer', times)
+        self.assertNotIn('daemon', times)
+        self.assertLess(total, COMMAND_BOUND)
+
+
+if __name__ == '__main__':
+    unittest.main()
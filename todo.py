@@ -1,10 +1,36 @@
 #!/usr/bin/env python3
+from time import perf_counter
+STARTED = perf_counter()
+
+import os
+import sys
+
+# Hand the command to a running daemon before loading anything else. The
+# daemon module is only imported when its socket (daemon.SOCKET_PATH)
+# exists.
+if (__name__ == '__main__' and sys.argv[1:2] != ['serve']
+        and os.path.exists(os.environ.get('TODO_SOCKET', '.todo.sock'))):
+    import daemon
+
+    code = daemon.forward(sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
+
 import argparse
 from argparse import RawTextHelpFormatter
-from models.task import Task
-# import sys
+from functools import cache
+from models.task import Task, FIXED_WIDTHS, HEADERS, SORT_ORDERS, STATUSES
+from models.table_stream import stream_table
 import models
-from datetime import datetime
+from models import trace
+from datetime import datetime, timedelta
+
+IMPORT_SECONDS = perf_counter() - STARTED
+
+PAGE_SIZE = 20
+DURATION_UNITS = {
+    's': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'
+}
 
 
 # Add task command
@@ -49,146 +75,790 @@ def add_task(args):
 
 # List task command
 def list_tasks(args):
-    if args.completed:
-        print("\n📋 Task List:")
-        data = Task.print_completed_task()
-        print(data)
+    if args.top is not None:
+        if args.limit is not None:
+            args.parser.error("--top cannot be used with --limit")
+        args.limit = args.top
+    if args.page is not None:
+        if args.page < 1:
+            args.parser.error("--page must be 1 or more")
+        limit = args.limit if args.limit is not None else PAGE_SIZE
+        offset = (args.page - 1) * limit
     else:
-        print("\n📋 Task List:")
-        data = Task.print_tasks()
-        print(data)
+        limit = args.limit
+        offset = args.offset
+    if (limit is not None and limit < 0) or offset < 0:
+        args.parser.error("--limit and --offset cannot be negative")
+
+    print("\n📋 Task List:")
+    lines = Task.stream_tasks(
+        completed=args.completed,
+        archived=args.archived,
+        offset=offset,
+        limit=limit,
+        order_by=args.sort,
+        widths=FIXED_WIDTHS if args.fixed_width else None
+    )
+    for line in lines:
+        print(line)
+
+def search_tasks(args):
+    if args.limit is not None and args.limit < 0:
+        args.parser.error("--limit cannot be negative")
+    tasks = models.store.search(' '.join(args.terms), limit=args.limit)
+    if not tasks:
+        print(f"🔍 No tasks match '{' '.join(args.terms)}'")
+        return
+    print(f"\n🔍 {tasks_count(len(tasks))} found:")
+    for line in stream_table(Task.rows(tasks.items()), HEADERS):
+        print(line)
+
+def tasks_count(count):
+    """
+    Returns '1 task' or '<count> tasks'.
+    """
+    return f"{count} task{'' if count == 1 else 's'}"
+
+def duration(value):
+    """
+    Parses a duration such as '30d', '12h' or '2w' for argparse.
+    """
+    number, unit = value[:-1], value[-1:]
+    if unit not in DURATION_UNITS or not number.isdigit():
+        raise argparse.ArgumentTypeError(
+            f"invalid duration '{value}', use e.g. 90s, 45m, 12h, 30d or 2w"
+        )
+    return timedelta(**{DURATION_UNITS[unit]: int(number)})
+
+def resolve_ids(ids):
+    """
+    Expands unique prefixes of task IDs to the full IDs. IDs that match
+    no task are kept as given, to be reported as invalid. Exits if any
+    prefix matches several tasks.
+    """
+    resolved = []
+    ambiguous = False
+    for id in ids:
+        try:
+            resolved.append(Task.resolve(id) or id)
+        except ValueError as error:
+            print(f"❌ {error}", file=sys.stderr)
+            ambiguous = True
+    if ambiguous:
+        sys.exit(1)
+    return resolved
+
+def single_id(args):
+    """
+    Tells whether a complete, delete or edit command names exactly one
+    task by ID and has no filters.
+    """
+    return (
+        len(args.ids) == 1 and args.ids != ['-']
+        and args.status is None and args.priority is None
+        and args.project is None and args.older_than is None
+    )
+
+def find_tasks(args):
+    """
+    Returns the tasks selected by the IDs and filters of a complete,
+    delete or edit command, and the IDs that do not exist. IDs are read
+    from standard input when the only ID given is '-'.
+    """
+    ids = args.ids
+    if ids == ['-']:
+        ids = sys.stdin.read().split()
+    ids = resolve_ids(ids)
+    fields = {}
+    if args.status is not None:
+        fields['status'] = args.status
+    if args.priority is not None:
+        fields['priority'] = args.priority.replace('-', ' ')
+    if args.project is not None:
+        fields['project_name'] = args.project
+    if not ids and not fields and args.older_than is None:
+        args.parser.error(
+            "give at least one ID or filter"
+        )
+    return Task.find(ids or None, older_than=args.older_than, **fields)
+
+def report_missing(ids):
+    for id in ids:
+        print(f"❌ Invalid Task ID: {id}")
 
 #Complete 
 def complete_task(args):
-    message = Task.mark_complete(args.id)
-    print(message)
+    if single_id(args):
+        print(Task.mark_complete(resolve_ids(args.ids)[0]))
+        return
+    tasks, missing = find_tasks(args)
+    count = 0
+    with models.store.batch():
+        for task in tasks:
+            if task.status != 'completed':
+                task.mark_completed()
+                task.save()
+                count += 1
+    print(f"🎉 {tasks_count(count)} marked as completed!")
+    report_missing(missing)
 
 def delete_task(args):
-    task_id = str(args.id)
-    result = Task.remove_task(task_id)
-    print(result)
+    if single_id(args):
+        print(Task.remove_task(resolve_ids(args.ids)[0]))
+        return
+    tasks, missing = find_tasks(args)
+    with models.store.batch():
+        for task in tasks:
+            models.store.delete(task)
+    print(f"{tasks_count(len(tasks))} deleted successfully")
+    report_missing(missing)
 
 def edit_task(args):
-    print(f'Editted task {args.id}')
-    all_tasks = models.store.all()
-    for key, value in all_tasks.items():
-        get_id = key.split('.')[1]
-        if get_id == args.id:
+    tasks, missing = find_tasks(args)
+    with models.store.batch():
+        for task in tasks:
             if args.urgent:
-                value.priority = 'urgent'
+                task.priority = 'urgent'
             elif args.not_urgent:
-                value.priority = 'not urgent'
-            value.title = args.title
-    models.store.save()
+                task.priority = 'not urgent'
+            if args.title is not None:
+                task.title = args.title
+            task.save()
+    if not single_id(args):
+        print(f"Edited {tasks_count(len(tasks))}")
+    elif tasks:
+        print(f'Editted task {tasks[0].id}')
+    report_missing(missing)
 
-parser = argparse.ArgumentParser(
-    description='Advanced TODO CLI'
-)
-subparsers = parser.add_subparsers(
-    title='Commands',
-    dest="command"
-)
+def import_file(args):
+    from models import transfer
 
-# Add command
-add_parser = subparsers.add_parser(
-    "add",
-    usage="./todo.py add \"<task title>\"",
-    help="Add a new task",
-    description=(
-        "Add a new task to your TODO list.\n\n"
-        "This command lets you create a new task by specifying its title.\n"
-        "If the title is more than one word, enclose it in quotes."
-    ),
-    epilog=(
-        "Examples:\n"
-        "  - If just one word, you can do:\n"
-        "    ./todo.py add groceries\n\n"
-        "  - Else:\n"
-        "    ./todo.py add \"Buy groceries\"\n"
-        "    ./todo.py add \"Call the dentist\"\n"
-        "    ./todo.py add \"Finish ALX project by 5pm\"\n"
-    ),
-    formatter_class=RawTextHelpFormatter
-)
-add_parser.add_argument('title', help='Title of the task')
-add_parser.add_argument('--duedate', help="Add date for task to be done")
-add_parser.add_argument('--duetime', help="Add time of the day for task to be done")
-add_parser.add_argument('--urgent', action='store_true', help="Add priority to task")
-add_parser.set_defaults(func=add_task)
-
-# List command 
-list_parser = subparsers.add_parser(
-    'list',
-    help='List tasks in your TODO list',
-    usage="./todo.py list [--completed]",
-    description=(
-        "List all tasks in your TODO list.\n\n"
-        "By default, it shows all tasks (both completed and pending).\n"
-        "Use the optional --completed flag to filter"
-        " and show only completed tasks."
-    ),
-    epilog=(
-        "Examples:\n"
-        "  - List all tasks:\n"
-        "    ./todo.py list\n\n"
-        "  - List only completed tasks:\n"
-        "    ./todo.py list --completed\n"
-    ),
-    formatter_class=argparse.RawTextHelpFormatter
-)
-list_parser.add_argument(
-    '--completed',
-    action='store_true',
-    help='Show only completed tasks'
-)
-list_parser.set_defaults(func=list_tasks)
-
-# Mark a task as completed.
-mark_complete_parser = subparsers.add_parser(
-    "complete",
-    help="Change status of a task",
-    description=(
-        "Mark a Task as completed"
-    ),
-    epilog=(
-        "\nExample:\n"
-        "\t./todo.py complete <ID>"
-    ),
-    formatter_class=argparse.RawTextHelpFormatter
-)
-mark_complete_parser.add_argument("id", type=str, help="ID of the task to remove")
-mark_complete_parser.set_defaults(func=complete_task)
-
-# Delete Task command
-remove_parser = subparsers.add_parser("delete", help="Remove a task")
-remove_parser.add_argument("id", help="ID of the task to remove")
-remove_parser.set_defaults(func=delete_task)
-
-# Edit Task
-edit_parser = subparsers.add_parser(
-    'edit',
-    help='Edit a task by providing Task\'s ID'
-)
-edit_parser.add_argument('id', help='ID of the task you intend to edit')
-edit_parser.add_argument(
-    '--urgent',
-    action='store_true',
-    help='Add priority to a task'
-)
-edit_parser.add_argument(
-    '--title',
-    help='Edit title of a task'
-)
-edit_parser.add_argument(
-    '--not-urgent',
-    action='store_true',
-    help='Edit priority of a task'
+    try:
+        fmt = args.format or transfer.detect_format(args.file)
+        if args.file == '-':
+            count = transfer.import_tasks(sys.stdin, fmt)
+        else:
+            with open(args.file, newline='') as f:
+                count = transfer.import_tasks(f, fmt)
+    except (OSError, ValueError) as error:
+        print(f"❌ {error}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Imported {tasks_count(count)}")
+
+def export_file(args):
+    from models import transfer
+
+    try:
+        fmt = args.format or transfer.detect_format(args.file)
+        if args.file == '-':
+            transfer.export_tasks(sys.stdout, fmt)
+            return
+        with open(args.file, 'w', newline='') as f:
+            count = transfer.export_tasks(f, fmt)
+    except (OSError, ValueError) as error:
+        print(f"❌ {error}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Exported {tasks_count(count)} to {args.file}")
+
+def archive_completed(args):
+    from models import archive
+
+    older_than = args.older_than
+    if older_than is None:
+        older_than = archive_policy()
+    if older_than is None:
+        older_than = archive.DEFAULT_AGE
+    count = archive.archive_tasks(older_than)
+    print(f"📦 Archived {tasks_count(count)} to {archive.PATH}")
+
+def archive_policy():
+    """
+    Returns how long after completion tasks are archived automatically,
+    from the TODO_ARCHIVE_AFTER environment variable, or None.
+    """
+    value = os.environ.get('TODO_ARCHIVE_AFTER')
+    if not value:
+        return None
+    try:
+        return duration(value)
+    except argparse.ArgumentTypeError as error:
+        print(f"❌ TODO_ARCHIVE_AFTER: {error}", file=sys.stderr)
+        return None
+
+def apply_archive_policy():
+    """
+    Archives old completed tasks if TODO_ARCHIVE_AFTER is set and the
+    policy has not run today.
+    """
+    older_than = archive_policy()
+    if older_than is None:
+        return
+    from models import archive
+
+    with trace.phase('archive policy'):
+        count = archive.apply_policy(older_than)
+    if count:
+        print(f"📦 Archived {tasks_count(count)} to {archive.PATH}")
+
+def run_captured(argv, stdin):
+    """
+    Runs a command for the daemon, capturing what it prints.
+    Args:
+        argv (list): The command line arguments.
+        stdin (str): The standard input of the command.
+    Returns:
+        tuple: The exit code, standard output and standard error.
+    """
+    import io
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+
+    # Pick up changes made by other processes since the last command.
+    models.store.refresh()
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    saved_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            if argv[:1] == ['serve']:
+                build_parser('serve').error("the daemon is already running")
+            main(argv)
+            code = 0
+    except SystemExit as error:
+        if error.code is None or isinstance(error.code, int):
+            code = error.code or 0
+        else:
+            stderr.write(f"{error.code}\n")
+            code = 1
+    except Exception:
+        stderr.write(traceback.format_exc())
+        code = 1
+    finally:
+        sys.stdin = saved_stdin
+    return code, stdout.getvalue(), stderr.getvalue()
+
+def serve(args):
+    import daemon
+
+    try:
+        models.store.all()  # Load everything once, up front.
+        daemon.serve(run_captured, ready=lambda: print(
+            f"Serving tasks on {daemon.SOCKET_PATH}, Ctrl-C to stop",
+            flush=True
+        ))
+    except RuntimeError as error:
+        print(f"❌ {error}", file=sys.stderr)
+        sys.exit(1)
+
+def build_add(subparsers):
+    """
+    Adds the 'add' command to the parser.
+    """
+    add_parser = subparsers.add_parser(
+        "add",
+        usage="./todo.py add \"<task title>\"",
+        help="Add a new task",
+        description=(
+            "Add a new task to your TODO list.\n\n"
+            "This command lets you create a new task by specifying its title.\n"
+            "If the title is more than one word, enclose it in quotes."
+        ),
+        epilog=(
+            "Examples:\n"
+            "  - If just one word, you can do:\n"
+            "    ./todo.py add groceries\n\n"
+            "  - Else:\n"
+            "    ./todo.py add \"Buy groceries\"\n"
+            "    ./todo.py add \"Call the dentist\"\n"
+            "    ./todo.py add \"Finish ALX project by 5pm\"\n"
+        ),
+        formatter_class=RawTextHelpFormatter
+    )
+    add_parser.add_argument('title', help='Title of the task')
+    add_parser.add_argument('--duedate', help="Add date for task to be done")
+    add_parser.add_argument('--duetime', help="Add time of the day for task to be done")
+    add_parser.add_argument('--urgent', action='store_true', help="Add priority to task")
+    add_parser.set_defaults(parser=add_parser, func=add_task)
+
+def build_list(subparsers):
+    """
+    Adds the 'list' command to the parser.
+    """
+    list_parser = subparsers.add_parser(
+        'list',
+        help='List tasks in your TODO list',
+        usage=(
+            "./todo.py list [--completed | --archived]"
+            " [--sort {due,priority,created}]"
+            " [--top N | --limit N] [--offset N | --page N] [--fixed-width]"
+        ),
+        description=(
+            "List all tasks in your TODO list.\n\n"
+            "By default, it shows all tasks (both completed and pending)\n"
+            "except archived ones. Use the optional --completed flag to\n"
+            "filter and show only completed tasks, or --archived to show\n"
+            "the tasks moved out of the list by 'archive'.\n"
+            "Rows are printed as they are read; use --limit with --offset"
+            " or --page to show part of the list."
+        ),
+        epilog=(
+            "Examples:\n"
+            "  - List all tasks:\n"
+            "    ./todo.py list\n\n"
+            "  - List only completed tasks:\n"
+            "    ./todo.py list --completed\n\n"
+            "  - List archived tasks:\n"
+            "    ./todo.py list --archived\n\n"
+            "  - Show the second page of 50 tasks:\n"
+            "    ./todo.py list --limit 50 --page 2\n\n"
+            "  - Show the next 20 tasks due:\n"
+            "    ./todo.py list --sort due --top 20\n"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    shown = list_parser.add_mutually_exclusive_group()
+    shown.add_argument(
+        '--completed',
+        action='store_true',
+        help='Show only completed tasks'
+    )
+    shown.add_argument(
+        '--archived',
+        action='store_true',
+        help='Show only archived tasks'
+    )
+    list_parser.add_argument(
+        '--limit',
+        type=int,
+        help='Show at most this many tasks'
+    )
+    list_parser.add_argument(
+        '--sort',
+        choices=SORT_ORDERS,
+        help=(
+            'Sort by due date (soonest first), priority (most urgent first)'
+            ' or creation time (oldest first)'
+        )
+    )
+    list_parser.add_argument(
+        '--top',
+        type=int,
+        help='Show only the first N tasks, e.g. the next N due with --sort due'
+    )
+    pages = list_parser.add_mutually_exclusive_group()
+    pages.add_argument(
+        '--offset',
+        type=int,
+        default=0,
+        help='Skip this many tasks'
+    )
+    pages.add_argument(
+        '--page',
+        type=int,
+        help=f'Show this page of tasks ({PAGE_SIZE} per page unless --limit is given)'
+    )
+    list_parser.add_argument(
+        '--fixed-width',
+        action='store_true',
+        help='Use fixed column widths instead of measuring the first rows'
+    )
+    list_parser.set_defaults(parser=list_parser, func=list_tasks)
+
+def build_search(subparsers):
+    """
+    Adds the 'search' command to the parser.
+    """
+    search_parser = subparsers.add_parser(
+        'search',
+        help='Find tasks by words of their title or project',
+        description=(
+            "Find the tasks whose title or project name contain every word\n"
+            "given, or a word starting with it. The best matches are shown\n"
+            "first: words found in the title, whole words and rare words\n"
+            "count most."
+        ),
+        epilog=(
+            "Examples:\n"
+            "  ./todo.py search dentist\n"
+            "  ./todo.py search \"wash pla\" --limit 5\n"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    search_parser.add_argument(
+        'terms',
+        nargs='+',
+        metavar='WORD',
+        help='Words to look for'
+    )
+    search_parser.add_argument(
+        '--limit',
+        type=int,
+        default=PAGE_SIZE,
+        help=f'Show at most this many tasks (default: {PAGE_SIZE})'
+    )
+    search_parser.set_defaults(parser=search_parser, func=search_tasks)
+
+SELECTION_HELP = (
+    "\n\nTasks are chosen by ID, by filter, or both: with IDs, the\n"
+    "filters narrow them down; without IDs, every task matching the\n"
+    "filters is chosen. All the changes are saved in a single write.\n"
+    "An ID may be shortened to its first characters, as long as no\n"
+    "other task's ID starts with them."
 )
-edit_parser.set_defaults(func=edit_task)
+
+@cache
+def selection_parser():
+    """
+    Returns the parent parser of the options shared by the commands that
+    change many tasks at once.
+    """
+    selection = argparse.ArgumentParser(add_help=False)
+    selection.add_argument(
+        'ids',
+        nargs='*',
+        metavar='ID',
+        help=(
+            "IDs of the tasks, or unique prefixes of them, or '-' to read"
+            " them from standard input"
+        )
+    )
+    selection.add_argument(
+        '--status',
+        choices=STATUSES,
+        help='Only tasks with this status'
+    )
+    selection.add_argument(
+        '--priority',
+        choices=('urgent', 'not-urgent'),
+        help='Only tasks with this priority'
+    )
+    selection.add_argument(
+        '--project',
+        help='Only tasks of this project'
+    )
+    selection.add_argument(
+        '--older-than',
+        type=duration,
+        metavar='AGE',
+        help='Only tasks last changed more than AGE ago, e.g. 30d, 12h or 2w'
+    )
+    return selection
+
+def build_complete(subparsers):
+    """
+    Adds the 'complete' command to the parser.
+    """
+    mark_complete_parser = subparsers.add_parser(
+        "complete",
+        parents=[selection_parser()],
+        help="Change status of a task",
+        description=(
+            "Mark a Task as completed" + SELECTION_HELP
+        ),
+        epilog=(
+            "\nExamples:\n"
+            "\t./todo.py complete <ID>\n"
+            "\t./todo.py complete 3fa8\n"
+            "\t./todo.py complete <ID> <ID> <ID>\n"
+            "\tcat ids.txt | ./todo.py complete -\n"
+            "\t./todo.py complete --project Home --older-than 2w"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    mark_complete_parser.set_defaults(parser=mark_complete_parser, func=complete_task)
+
+def build_delete(subparsers):
+    """
+    Adds the 'delete' command to the parser.
+    """
+    remove_parser = subparsers.add_parser(
+        "delete",
+        parents=[selection_parser()],
+        help="Remove a task",
+        description="Remove tasks" + SELECTION_HELP,
+        epilog=(
+            "\nExamples:\n"
+            "\t./todo.py delete <ID>\n"
+            "\t./todo.py delete --status completed --older-than 30d"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    remove_parser.set_defaults(parser=remove_parser, func=delete_task)
+
+def build_edit(subparsers):
+    """
+    Adds the 'edit' command to the parser.
+    """
+    edit_parser = subparsers.add_parser(
+        'edit',
+        parents=[selection_parser()],
+        help='Edit a task by providing Task\'s ID',
+        description="Edit tasks" + SELECTION_HELP,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    edit_parser.add_argument(
+        '--urgent',
+        action='store_true',
+        help='Add priority to a task'
+    )
+    edit_parser.add_argument(
+        '--title',
+        help='Edit title of a task'
+    )
+    edit_parser.add_argument(
+        '--not-urgent',
+        action='store_true',
+        help='Edit priority of a task'
+    )
+    edit_parser.set_defaults(parser=edit_parser, func=edit_task)
+
+def build_import(subparsers):
+    """
+    Adds the 'import' command to the parser.
+    """
+    from models import transfer
+
+    import_parser = subparsers.add_parser(
+        'import',
+        help='Import tasks from a CSV, NDJSON or JSON file',
+        description=(
+            "Import tasks in bulk.\n\n"
+            "Each record needs a title; status, priority, project_name,\n"
+            "duedatetime (ISO format) and id are optional. Records with the\n"
+            "id of a stored task replace it. If any record is invalid,\n"
+            "nothing is imported. The tasks are saved in a single write."
+        ),
+        epilog=(
+            "Examples:\n"
+            "  ./todo.py import tasks.csv\n"
+            "  ./todo.py import backup.json\n"
+            "  cat tasks.ndjson | ./todo.py import -\n"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    import_parser.add_argument(
+        'file',
+        help="File to read, or '-' for standard input"
+    )
+    import_parser.add_argument(
+        '--format',
+        choices=transfer.FORMATS,
+        help='Format of the file (default: from its extension, ndjson for -)'
+    )
+    import_parser.set_defaults(parser=import_parser, func=import_file)
+
+def build_export(subparsers):
+    """
+    Adds the 'export' command to the parser.
+    """
+    from models import transfer
+
+    export_parser = subparsers.add_parser(
+        'export',
+        help='Export all tasks to a CSV, NDJSON or JSON file',
+        epilog=(
+            "Examples:\n"
+            "  ./todo.py export tasks.csv\n"
+            "  ./todo.py export - --format ndjson\n"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    export_parser.add_argument(
+        'file',
+        help="File to write, or '-' for standard output"
+    )
+    export_parser.add_argument(
+        '--format',
+        choices=transfer.FORMATS,
+        help='Format of the file (default: from its extension, ndjson for -)'
+    )
+    export_parser.set_defaults(parser=export_parser, func=export_file)
+
+def build_archive(subparsers):
+    """
+    Adds the 'archive' command to the parser.
+    """
+    archive_parser = subparsers.add_parser(
+        'archive',
+        help='Move old completed tasks to the archive',
+        usage="./todo.py archive [--older-than AGE]",
+        description=(
+            "Move the tasks completed more than AGE ago out of the TODO\n"
+            "list into archive.ndjson.gz, a compressed file that is only\n"
+            "read by 'list --archived'. Loading and listing the remaining\n"
+            "tasks then no longer depends on how many were archived.\n\n"
+            "Set TODO_ARCHIVE_AFTER=AGE to archive them automatically,\n"
+            "at most once a day, after commands that change tasks."
+        ),
+        epilog=(
+            "Examples:\n"
+            "  - Archive tasks completed more than 30 days ago:\n"
+            "    ./todo.py archive\n\n"
+            "  - Archive tasks completed more than a week ago:\n"
+            "    ./todo.py archive --older-than 1w\n"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    archive_parser.add_argument(
+        '--older-than',
+        type=duration,
+        metavar='AGE',
+        help=(
+            'Minimum time since completion, e.g. 12h, 30d or 2w'
+            ' (default: TODO_ARCHIVE_AFTER, or 30d)'
+        )
+    )
+    archive_parser.set_defaults(parser=archive_parser, func=archive_completed)
+
+def build_serve(subparsers):
+    """
+    Adds the 'serve' command to the parser.
+    """
+    serve_parser = subparsers.add_parser(
+        'serve',
+        help='Keep the tasks loaded and answer commands from a local socket',
+        description=(
+            "Run in the foreground as a daemon that keeps the store loaded in\n"
+            "memory and listens on a Unix socket (.todo.sock in the current\n"
+            "directory, or $TODO_SOCKET). While it runs, todo.py commands\n"
+            "started in the same directory are handed to it instead of\n"
+            "loading the store themselves. Stop it with Ctrl-C.\n\n"
+            "Changes made to the store by other processes are picked up\n"
+            "before each command."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    serve_parser.set_defaults(parser=serve_parser, func=serve)
+
+COMMANDS = {
+    'add': build_add,
+    'list': build_list,
+    'search': build_search,
+    'complete': build_complete,
+    'delete': build_delete,
+    'edit': build_edit,
+    'import': build_import,
+    'export': build_export,
+    'archive': build_archive,
+    'serve': build_serve,
+}
+
+# Commands after which the archive policy runs, see archive_policy().
+CHANGING_COMMANDS = ('add', 'complete', 'delete', 'edit', 'import')
+
+def build_parser(command=None):
+    """
+    Builds the command line parser. When the command to run is known,
+    only its subparser is built, so that the options and help text of
+    the other commands cost nothing.
+    Args:
+        command (str): The command, or None to build them all.
+    """
+    parser = argparse.ArgumentParser(
+        description='Advanced TODO CLI',
+        epilog=(
+            "Set TODO_TRACE=1 to print how long each phase of a command took,\n"
+            "or TODO_TRACE=<file> to write those timings to a JSON file."
+        ),
+        formatter_class=RawTextHelpFormatter
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=(
+            'Print how long each phase of the command took and write'
+            ' cProfile statistics to the --profile-output file'
+        )
+    )
+    parser.add_argument(
+        '--profile-output',
+        default='todo.prof',
+        metavar='FILE',
+        help='Where --profile writes its statistics (default: todo.prof)'
+    )
+    subparsers = parser.add_subparsers(
+        title='Commands',
+        dest="command"
+    )
+    for name, build in COMMANDS.items():
+        if command is None or name == command:
+            build(subparsers)
+    return parser
+
+
+def command_name(argv):
+    """
+    Finds the command in the arguments, before they are parsed, so that
+    only its subparser needs to be built.
+    Args:
+        argv (list): The command line arguments.
+    Returns:
+        str: The command, or None if there is no known command.
+    """
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == '--profile-output':
+            next(arguments, None)
+        elif not argument.startswith('-'):
+            return argument if argument in COMMANDS else None
+    return None
+
+
+def main(argv=None):
+    """
+    Runs the command given on the command line.
+    Args:
+        argv (list): The arguments, sys.argv[1:] by default.
+    """
+    tracing, destination = trace.from_environment()
+    started = perf_counter()
+    parser = build_parser(
+        command_name(sys.argv[1:] if argv is None else argv)
+    )
+    args = parser.parse_args(argv)
+    parsed = perf_counter() - started
+    tracing = tracing or args.profile
+    if tracing:
+        trace.enable()
+        if argv is None:
+            trace.record('import', IMPORT_SECONDS)
+        trace.record('parse', parsed)
+    try:
+        if not hasattr(args, "func"):
+            parser.print_help()
+        elif args.profile:
+            run_profiled(args)
+        else:
+            with trace.phase(f'command {args.command}'):
+                args.func(args)
+        if getattr(args, 'command', None) in CHANGING_COMMANDS:
+            apply_archive_policy()
+    finally:
+        if tracing:
+            trace.report(destination)
+            trace.disable()
+
+
+def run_profiled(args):
+    """
+    Runs a command under cProfile and writes the statistics to the
+    --profile-output file.
+    """
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        with trace.phase(f'command {args.command}'):
+            profiler.runcall(args.func, args)
+    finally:
+        profiler.dump_stats(args.profile_output)
+        print(
+            f"cProfile statistics written to {args.profile_output}"
+            f" (view them with: python -m pstats {args.profile_output})",
+            file=sys.stderr
+        )
 
 
-args = parser.parse_args()
-if hasattr(args, "func"):
-    args.func(args)
-else:
-    parser.print_help()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file